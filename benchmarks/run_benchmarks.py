@@ -0,0 +1,187 @@
+"""
+Benchmark the curvylapse pipeline on synthetic data
+
+Generates a synthetic network (see ``curvylapse/synthetic.py``), writes it in
+the raw iButton and ``Daily/`` formats, then times each stage: raw reading,
+daily ingest, daily aggregation, alignment, batch and segmented regression,
+monthly rollups and figure output. Each run appends one JSON line to the
+results file, tagged with the git commit, so runs can be compared across
+versions::
+
+    python benchmarks/run_benchmarks.py --sites 6 --years 3
+    python benchmarks/run_benchmarks.py --sites 60 --years 30 --step 1
+    python benchmarks/run_benchmarks.py --compare
+
+Run from the repository root.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from curvylapse import (align_sensors, batch_linregress,  # noqa: E402
+                        daily_aggregate, ingest_daily, read_ibutton_csv,
+                        rollup, segmented_linregress,
+                        segments_from_breakpoints)
+from curvylapse import instrument  # noqa: E402
+from curvylapse.figures import FigureSpec, build_figures  # noqa: E402
+from curvylapse.synthetic import (synthetic_network,  # noqa: E402
+                                  write_daily_files, write_ibutton_csvs)
+
+DEFAULT_RESULTS = os.path.join('benchmarks', 'results.jsonl')
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             universal_newlines=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(func, repeat):
+    """Run ``func`` ``repeat`` times; return its last result and timings."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - t0)
+    return result, times
+
+
+def run(args):
+    net = synthetic_network(nsite=args.sites, years=args.years,
+                            step=args.step, gap_rate=args.gap_rate,
+                            seed=args.seed)
+    work = tempfile.mkdtemp(prefix='curvylapse-bench-')
+    try:
+        stages = run_stages(args, net, work)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return {
+        'commit': git_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'config': {'sites': args.sites, 'years': args.years,
+                   'step': args.step, 'gap_rate': args.gap_rate,
+                   'seed': args.seed, 'dpi': args.dpi,
+                   'repeat': args.repeat, 'samples': int(net.times.size)},
+        'stages': stages,
+    }
+
+
+def run_stages(args, net, work):
+    raw_paths = write_ibutton_csvs(net, os.path.join(work, 'raw'))
+    daily_dir = os.path.join(work, 'Daily')
+    write_daily_files(net, daily_dir)
+    elev = net.elevations
+    edges = np.quantile(elev, [0, 1 / 3, 2 / 3, 1])
+    segments = segments_from_breakpoints(elev, edges)
+
+    stages = {}
+
+    def stage(name, func):
+        result, times = timed(func, args.repeat)
+        stages[name] = {'min': min(times), 'median': float(np.median(times))}
+        print('{:<20s} {:10.4f} s'.format(name, min(times)))
+        return result
+
+    records = stage('read_ibutton', lambda: [read_ibutton_csv(p)
+                                             for p in raw_paths])
+    stage('ingest_daily', lambda: ingest_daily(daily_dir,
+                                               max_workers=args.workers))
+    stage('daily_aggregate', lambda: daily_aggregate(net.times,
+                                                     net.temperatures))
+    series = {name: (r.times, r.values)
+              for name, r in zip(net.names, records)}
+    aligned = stage('align_sensors', lambda: align_sensors(
+        series, step=args.step))
+    fit = stage('batch_linregress', lambda: batch_linregress(
+        elev, aligned.values))
+    stage('segmented', lambda: segmented_linregress(elev, aligned.values,
+                                                    segments))
+    stage('rollup_month', lambda: rollup(aligned.times, fit.slope, 'month'))
+
+    daily = daily_aggregate(net.times, net.temperatures)
+    spec = FigureSpec('site_panels', 'site_panels',
+                      dict(dates=daily.dates, temperatures=daily.mean,
+                           names=net.names,
+                           elevations_m=np.round(elev * 1000).tolist()),
+                      {}, args.dpi)
+    stage('figure', lambda: build_figures([spec], os.path.join(work, 'fig'),
+                                          max_workers=1, force=True))
+    return stages
+
+
+def compare(path):
+    """Print the last two runs with the same configuration side by side."""
+    with open(path) as f:
+        runs = [json.loads(line) for line in f if line.strip()]
+    if not runs:
+        print('no runs in', path)
+        return
+    last = runs[-1]
+    same = [r for r in runs[:-1] if r['config'] == last['config']]
+    if not same:
+        print('no earlier run with config', last['config'])
+        return
+    prev = same[-1]
+    print('{:<20s} {:>10s} {:>10s} {:>8s}'.format(
+        'stage', prev['commit'] or '?', last['commit'] or '?', 'ratio'))
+    for name, stat in last['stages'].items():
+        old = prev['stages'].get(name, {}).get('min')
+        ratio = stat['min'] / old if old else float('nan')
+        print('{:<20s} {:10.4f} {:10.4f} {:8.2f}'.format(
+            name, old if old else float('nan'), stat['min'], ratio))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sites', type=int, default=6)
+    parser.add_argument('--years', type=float, default=3)
+    parser.add_argument('--step', type=float, default=3,
+                        help='sampling interval in hours')
+    parser.add_argument('--gap-rate', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='process pool size for ingest')
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--output', default=DEFAULT_RESULTS)
+    parser.add_argument('--compare', action='store_true',
+                        help='compare the last two matching runs and exit')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='write per-stage time and memory to a .json or '
+                             '.csv report')
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(args.output)
+        return
+    if args.profile:
+        instrument.enable()
+    result = run(args)
+    if args.profile:
+        instrument.write_report(args.profile)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'a') as f:
+        f.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
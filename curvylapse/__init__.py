@@ -0,0 +1,50 @@
+"""
+CurvyLapseRate analysis tools
+
+Vectorized routines for the Nooksack temperature lapse-rate study. The
+notebooks and ``archive/`` scripts in this repository document the original
+analysis; this package holds the reusable pieces.
+"""
+
+from .align import AlignedRecord, align_sensors
+from .cache import cached_daily_table, cached_wide_csv
+from .daily import DailyStats, daily_aggregate
+from .degreedays import DegreeDays, degree_days, period_totals
+from .downscale import downscale
+from .estimators import LapseFit, fit_lapse_rates
+from .figures import FigureSpec, build_figures
+from .gapfill import GapFilled, fill_gaps
+from .ibutton import IButtonRecord, read_ibutton_csv
+from .incremental import IncrementalLapseRate
+from .ingest import ingest_daily, ingest_raw
+from .inversion import (FreezingLevel, InversionSummary, freezing_level,
+                        inversion_flags, inversion_summary)
+from .moisture import classify_wet, daily_wet, split_by_state
+from .odm import ODMDataset, load_odm1
+from .registry import Sensor, SensorRegistry
+from .regression import (LapseRateResult, batch_linregress,
+                         segmented_linregress, segments_from_breakpoints)
+from .rolling import rolling_linregress
+from .rollup import RollupStats, rollup
+from .snow import (SnowSeason, daily_snow, detect_snow, snow_covered_fraction,
+                   snow_seasons)
+from .store import TimeSeriesStore
+from .synthetic import SyntheticNetwork, synthetic_network
+from .uncertainty import Replicates, period_intervals, resample_lapse_rates
+
+__all__ = [
+    'AlignedRecord', 'DailyStats', 'DegreeDays', 'FigureSpec', 'FreezingLevel',
+    'GapFilled', 'IButtonRecord', 'IncrementalLapseRate', 'InversionSummary',
+    'LapseFit', 'LapseRateResult', 'ODMDataset', 'Replicates', 'RollupStats',
+    'Sensor', 'SensorRegistry', 'SnowSeason', 'SyntheticNetwork',
+    'TimeSeriesStore', 'align_sensors', 'batch_linregress', 'build_figures',
+    'cached_daily_table', 'cached_wide_csv', 'classify_wet', 'daily_aggregate',
+    'daily_snow', 'daily_wet', 'degree_days', 'detect_snow', 'downscale',
+    'fill_gaps', 'fit_lapse_rates', 'freezing_level', 'ingest_daily',
+    'ingest_raw', 'inversion_flags', 'inversion_summary', 'load_odm1',
+    'period_intervals', 'period_totals', 'read_ibutton_csv',
+    'resample_lapse_rates', 'rolling_linregress', 'rollup',
+    'segmented_linregress', 'segments_from_breakpoints',
+    'snow_covered_fraction', 'snow_seasons', 'split_by_state',
+    'synthetic_network',
+]
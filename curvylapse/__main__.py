@@ -0,0 +1,7 @@
+"""Command-line entry point: ``python -m curvylapse``; see :mod:`.pipeline`."""
+
+import sys
+
+from .pipeline import main
+
+sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Cross-sensor time alignment
+
+Snaps every sensor record onto one regular time grid so the sensors can be
+stacked into a dense (time x sensor) matrix for
+:func:`curvylapse.regression.batch_linregress`. Replaces the hand-computed
+offsets of the original script (``ind_Lapse7_start``,
+``ind_Lapse7_daily_start``, ``ind_Lapse5_shift_*``) and the padded
+``temp_Lapse5_adj`` / ``temp_Lapse7_adj`` arrays: a sensor that starts early,
+ends late or has a gap simply gets NaN in the slots it does not cover.
+
+Each sample is matched to its nearest grid time with ``np.searchsorted``
+(O(n log n)); samples further than ``tolerance`` from every grid time are
+dropped. The grid step follows the sampling interval of the method, 3 h for
+the DS1923 (``iButton_1923_*``) and 4 h for the DS1921 (``iButton_1921_*``)
+loggers listed in ``HydroServer-ODM1/methods.csv``.
+"""
+
+from collections import namedtuple
+import re
+
+import numpy as np
+import pandas as pd
+
+from .instrument import instrumented
+
+AlignedRecord = namedtuple('AlignedRecord', ['times', 'values', 'names'])
+AlignedRecord.__doc__ = """\
+Sensors on a common grid: ``times`` (datetime64[s], shape (ntime,)),
+``values`` (float64, shape (ntime, nsensor)) and sensor ``names``."""
+
+_WORDS = {'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6}
+
+
+def as_timedelta(step):
+    """Return ``step`` (timedelta64, or hours) as timedelta64[s]."""
+    if isinstance(step, np.timedelta64):
+        return step.astype('timedelta64[s]')
+    if isinstance(step, (int, float, np.integer, np.floating)):
+        return np.timedelta64(int(round(float(step) * 3600)), 's')
+    return np.timedelta64(step, 's')
+
+
+def method_steps(path='HydroServer-ODM1/methods.csv'):
+    """
+    Sampling interval of each ODM method, from its description.
+
+    Reads descriptions such as "Air temperature measured at four hour
+    intervals".
+
+    Returns
+    -------
+    dict of str to numpy.timedelta64
+    """
+    methods = pd.read_csv(path)
+    steps = {}
+    for code, text in zip(methods['MethodCode'], methods['MethodDescription']):
+        match = re.search(r'(\w+) hour intervals', str(text))
+        if match is None:
+            continue
+        word = match.group(1).lower()
+        hours = _WORDS.get(word) or (int(word) if word.isdigit() else None)
+        if hours:
+            steps[code] = np.timedelta64(hours, 'h').astype('timedelta64[s]')
+    return steps
+
+
+def regular_grid(start, end, step, origin=None):
+    """
+    Regular time grid covering ``[start, end]``.
+
+    Parameters
+    ----------
+    start, end : datetime64 or str
+        Range to cover.
+    step : timedelta64 or float
+        Grid spacing (float = hours).
+    origin : datetime64 or str, optional
+        A time the grid passes through. Defaults to midnight of ``start``, so
+        a 3 h grid falls on 00:00, 03:00, ...
+
+    Returns
+    -------
+    ndarray of datetime64[s]
+    """
+    step = as_timedelta(step)
+    start = np.datetime64(start, 's')
+    end = np.datetime64(end, 's')
+    if origin is None:
+        origin = start.astype('datetime64[D]')
+    origin = np.datetime64(origin, 's')
+    nstep = (start - origin) // step
+    first = origin + nstep * step
+    # include the grid point nearest to start even if it precedes it
+    if start - first > step / 2:
+        first = first + step
+    n = int((end - first) // step) + 1
+    if end - (first + (n - 1) * step) > step / 2:
+        n += 1
+    return first + np.arange(n) * step
+
+
+def snap_to_grid(grid, times, values, tolerance=None):
+    """
+    Place samples in the nearest slot of a regular grid.
+
+    Parameters
+    ----------
+    grid : ndarray of datetime64
+        Sorted, regular grid times.
+    times : array_like of datetime64
+        Sample times (any order).
+    values : array_like
+        Sample values, shape (nsample,) or (nsample, k).
+    tolerance : timedelta64, optional
+        Largest allowed distance to a grid time; defaults to half the grid
+        step.
+
+    Returns
+    -------
+    ndarray of float64
+        Shape (ngrid,) or (ngrid, k); NaN where no sample fell in a slot.
+        If several samples share a slot the nearest one is kept (the first
+        given of equally near ones); missing (all-NaN) samples are ignored,
+        so they never hide a valid one.
+    """
+    grid = np.asarray(grid, dtype='datetime64[s]').astype('int64')
+    t = np.asarray(times, dtype='datetime64[s]').astype('int64')
+    values = np.asarray(values, dtype='float64')
+    out = np.full((grid.size,) + values.shape[1:], np.nan)
+    if grid.size == 0 or t.size == 0:
+        return out
+    if tolerance is None:
+        tolerance = (grid[1] - grid[0]) // 2 if grid.size > 1 else 0
+    else:
+        tolerance = int(as_timedelta(tolerance).astype('int64'))
+
+    if grid.size > 1:
+        right = np.clip(np.searchsorted(grid, t), 1, grid.size - 1)
+    else:
+        right = np.zeros(t.size, dtype='int64')
+    left = np.maximum(right - 1, 0)
+    take_left = np.abs(t - grid[left]) <= np.abs(grid[right] - t)
+    slot = np.where(take_left, left, right)
+    dist = np.abs(t - grid[slot])
+    keep = dist <= tolerance
+    keep &= ~np.isnan(values).reshape(t.size, -1).all(axis=1)
+    slot, dist, vals = slot[keep], dist[keep], values[keep]
+    # nearest first, then keep the first sample of every slot
+    order = np.argsort(dist, kind='stable')
+    filled, first = np.unique(slot[order], return_index=True)
+    out[filled] = vals[order[first]]
+    return out
+
+
+@instrumented('align', rows=lambda r: r.values.shape[0])
+def align_sensors(series, step=3, start=None, end=None, span='union',
+                  tolerance=None, origin=None):
+    """
+    Stack several sensor records on one regular grid.
+
+    Parameters
+    ----------
+    series : dict of str to (times, values)
+        Sensor records, e.g. ``{'Lapse2': (rec.times, rec.values), ...}``
+        with records from :func:`curvylapse.ibutton.read_ibutton_csv`.
+    step : timedelta64 or float, optional
+        Grid spacing, hours if a number. 3 by default; use 4 for the
+        ``iButton_1921_AT`` loggers (see :func:`method_steps`).
+    start, end : datetime64 or str, optional
+        Grid range. By default taken from the records according to ``span``.
+    span : {'union', 'intersection'}, optional
+        Default range: from the earliest to the latest sample of any sensor,
+        or only the period every sensor covers (the original script's
+        12/4/2015-8/16/2016 window).
+    tolerance, origin
+        See :func:`snap_to_grid` and :func:`regular_grid`.
+
+    Returns
+    -------
+    AlignedRecord
+    """
+    names = list(series)
+    firsts, lasts = [], []
+    for name in names:
+        t = np.asarray(series[name][0], dtype='datetime64[s]')
+        if t.size:
+            firsts.append(t.min())
+            lasts.append(t.max())
+    if not firsts:
+        raise ValueError('no samples to align')
+    if span == 'union':
+        lo, hi = min(firsts), max(lasts)
+    elif span == 'intersection':
+        lo, hi = max(firsts), min(lasts)
+    else:
+        raise ValueError("span must be 'union' or 'intersection'")
+    grid = regular_grid(lo if start is None else start,
+                        hi if end is None else end, step, origin)
+    values = np.full((grid.size, len(names)), np.nan)
+    for j, name in enumerate(names):
+        times, vals = series[name]
+        values[:, j] = snap_to_grid(grid, times, vals, tolerance)
+    return AlignedRecord(grid, values, names)
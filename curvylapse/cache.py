@@ -0,0 +1,229 @@
+"""
+Binary table cache
+
+Stores a consolidated wide table (date index plus one numeric column per
+site/variable) as one ``.npy`` file per column with a JSON manifest, and loads
+it back with ``np.load(mmap_mode='r')`` instead of re-parsing CSV text. Each
+cache entry records a fingerprint of its source files (relative path, size and
+modification time) and is rebuilt automatically when any source changes::
+
+    table = cached_daily_table('.')    # first run parses Daily/
+    table = cached_daily_table('.')    # later runs memory-map the cache
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from .ingest import ingest_daily
+
+DEFAULT_CACHE_DIR = '.cache'
+MANIFEST = 'manifest.json'
+_FORMAT_VERSION = 1
+
+
+def _iter_files(sources):
+    for source in sources:
+        if os.path.isdir(source):
+            for dirpath, dirnames, filenames in os.walk(source):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    yield os.path.join(dirpath, name)
+        elif os.path.exists(source):
+            yield source
+
+
+def source_fingerprint(sources, extra=None):
+    """
+    Hash of the size and modification time of every source file.
+
+    Parameters
+    ----------
+    sources : sequence of str
+        Files and/or directories (walked recursively).
+    extra : object, optional
+        Additional JSON-serialisable key material, e.g. build parameters.
+
+    Returns
+    -------
+    str
+        Hex digest; changes whenever a file is added, removed or modified.
+    """
+    h = hashlib.sha1()
+    for path in _iter_files(sources):
+        st = os.stat(path)
+        h.update('{}\0{}\0{}\n'.format(os.path.normpath(path), st.st_size,
+                                       st.st_mtime_ns).encode())
+    if extra is not None:
+        h.update(json.dumps(extra, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def save_table(table, directory, fingerprint=''):
+    """
+    Write a wide table to ``directory`` as per-column ``.npy`` files.
+
+    The entry is written to a temporary folder and moved into place, so a
+    reader never sees a half-written cache.
+
+    Parameters
+    ----------
+    table : pandas.DataFrame
+        Table with a ``DatetimeIndex`` and numeric columns.
+    directory : str
+        Cache entry folder; replaced if it exists.
+    fingerprint : str, optional
+        Source fingerprint stored in the manifest.
+    """
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+    try:
+        columns = []
+        np.save(os.path.join(tmp, 'index.npy'), table.index.values)
+        for i, name in enumerate(table.columns):
+            values = table[name].values
+            if values.dtype.kind not in 'biuf':
+                raise TypeError('column {!r} is not numeric'.format(name))
+            filename = 'c{:04d}.npy'.format(i)
+            np.save(os.path.join(tmp, filename), values)
+            columns.append({'name': str(name), 'file': filename,
+                            'dtype': values.dtype.str})
+        manifest = {'version': _FORMAT_VERSION, 'fingerprint': fingerprint,
+                    'index_name': table.index.name, 'columns': columns}
+        with open(os.path.join(tmp, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=1)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.replace(tmp, directory)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def read_manifest(directory):
+    """Return the manifest of a cache entry, or None if there is none."""
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != _FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def load_columns(directory, columns=None):
+    """
+    Memory-map cached columns without building a DataFrame.
+
+    Returns
+    -------
+    index : ndarray of datetime64
+    data : dict of str to numpy.memmap
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError('no cache entry in {}'.format(directory))
+    index = np.load(os.path.join(directory, 'index.npy'), mmap_mode='r')
+    data = {}
+    for col in manifest['columns']:
+        if columns is None or col['name'] in columns:
+            data[col['name']] = np.load(os.path.join(directory, col['file']),
+                                        mmap_mode='r')
+    return index, data
+
+
+def load_table(directory, columns=None):
+    """
+    Load a cache entry as a DataFrame.
+
+    Columns are read from the memory-mapped ``.npy`` files; nothing is parsed.
+    """
+    manifest = read_manifest(directory)
+    index, data = load_columns(directory, columns)
+    names = [c['name'] for c in manifest['columns'] if c['name'] in data]
+    return pd.DataFrame({name: data[name] for name in names}, columns=names,
+                        index=pd.DatetimeIndex(index,
+                                               name=manifest['index_name']))
+
+
+def cached_table(name, build, sources, cache_dir=DEFAULT_CACHE_DIR,
+                 params=None):
+    """
+    Load table ``name`` from the cache, rebuilding it if stale.
+
+    Parameters
+    ----------
+    name : str
+        Cache entry name (folder under ``cache_dir``).
+    build : callable
+        Called with no arguments to produce the DataFrame on a cache miss.
+    sources : sequence of str
+        Files/directories whose change invalidates the entry.
+    cache_dir : str, optional
+        Root cache folder.
+    params : object, optional
+        Build parameters folded into the fingerprint.
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    directory = os.path.join(cache_dir, name)
+    fingerprint = source_fingerprint(sources, params)
+    manifest = read_manifest(directory)
+    if manifest is not None and manifest['fingerprint'] == fingerprint:
+        return load_table(directory)
+    table = build()
+    save_table(table, directory, fingerprint)
+    return table
+
+
+def read_wide_csv(path):
+    """
+    Parse a wide daily CSV (``All_sites_dailyT.csv`` or the YODA export).
+
+    ``DateTime`` is parsed with an explicit ``%m/%d/%Y`` format and becomes
+    the index; the numeric site columns are kept.
+    """
+    table = pd.read_csv(path)
+    index = pd.DatetimeIndex(pd.to_datetime(table.pop('DateTime'),
+                                            format='%m/%d/%Y'), name='date')
+    table = table.select_dtypes(include=[np.number])
+    table.index = index
+    return table
+
+
+def cached_wide_csv(path, cache_dir=DEFAULT_CACHE_DIR):
+    """Cached :func:`read_wide_csv`, invalidated when ``path`` changes."""
+    name = 'csv-' + os.path.splitext(os.path.basename(path))[0]
+    return cached_table(name, lambda: read_wide_csv(path), [path], cache_dir)
+
+
+def cached_daily_table(root='.', cache_dir=None, max_workers=None):
+    """
+    Consolidated daily table from ``Daily/``, cached.
+
+    Rebuilt when anything under ``Daily/`` or ``HydroServer-ODM1/`` changes.
+
+    Parameters
+    ----------
+    root : str, optional
+        Repository root holding ``Daily/`` and ``HydroServer-ODM1/``.
+    cache_dir : str, optional
+        Defaults to ``<root>/.cache``.
+    max_workers : int, optional
+        Passed to :func:`curvylapse.ingest.ingest_daily` on a rebuild.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(root, DEFAULT_CACHE_DIR)
+    daily = os.path.join(root, 'Daily')
+    sources = [daily, os.path.join(root, 'HydroServer-ODM1')]
+    return cached_table('daily', lambda: ingest_daily(daily, max_workers),
+                        sources, cache_dir)
@@ -0,0 +1,103 @@
+"""
+Daily aggregation
+
+Daily mean, minimum, maximum and sample count of sub-daily sensor records,
+for any number of sensors in one pass. Replaces the ``np.where(date_LapseX ==
+date)`` loop that the original script repeats for every sensor to build
+``daily_Tmean_*``, ``daily_Tmax_*`` and ``daily_Tmin_*``.
+
+Samples are grouped on a ``datetime64[D]`` day key. Records that are already
+in time order (the normal case for iButton downloads) are grouped in O(n) with
+``ufunc.reduceat``; unsorted records are sorted first.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from .instrument import instrumented
+
+DailyStats = namedtuple('DailyStats', ['dates', 'mean', 'min', 'max', 'count'])
+DailyStats.__doc__ = """\
+Daily statistics. ``dates`` is ``datetime64[D]`` of shape (ndays,); the other
+fields are float64 (``count`` is int64) with the sensor axes of the input."""
+
+
+def day_key(times):
+    """Return ``times`` truncated to ``datetime64[D]``."""
+    return np.asarray(times, dtype='datetime64[s]').astype('datetime64[D]')
+
+
+@instrumented('daily', rows=1)
+def daily_aggregate(times, values, fill_missing_days=True):
+    """
+    Daily mean, min, max and count for one or many sensors.
+
+    Parameters
+    ----------
+    times : array_like of datetime64
+        Sample times, shape (nsample,).
+    values : array_like
+        Sample values, shape (nsample,) or (nsample, nsensor). NaN samples
+        are ignored.
+    fill_missing_days : bool, optional
+        If True (default) the output covers every calendar day from the first
+        to the last sample, with NaN statistics and a zero count on days with
+        no samples, as the original script's ``ndays_*`` did. If False only
+        days with at least one sample are returned.
+
+    Returns
+    -------
+    DailyStats
+
+    Examples
+    --------
+    >>> t = np.array(['2015-12-04T14:00', '2015-12-04T17:00',
+    ...               '2015-12-06T02:00'], dtype='datetime64[s]')
+    >>> daily = daily_aggregate(t, [1.0, 3.0, -2.0])
+    >>> daily.dates
+    array(['2015-12-04', '2015-12-05', '2015-12-06'], dtype='datetime64[D]')
+    >>> daily.mean
+    array([ 2., nan, -2.])
+    """
+    days = day_key(times)
+    values = np.asarray(values, dtype='float64')
+    if values.shape[0] != days.shape[0]:
+        raise ValueError('times and values must have the same length')
+    if days.size == 0:
+        empty = np.empty((0,) + values.shape[1:])
+        return DailyStats(days, empty, empty.copy(), empty.copy(),
+                          empty.astype('int64'))
+
+    if np.any(days[1:] < days[:-1]):
+        order = np.argsort(days, kind='stable')
+        days = days[order]
+        values = values[order]
+
+    starts = np.concatenate(([0], np.flatnonzero(days[1:] != days[:-1]) + 1))
+    valid = ~np.isnan(values)
+    count = np.add.reduceat(valid.astype('int64'), starts, axis=0)
+    total = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=0)
+    # fmin/fmax ignore NaN unless every sample of the day is NaN
+    dmin = np.fmin.reduceat(values, starts, axis=0)
+    dmax = np.fmax.reduceat(values, starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dmean = np.where(count > 0, total / count, np.nan)
+    dates = days[starts]
+
+    if fill_missing_days:
+        calendar = np.arange(dates[0], dates[-1] + np.timedelta64(1, 'D'),
+                             dtype='datetime64[D]')
+        if calendar.size != dates.size:
+            slot = (dates - dates[0]).astype('int64')
+            shape = (calendar.size,) + values.shape[1:]
+            filled = []
+            for arr, fill in ((dmean, np.nan), (dmin, np.nan),
+                              (dmax, np.nan), (count, 0)):
+                out = np.full(shape, fill, dtype=arr.dtype)
+                out[slot] = arr
+                filled.append(out)
+            dmean, dmin, dmax, count = filled
+        dates = calendar
+
+    return DailyStats(dates, dmean, dmin, dmax, count)
@@ -0,0 +1,215 @@
+"""
+Degree days and threshold exceedance
+
+Running totals of positive and negative degree days and of days above and
+below temperature thresholds, for every site (the ``NFN*_AT`` columns of
+``All_sites_dailyT.csv`` or :func:`~.daily.daily_aggregate` output) and every
+threshold at once, restarting each water year. The snowmelt and salmon-habitat
+uses in the README's *Value of the Data* need exactly these.
+
+Temperatures are broadcast against the thresholds into one (day x threshold x
+site) array, accumulated with a single ``cumsum`` along time, and reset at
+period starts by subtracting the running total reached just before each
+start. Missing days add nothing; ``valid`` counts the days that did report.
+
+:func:`band_temperatures` evaluates daily lapse-rate fits at the mean
+elevation of DEM bands (:func:`dem_bands`), so the same accumulators apply to
+elevation bands that have no sensor.
+"""
+
+from collections import namedtuple
+import os
+
+import numpy as np
+
+from .downscale import band_index
+from .rollup import group_codes
+
+DegreeDays = namedtuple('DegreeDays',
+                        ['dates', 'period', 'labels', 'thresholds',
+                         'positive', 'negative', 'days_above', 'days_below',
+                         'valid'])
+DegreeDays.__doc__ = """\
+Running totals since the start of each period, shape (nday, nthreshold,
+nsite): degree days above (``positive``) and below (``negative``) each
+threshold, days strictly above and below it, and days with data. ``period``
+is the index into ``labels`` (e.g. water years) of each day, -1 outside a
+custom calendar. Use :func:`period_totals` for the end-of-period values."""
+
+
+def cumulative_by_period(dates, values, by='water_year'):
+    """
+    Cumulative sum along axis 0 that restarts every period.
+
+    Parameters
+    ----------
+    dates : array_like of datetime64
+        Increasing dates, shape (nday,).
+    values : array_like
+        Shape (nday, ...); NaN adds nothing.
+    by : str or array_like of datetime64
+        Grouping, as for :func:`curvylapse.rollup.rollup`. Days outside a
+        custom calendar are NaN.
+
+    Returns
+    -------
+    totals : ndarray
+        Same shape as ``values``.
+    codes : ndarray of int64
+        Period of each day.
+    labels : ndarray
+        Label of each period.
+    """
+    v = np.asarray(values, dtype='float64')
+    codes, labels = group_codes(dates, by)
+    total = np.cumsum(np.where(np.isnan(v), 0.0, v), axis=0)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1))
+    before = np.zeros((starts.size,) + v.shape[1:])
+    before[1:] = total[starts[1:] - 1]
+    period = np.repeat(np.arange(starts.size),
+                       np.diff(np.append(starts, codes.size)))
+    total = total - before[period]
+    total[codes < 0] = np.nan
+    return total, codes, labels
+
+
+def degree_days(dates, temperatures, thresholds=(0.0,), by='water_year'):
+    """
+    Running degree days and threshold-exceedance days of every site.
+
+    Parameters
+    ----------
+    dates : array_like of datetime64
+        Increasing dates, shape (nday,).
+    temperatures : array_like
+        Daily temperatures (deg C), shape (nday,) or (nday, nsite). Daily
+        means give degree days; daily minima with threshold 0 give frost days
+        as ``days_below``.
+    thresholds : sequence of float, optional
+        Base temperatures, all handled in one pass.
+    by : str or array_like of datetime64, optional
+        Accumulation period; water years by default.
+
+    Returns
+    -------
+    DegreeDays
+
+    Examples
+    --------
+    >>> d = np.arange('2016-09-29', '2016-10-03', dtype='datetime64[D]')
+    >>> dd = degree_days(d, [2.0, -1.0, 3.0, 5.0], thresholds=[0.0, 4.0])
+    >>> dd.positive[:, :, 0]
+    array([[2., 0.],
+           [2., 0.],
+           [3., 0.],
+           [8., 1.]])
+    """
+    t = np.asarray(temperatures, dtype='float64')
+    if t.ndim == 1:
+        t = t[:, np.newaxis]
+    th = np.asarray(thresholds, dtype='float64')
+    diff = t[:, np.newaxis, :] - th[np.newaxis, :, np.newaxis]
+    valid = np.broadcast_to(~np.isnan(t)[:, np.newaxis, :], diff.shape)
+    with np.errstate(invalid='ignore'):
+        parts = [np.where(valid, np.maximum(diff, 0.0), 0.0),
+                 np.where(valid, np.maximum(-diff, 0.0), 0.0),
+                 (diff > 0).astype('float64'),
+                 (diff < 0).astype('float64'),
+                 valid.astype('float64')]
+    # one cumsum over all five accumulators
+    total, codes, labels = cumulative_by_period(dates, np.stack(parts, -1),
+                                                by)
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    return DegreeDays(dates, codes, labels, th, *np.moveaxis(total, -1, 0))
+
+
+def period_totals(result):
+    """
+    End-of-period totals of a :class:`DegreeDays` result.
+
+    Returns
+    -------
+    DegreeDays
+        One row per period with data, fields of shape (nperiod, nthreshold,
+        nsite); ``dates`` holds the last day of each period.
+    """
+    code = np.asarray(result.period)
+    inside = np.flatnonzero(code >= 0)
+    # last day of each run of equal codes
+    is_last = np.append(np.diff(code[inside]) != 0, inside.size > 0)
+    last = inside[is_last[:inside.size]]
+    fields = [getattr(result, name)[last] for name in
+              ('positive', 'negative', 'days_above', 'days_below', 'valid')]
+    return DegreeDays(result.dates[last], code[last], result.labels,
+                      result.thresholds, *fields)
+
+
+def dem_bands(dem, edges, elevation_scale=1.0, nodata=None, tile_rows=1024):
+    """
+    Mean elevation and cell count of each DEM elevation band.
+
+    Parameters
+    ----------
+    dem : array_like, str or path-like
+        Elevation grid or ``.npy`` path (read memory-mapped, a tile of rows
+        at a time).
+    edges : array_like
+        Band edges in fit units; band ``k`` covers ``edges[k] <= z <
+        edges[k + 1]``.
+    elevation_scale : float, optional
+        Factor from DEM units to fit units (0.001 for metres to km).
+    nodata : float, optional
+        DEM value of cells to skip.
+
+    Returns
+    -------
+    mean_elevation, cells : ndarray
+        Shape (nband,); bands without cells have NaN mean.
+    """
+    if isinstance(dem, (str, os.PathLike)):
+        dem = np.load(dem, mmap_mode='r')
+    e = np.asarray(edges, dtype='float64')
+    nband = e.size - 1
+    total = np.zeros(nband)
+    cells = np.zeros(nband, dtype='int64')
+    for r0 in range(0, dem.shape[0], tile_rows):
+        z = np.array(dem[r0:r0 + tile_rows], dtype='float64').ravel()
+        if nodata is not None:
+            z = z[z != nodata]
+        z = z[np.isfinite(z)] * elevation_scale
+        band = np.searchsorted(e, z, side='right') - 1
+        inside = (band >= 0) & (band < nband)
+        total += np.bincount(band[inside], z[inside], minlength=nband)
+        cells += np.bincount(band[inside], minlength=nband)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(cells > 0, total / cells, np.nan), cells
+
+
+def band_temperatures(slope, intercept, elevations, breakpoints=None):
+    """
+    Daily temperature at given elevations from daily lapse-rate fits.
+
+    Parameters
+    ----------
+    slope, intercept : array_like
+        Fits of shape (nday,) or (nday, nsegment).
+    elevations : array_like
+        Target elevations in fit units, shape (nband,), e.g. from
+        :func:`dem_bands`.
+    breakpoints : array_like, optional
+        Segment edges when the fits are piecewise; each elevation uses the
+        segment it falls in (end segments extrapolate).
+
+    Returns
+    -------
+    ndarray
+        Shape (nday, nband), ready for :func:`degree_days`.
+    """
+    b = np.asarray(slope, dtype='float64')
+    a = np.asarray(intercept, dtype='float64')
+    if b.ndim == 1:
+        b, a = b[:, np.newaxis], a[:, np.newaxis]
+    z = np.asarray(elevations, dtype='float64')
+    seg = (np.zeros(z.size, dtype='intp') if breakpoints is None
+           else band_index(z, breakpoints))
+    return a[:, seg] + b[:, seg] * z
@@ -0,0 +1,129 @@
+"""
+Downscaling lapse rates onto a DEM
+
+Turns the per-day (optionally piecewise) lapse-rate fits into the gridded daily
+temperature cube that the hydrologic and snow models are forced with:
+
+    T[t, i, j] = intercept[t, k] + slope[t, k] * z[i, j]
+
+where ``k`` is the elevation band of cell ``(i, j)``. The cube is written to
+an ``.npy`` file opened as a memory map and filled one (time chunk x row tile)
+block at a time, so neither the full cube nor a (time x DEM) broadcast is ever
+held in memory. Peak memory is about ``time_chunk * tile_rows * ncol`` values.
+
+DEMs are NumPy arrays or ``.npy`` files (read memory-mapped); a GeoTIFF can be
+converted once with any raster library.
+"""
+
+import os
+
+import numpy as np
+
+
+def band_index(elevations, breakpoints):
+    """
+    Elevation band of each value.
+
+    Band ``k`` covers ``breakpoints[k] <= z < breakpoints[k + 1]``; values
+    below the first or above the last breakpoint use the end bands, so the
+    lowest and highest fits are extrapolated.
+
+    Parameters
+    ----------
+    elevations : array_like
+    breakpoints : array_like
+        Band edges as passed to
+        :func:`curvylapse.regression.segments_from_breakpoints`.
+
+    Returns
+    -------
+    ndarray of intp
+        Same shape as ``elevations``.
+    """
+    edges = np.asarray(breakpoints, dtype='float64')
+    z = np.asarray(elevations, dtype='float64')
+    return np.searchsorted(edges[1:-1], z, side='right')
+
+
+def _as_2d(a):
+    a = np.asarray(a, dtype='float64')
+    return a[:, np.newaxis] if a.ndim == 1 else a
+
+
+def downscale(dem, slope, intercept, path, breakpoints=None,
+              elevation_scale=1.0, nodata=None, time_chunk=64, tile_rows=256,
+              dtype='float32'):
+    """
+    Write a (time x row x column) temperature cube for a DEM.
+
+    Parameters
+    ----------
+    dem : array_like, str or path-like
+        Elevation grid, shape (nrow, ncol), or the path of an ``.npy`` file.
+    slope, intercept : array_like
+        Lapse-rate fits of shape (ntime,) or (ntime, nband), e.g. the fields
+        of a :func:`curvylapse.regression.batch_linregress` or
+        :func:`curvylapse.regression.segmented_linregress` result.
+    path : str
+        Output ``.npy`` file.
+    breakpoints : array_like, optional
+        Band edges (nband + 1 values) in the units of the fits; required when
+        there is more than one band.
+    elevation_scale : float, optional
+        Factor converting DEM units to the fit's elevation units, e.g. 0.001
+        for a DEM in metres and lapse rates in deg C/km.
+    nodata : float, optional
+        DEM value marking cells outside the watershed; written as NaN.
+    time_chunk : int, optional
+        Time steps per block.
+    tile_rows : int, optional
+        DEM rows per block.
+    dtype : str, optional
+        Output dtype.
+
+    Returns
+    -------
+    numpy.memmap
+        The cube, shape (ntime, nrow, ncol). Time steps without a fit are NaN.
+
+    Examples
+    --------
+    ::
+
+        fit = segmented_linregress(elev_km, daily_T, segments)
+        cube = downscale('dem.npy', fit.slope, fit.intercept, 'T_cube.npy',
+                         breakpoints=[0.5, 1.06, 1.58, 1.75],
+                         elevation_scale=0.001, nodata=-9999)
+    """
+    if isinstance(dem, (str, os.PathLike)):
+        dem = np.load(dem, mmap_mode='r')
+    if np.ndim(dem) != 2:
+        raise ValueError('dem must be 2-D, got shape {}'.format(np.shape(dem)))
+    slope = _as_2d(slope)
+    intercept = _as_2d(intercept)
+    if slope.shape != intercept.shape:
+        raise ValueError('slope and intercept shapes differ')
+    ntime, nband = slope.shape
+    if nband > 1 and (breakpoints is None or len(breakpoints) != nband + 1):
+        raise ValueError('{} bands need {} breakpoints'.format(
+            nband, nband + 1))
+    nrow, ncol = dem.shape
+    cube = np.lib.format.open_memmap(path, mode='w+', dtype=dtype,
+                                     shape=(ntime, nrow, ncol))
+
+    for r0 in range(0, nrow, tile_rows):
+        r1 = min(r0 + tile_rows, nrow)
+        z = np.array(dem[r0:r1], dtype='float64')
+        if nodata is not None:
+            z[z == nodata] = np.nan
+        z = (z * elevation_scale).ravel()
+        band = (np.zeros(z.size, dtype='intp') if nband == 1
+                else band_index(z, breakpoints))
+        # NaN cells land in the last band; their NaN elevation makes the
+        # result NaN whatever band they use
+        for t0 in range(0, ntime, time_chunk):
+            t1 = min(t0 + time_chunk, ntime)
+            block = intercept[t0:t1, band] + slope[t0:t1, band] * z
+            cube[t0:t1, r0:r1] = block.reshape(t1 - t0, r1 - r0, ncol)
+    cube.flush()
+    return cube
@@ -0,0 +1,229 @@
+"""
+Robust and curved lapse-rate estimators
+
+Alternatives to the ordinary least squares of ``stats.linregress`` behind one
+interface, each vectorized over every time step of a (time x sensor) matrix:
+
+``'ols'``        ordinary least squares (:func:`~.regression.batch_linregress`)
+``'theilsen'``   Theil-Sen median of pairwise slopes
+``'huber'``      Huber M-estimate by iteratively reweighted least squares
+``'quadratic'``  least-squares quadratic in elevation
+
+Because the sensor set is small and fixed, Theil-Sen works on the precomputed
+sensor pairs: the pairwise elevation differences are formed once and the
+pairwise slopes of every time step come from one indexed subtraction. Huber
+and quadratic fits solve all time steps' weighted normal equations together.
+
+Every estimator returns a :class:`LapseFit` for the model
+
+    T(z) = intercept + slope * z + curvature * (z - reference) ** 2
+
+so ``slope`` is the lapse rate at the ``reference`` elevation and the linear
+estimators have zero curvature. Further estimators can be added with
+:func:`register_estimator`.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from .regression import _as_arrays, batch_linregress
+
+LapseFit = namedtuple('LapseFit', ['slope', 'intercept', 'curvature',
+                                   'reference', 'nobs'])
+LapseFit.__doc__ = """\
+Per-time-step fit of ``T(z) = intercept + slope * z + curvature *
+(z - reference) ** 2``. Arrays of shape (ntime,); ``reference`` is a scalar
+and ``nobs`` the number of sensors used."""
+
+ESTIMATORS = {}
+
+
+def register_estimator(name):
+    """
+    Decorator adding a function to :data:`ESTIMATORS`.
+
+    The function takes ``(elevations, temperatures, **options)`` with
+    temperatures of shape (ntime, nsensor) and returns a :class:`LapseFit`.
+    """
+    def decorate(func):
+        ESTIMATORS[name] = func
+        return func
+    return decorate
+
+
+def predict(fit, elevations):
+    """
+    Temperature of every fit at the given elevations.
+
+    Returns
+    -------
+    ndarray
+        Shape (ntime, nelevation).
+    """
+    z = np.asarray(elevations, dtype='float64')
+    return (fit.intercept[:, np.newaxis] + fit.slope[:, np.newaxis] * z
+            + fit.curvature[:, np.newaxis] * (z - fit.reference) ** 2)
+
+
+def _weighted_line(x, y, w):
+    """Weighted least-squares line of every row; NaN where it is undefined."""
+    sw = w.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        xm = (w * x).sum(axis=1) / sw
+        ym = (w * y).sum(axis=1) / sw
+        dx = x - xm[:, np.newaxis]
+        sxx = (w * dx * dx).sum(axis=1)
+        slope = (w * dx * (y - ym[:, np.newaxis])).sum(axis=1) / sxx
+    slope = np.where(sxx > 0, slope, np.nan)
+    return slope, ym - slope * xm
+
+
+@register_estimator('ols')
+def ols(elevations, temperatures):
+    """Ordinary least squares, as ``stats.linregress``."""
+    fit = batch_linregress(elevations, temperatures)
+    return LapseFit(fit.slope, fit.intercept, np.zeros_like(fit.slope), 0.0,
+                    fit.nobs)
+
+
+@register_estimator('theilsen')
+def theilsen(elevations, temperatures):
+    """
+    Theil-Sen estimator.
+
+    The slope is the median of the slopes of all sensor pairs that reported
+    and sit at different elevations; the intercept is ``median(y) - slope *
+    median(x)`` over the reporting sensors, as ``scipy.stats.theilslopes``.
+    """
+    x, y = _as_arrays(elevations, temperatures)
+    elev = x[0]
+    i, j = np.triu_indices(elev.size, k=1)
+    dx = elev[j] - elev[i]
+    keep = dx != 0
+    i, j, dx = i[keep], j[keep], dx[keep]
+
+    pair_slopes = (y[:, j] - y[:, i]) / dx
+    valid = np.isfinite(y)
+    counted = np.isfinite(pair_slopes).any(axis=1)
+    slope = np.full(y.shape[0], np.nan)
+    xmed = np.full(y.shape[0], np.nan)
+    ymed = np.full(y.shape[0], np.nan)
+    with np.errstate(invalid='ignore'):
+        if counted.any():
+            slope[counted] = np.nanmedian(pair_slopes[counted], axis=1)
+            xmed[counted] = np.nanmedian(np.where(valid, x, np.nan)[counted],
+                                         axis=1)
+            ymed[counted] = np.nanmedian(y[counted], axis=1)
+    return LapseFit(slope, ymed - slope * xmed, np.zeros_like(slope), 0.0,
+                    valid.sum(axis=1).astype('float64'))
+
+
+@register_estimator('huber')
+def huber(elevations, temperatures, k=1.345, max_iter=50, tol=1e-8):
+    """
+    Huber M-estimate of the line, by iteratively reweighted least squares.
+
+    Residuals are scaled by the normalized median absolute deviation,
+    re-estimated every iteration; a residual beyond ``k`` scale units gets
+    weight ``k * scale / |residual|``. All time steps iterate together until
+    none of their slopes change by more than ``tol``.
+    """
+    x, y = _as_arrays(elevations, temperatures)
+    valid = np.isfinite(y)
+    xv = np.where(valid, x, 0.0)
+    yv = np.where(valid, y, 0.0)
+    base = valid.astype('float64')
+    w = base
+    slope, intercept = _weighted_line(xv, yv, w)
+    scale = np.full(y.shape[0], np.nan)
+    for _ in range(max_iter):
+        resid = np.where(valid, yv - intercept[:, np.newaxis]
+                         - slope[:, np.newaxis] * xv, np.nan)
+        fitted = np.isfinite(resid).any(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mad = np.nanmedian(np.abs(resid[fitted]), axis=1)
+            scale[fitted] = mad / 0.6745
+            limit = (k * scale)[:, np.newaxis]
+            w = np.where(np.abs(resid) <= limit, 1.0, limit / np.abs(resid))
+        w = np.where(valid, np.nan_to_num(w), 0.0)
+        new_slope, intercept = _weighted_line(xv, yv, w)
+        with np.errstate(invalid='ignore'):
+            change = np.nanmax(np.abs(new_slope - slope), initial=0.0)
+        slope = new_slope
+        if change <= tol:
+            break
+    return LapseFit(slope, intercept, np.zeros_like(slope), 0.0,
+                    base.sum(axis=1))
+
+
+@register_estimator('quadratic')
+def quadratic(elevations, temperatures, reference=None):
+    """
+    Least-squares quadratic in elevation.
+
+    Needs three reporting sensors at distinct elevations; ``reference``
+    defaults to the mean sensor elevation.
+    """
+    x, y = _as_arrays(elevations, temperatures)
+    if reference is None:
+        reference = float(np.nanmean(x[0]))
+    valid = np.isfinite(y)
+    w = valid.astype('float64')
+    d = np.where(valid, x - reference, 0.0)
+    yv = np.where(valid, y, 0.0)
+    powers = np.stack([(w * d ** p).sum(axis=1) for p in range(5)], axis=1)
+    rhs = np.stack([(yv * d ** p).sum(axis=1) for p in range(3)], axis=1)
+    normal = powers[:, [[0, 1, 2], [1, 2, 3], [2, 3, 4]]]
+
+    ntime = y.shape[0]
+    nobs = w.sum(axis=1)
+    # NaN sorts last, so distinct elevations are the steps up plus one
+    xs = np.sort(np.where(valid, x, np.nan), axis=1)
+    with np.errstate(invalid='ignore'):
+        ndistinct = (np.diff(xs, axis=1) > 0).sum(axis=1) + (nobs > 0)
+    ok = ndistinct >= 3
+    coef = np.full((ntime, 3), np.nan)
+    if ok.any():
+        coef[ok] = np.linalg.solve(normal[ok],
+                                   rhs[ok][..., np.newaxis])[..., 0]
+    a, b, c = coef.T
+    # T = a + b d + c d^2 with d = z - reference
+    return LapseFit(b, a - b * reference, c, reference, nobs)
+
+
+def fit_lapse_rates(elevations, temperatures, estimator='ols', **options):
+    """
+    Lapse-rate fit of every time step with a chosen estimator.
+
+    Parameters
+    ----------
+    elevations : array_like
+        Sensor elevations, shape (nsensor,).
+    temperatures : array_like
+        Shape (ntime, nsensor) or (nsensor,); NaN for missing sensors.
+    estimator : str or callable, optional
+        Name in :data:`ESTIMATORS` or a function with the same signature.
+    **options
+        Passed to the estimator, e.g. ``k`` for ``'huber'``.
+
+    Returns
+    -------
+    LapseFit
+
+    Examples
+    --------
+    >>> z = np.array([0.5, 0.7, 1.1, 1.3, 1.6, 1.7])
+    >>> T = np.array([[8.0, 7.0, 5.0, 4.0, 2.5, 12.0]])   # one bad sensor
+    >>> fit_lapse_rates(z, T, 'theilsen').slope.round(2)
+    array([-5.])
+    """
+    func = estimator if callable(estimator) else ESTIMATORS.get(estimator)
+    if func is None:
+        raise ValueError('unknown estimator {!r}; choose from {}'.format(
+            estimator, sorted(ESTIMATORS)))
+    x = np.asarray(elevations, dtype='float64')
+    y = np.asarray(temperatures, dtype='float64')
+    if y.ndim == 1:
+        y = y[np.newaxis, :]
+    return func(x, y, **options)
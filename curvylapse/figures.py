@@ -0,0 +1,279 @@
+"""
+Figure builds
+
+Renders the publication figures of the 2020 figures notebook (the 6-panel
+site grid, ``plot_oneyear``, ``analyze_one_month`` and ``lapse_one_month``)
+as a build step:
+
+* each renderer uses the object-oriented matplotlib API on its own
+  ``Figure`` with an Agg canvas, never ``pyplot`` global state, so figures
+  can be drawn in separate worker processes;
+* each figure is keyed by a hash of its renderer's code, parameters, dpi
+  and the exact data passed to it; figures whose key matches the last build are
+  skipped, so a revision that touches one month re-renders one figure.
+
+::
+
+    specs = [FigureSpec('figure3b_2020', 'monthly_lapse',
+                        dict(elevations_km=z, temperatures=t), {}, 900)]
+    build_figures(specs, 'figures')
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+
+FIGURE_MANIFEST = 'figures.json'
+
+FigureSpec = namedtuple('FigureSpec', ['name', 'renderer', 'data', 'params',
+                                       'dpi'])
+FigureSpec.__doc__ = """\
+One figure of a build: output ``name`` (file stem), ``renderer`` (key of
+:data:`RENDERERS`), ``data`` (dict of arrays or lists passed as keyword
+arguments), extra keyword ``params`` and output ``dpi``."""
+
+RENDERERS = {}
+
+_COLORS = ['tab:blue', 'tab:orange', 'tab:green', 'tab:red', 'tab:purple',
+           'tab:olive']
+
+
+def renderer(name):
+    """Decorator adding a figure function to :data:`RENDERERS`."""
+    def decorate(func):
+        RENDERERS[name] = func
+        return func
+    return decorate
+
+
+def new_figure(width, height):
+    """A ``Figure`` with its own Agg canvas, outside pyplot."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(width, height))
+    FigureCanvasAgg(fig)
+    return fig
+
+
+@renderer('site_panels')
+def site_panels(dates, temperatures, names, elevations_m,
+                title='NFN Daily Air Temperature (C)', ylim=(-25, 25)):
+    """One panel per site with the 0 deg C isotherm (3 x 2 grid)."""
+    t = np.asarray(temperatures, dtype='float64')
+    fig = new_figure(12, 12)
+    fig.suptitle(title)
+    fig.subplots_adjust(hspace=.5)
+    nrow = (len(names) + 1) // 2
+    for j, name in enumerate(names):
+        ax = fig.add_subplot(nrow, 2, j + 1)
+        ax.plot(dates, t[:, j], _COLORS[j % len(_COLORS)])
+        ax.plot(dates, np.zeros(len(dates)), 'k')
+        ax.text(dates[min(10, len(dates) - 1)], 20, name, fontsize=18)
+        ax.set_ylim(ylim)
+        ax.set_xlim(dates[0], dates[-1])
+        ax.legend(('Elevation = {} m'.format(elevations_m[j]),
+                   '0 C Isotherm'))
+        for label in ax.get_xticklabels():
+            label.set_rotation(45)
+    return fig
+
+
+@renderer('one_year')
+def one_year(dates, temperatures, names, title=''):
+    """All sites over one water year (``plot_oneyear``)."""
+    t = np.asarray(temperatures, dtype='float64')
+    fig = new_figure(10, 5)
+    ax = fig.add_subplot(111)
+    for j, name in enumerate(names):
+        ax.plot(dates, t[:, j], label=name)
+    ax.set_ylabel('Temperature (C)')
+    ax.set_title(title)
+    ax.legend(loc='best')
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+    return fig
+
+
+@renderer('monthly_series')
+def monthly_series(dates, temperatures, names, title=''):
+    """Daily temperatures of one month (``analyze_one_month``)."""
+    t = np.asarray(temperatures, dtype='float64')
+    fig = new_figure(7, 5)
+    ax = fig.add_subplot(111)
+    for j, name in enumerate(names):
+        ax.plot(dates, t[:, j], label=name)
+    ax.plot(dates, np.zeros(len(dates)), color='k', label='0 deg C')
+    ax.set_ylabel('Temperature (C)')
+    ax.set_title(title, loc='left')
+    fig.legend(loc='center left', bbox_to_anchor=(0.95, 0.75))
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+    return fig
+
+
+@renderer('monthly_lapse')
+def monthly_lapse(elevations_km, temperatures, title='',
+                  month_label='April 2018',
+                  references=((-6.5, 'Stone & Carlson, 1979'),
+                              (-4.5, 'Minder et al., 2010')),
+                  xlim=(0.4, 1.8), ylim=(-2, 6.5)):
+    """Monthly mean temperature against elevation (``lapse_one_month``)."""
+    from scipy import stats
+
+    z = np.asarray(elevations_km, dtype='float64')
+    t = np.asarray(temperatures, dtype='float64')
+    ok = ~np.isnan(t)
+    fit = stats.linregress(z[ok], t[ok])
+    fig = new_figure(8, 6)
+    ax = fig.add_subplot(111)
+    ax.plot(z, t, 'ro', label='Observed monthly mean temperature - {}'.format(
+        month_label))
+    ax.plot(z, z * fit.slope + fit.intercept, 'b-',
+            label='NFN Monthly lapse rate {} {} C/Km'.format(
+                month_label, round(fit.slope, 1)))
+    for (rate, source), style in zip(references, ['m-', 'g-', 'c-', 'y-']):
+        ax.plot(z, z * rate + fit.intercept, style,
+                label='Annual lapse rate = {} C/Km ({})'.format(rate, source))
+    ax.set_ylabel('Temperature (deg C)')
+    ax.set_xlabel('Elevation (km)')
+    ax.set_title(title, loc='left')
+    box = ax.get_position()
+    ax.set_position([box.x0, box.y0, box.width * 0.8, box.height])
+    ax.legend(loc='center left', bbox_to_anchor=(1, 0.5))
+    ax.set_xlim(*xlim)
+    ax.set_ylim(*ylim)
+    return fig
+
+
+def _hash_value(h, value):
+    if isinstance(value, dict):
+        for key in sorted(value):
+            h.update(str(key).encode() + b'\0')
+            _hash_value(h, value[key])
+        return
+    if isinstance(value, (list, tuple)) and not all(
+            isinstance(v, (str, int, float)) for v in value):
+        for v in value:
+            _hash_value(h, v)
+        return
+    a = np.asarray(value)
+    if a.dtype.kind in 'OUS':
+        h.update(json.dumps(a.tolist(), default=str).encode())
+    else:
+        h.update('{}{}'.format(a.dtype.str, a.shape).encode())
+        h.update(np.ascontiguousarray(a).tobytes())
+    h.update(b'\n')
+
+
+def _code_hash(h, func):
+    """Add the source of ``func`` and of the file defining it to ``h``."""
+    try:
+        h.update(inspect.getsource(func).encode())
+        with open(inspect.getsourcefile(func), 'rb') as f:
+            h.update(f.read())
+    except (OSError, TypeError):
+        h.update(func.__code__.co_code)
+
+
+def figure_key(spec):
+    """
+    Hex digest of everything that determines a figure's pixels.
+
+    Covers the renderer name and code (its source and that of the module
+    defining it, so editing a helper it calls counts too), dpi, parameters
+    and the bytes, dtype and shape of every data array.
+    """
+    h = hashlib.sha1()
+    h.update('{}\0{}\0'.format(spec.renderer, spec.dpi).encode())
+    _code_hash(h, RENDERERS[spec.renderer])
+    h.update(json.dumps(spec.params, sort_keys=True, default=str).encode())
+    _hash_value(h, spec.data)
+    return h.hexdigest()
+
+
+def render(spec, path):
+    """Draw one figure and save it atomically to ``path``."""
+    func = RENDERERS[spec.renderer]
+    kwargs = dict(spec.data)
+    kwargs.update(spec.params or {})
+    fig = func(**kwargs)
+    stem, ext = os.path.splitext(path)
+    tmp = '{}.tmp-{}{}'.format(stem, os.getpid(), ext)
+    fig.savefig(tmp, dpi=spec.dpi, bbox_inches='tight')
+    os.replace(tmp, path)
+    return path
+
+
+def _render_task(args):
+    return render(*args)
+
+
+def build_figures(specs, outdir='figures', fmt='png', max_workers=None,
+                  force=False):
+    """
+    Render the figures whose inputs changed since the last build.
+
+    Parameters
+    ----------
+    specs : sequence of FigureSpec
+        Figures to build; names must be unique.
+    outdir : str, optional
+        Output directory; holds ``<name>.<fmt>`` files and the
+        ``figures.json`` key manifest.
+    fmt : str, optional
+        Output file extension.
+    max_workers : int, optional
+        Size of the process pool; defaults to the number of CPUs. Use 1 to
+        render serially in this process.
+    force : bool, optional
+        Re-render everything.
+
+    Returns
+    -------
+    dict of str to str
+        ``'rendered'`` or ``'cached'`` for every figure name.
+    """
+    names = [s.name for s in specs]
+    if len(set(names)) != len(names):
+        raise ValueError('figure names must be unique')
+    for spec in specs:
+        if spec.renderer not in RENDERERS:
+            raise ValueError('unknown renderer {!r}'.format(spec.renderer))
+    os.makedirs(outdir, exist_ok=True)
+    manifest_path = os.path.join(outdir, FIGURE_MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    status, todo, keys = {}, [], {}
+    for spec in specs:
+        path = os.path.join(outdir, '{}.{}'.format(spec.name, fmt))
+        keys[spec.name] = figure_key(spec)
+        if (not force and manifest.get(spec.name) == keys[spec.name]
+                and os.path.exists(path)):
+            status[spec.name] = 'cached'
+        else:
+            todo.append((spec, path))
+
+    if max_workers == 1 or len(todo) < 2:
+        for task in todo:
+            _render_task(task)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(_render_task, todo))
+    for spec, _ in todo:
+        status[spec.name] = 'rendered'
+        manifest[spec.name] = keys[spec.name]
+
+    tmp = manifest_path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, manifest_path)
+    return status
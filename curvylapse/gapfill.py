@@ -0,0 +1,200 @@
+"""
+Gap filling
+
+Fills missing site-days so monthly lapse rates use the same sensors every
+day, instead of dropping sites by hand as ``lapse_one_month`` does with
+``elevations_km_mo`` (NFN3/NFN4/NFN7 in July, NFN6 in April 2018). Two
+estimators, both computed for every gap at once (Henn et al., 2013):
+
+``'lapse'``
+    The concurrent lapse-rate fit of the sensors that did report,
+    evaluated at the missing sensor's elevation.
+``'neighbor'``
+    A linear regression of the missing sensor on one other sensor, optionally
+    lagged, fitted over their overlapping record. For each gap the best
+    correlated neighbor (and lag) that reported is used.
+
+Every value carries a flag so filled values can be told apart or masked out
+again.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from .regression import batch_linregress
+
+OBSERVED = 0
+FILLED_LAPSE = 1
+FILLED_NEIGHBOR = 2
+MISSING = -1
+
+GapFilled = namedtuple('GapFilled', ['values', 'flag'])
+GapFilled.__doc__ = """\
+Gap-filled values and an int8 flag of the same shape: ``OBSERVED`` (0),
+``FILLED_LAPSE`` (1), ``FILLED_NEIGHBOR`` (2) or ``MISSING`` (-1) where no
+estimator applied."""
+
+
+def lapse_estimate(elevations, temperatures, min_sensors=3):
+    """
+    Value of each concurrent lapse-rate fit at every sensor's elevation.
+
+    Parameters
+    ----------
+    elevations : array_like
+        Sensor elevations, shape (nsensor,).
+    temperatures : array_like
+        Shape (ntime, nsensor), NaN for missing sensors.
+    min_sensors : int, optional
+        Reporting sensors needed for a fit.
+
+    Returns
+    -------
+    ndarray
+        Shape (ntime, nsensor); NaN at time steps with too few sensors.
+    """
+    x = np.asarray(elevations, dtype='float64')
+    fit = batch_linregress(x, temperatures)
+    ok = fit.nobs >= min_sensors
+    slope = np.where(ok, fit.slope, np.nan)[:, np.newaxis]
+    intercept = np.where(ok, fit.intercept, np.nan)[:, np.newaxis]
+    return intercept + slope * x
+
+
+def _shift(values, lag):
+    """Rows moved down by ``lag`` steps (value at t is from t - lag)."""
+    out = np.full_like(values, np.nan)
+    if lag == 0:
+        out[:] = values
+    elif lag > 0:
+        out[lag:] = values[:-lag]
+    else:
+        out[:lag] = values[-lag:]
+    return out
+
+
+def neighbor_regressions(temperatures, lag=0, min_overlap=30):
+    """
+    Pairwise linear regressions of every sensor on every other sensor.
+
+    All pairs are fitted from a handful of (sensor x sensor) matrix products
+    of the masked values.
+
+    Parameters
+    ----------
+    temperatures : array_like
+        Shape (ntime, nsensor), on a regular time axis.
+    lag : int, optional
+        Predictor lag in steps: sensor ``j`` at ``t`` is regressed on sensor
+        ``k`` at ``t - lag``.
+    min_overlap : int, optional
+        Overlapping samples needed for a pair to be used.
+
+    Returns
+    -------
+    slope, intercept, rsquared : ndarray
+        Shape (nsensor, nsensor), target by predictor; NaN for unusable
+        pairs and on the diagonal.
+    """
+    y = np.asarray(temperatures, dtype='float64')
+    pred = _shift(y, lag)
+    ma = (~np.isnan(y)).astype('float64')
+    mb = (~np.isnan(pred)).astype('float64')
+    a = np.where(ma > 0, y, 0.0)
+    b = np.where(mb > 0, pred, 0.0)
+
+    n = ma.T @ mb
+    sa = a.T @ mb
+    sb = ma.T @ b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ssa = (a * a).T @ mb - sa * sa / n
+        ssb = ma.T @ (b * b) - sb * sb / n
+        sab = a.T @ b - sa * sb / n
+        slope = sab / ssb
+        intercept = (sa - slope * sb) / n
+        rsquared = sab * sab / (ssa * ssb)
+    bad = (n < max(min_overlap, 3)) | ~(ssb > 0) | ~(ssa > 0)
+    np.fill_diagonal(bad, True)
+    for m in (slope, intercept, rsquared):
+        m[bad] = np.nan
+    return slope, intercept, rsquared
+
+
+def neighbor_estimate(temperatures, lags=(0,), min_overlap=30):
+    """
+    Best neighbor-regression estimate of every sensor at every time step.
+
+    Returns
+    -------
+    ndarray
+        Shape (ntime, nsensor); NaN where no usable neighbor reported.
+    """
+    y = np.asarray(temperatures, dtype='float64')
+    best = np.full(y.shape, np.nan)
+    best_r2 = np.full(y.shape, -np.inf)
+    for lag in lags:
+        pred = _shift(y, lag)
+        slope, intercept, r2 = neighbor_regressions(y, lag, min_overlap)
+        # candidates (time, target, predictor)
+        est = intercept + slope * pred[:, np.newaxis, :]
+        score = np.where(np.isnan(est), -np.inf, r2)
+        k = score.argmax(axis=2)[..., np.newaxis]
+        top = np.take_along_axis(score, k, axis=2)[..., 0]
+        better = top > best_r2
+        best = np.where(better, np.take_along_axis(est, k, axis=2)[..., 0],
+                        best)
+        best_r2 = np.where(better, top, best_r2)
+    return best
+
+
+def fill_gaps(elevations, temperatures, methods=('lapse',), min_sensors=3,
+              lags=(0,), min_overlap=30):
+    """
+    Fill every missing value of a (time x sensor) matrix.
+
+    Parameters
+    ----------
+    elevations : array_like
+        Sensor elevations, shape (nsensor,).
+    temperatures : array_like
+        Shape (ntime, nsensor), NaN for gaps, e.g. the ``*_AT`` columns of
+        ``All_sites_dailyT.csv``.
+    methods : sequence of {'lapse', 'neighbor'}, optional
+        Estimators in order of preference; a gap left by the first is tried
+        with the next.
+    min_sensors : int, optional
+        Reporting sensors needed for a ``'lapse'`` fill.
+    lags : sequence of int, optional
+        Predictor lags (steps) tried by ``'neighbor'``.
+    min_overlap : int, optional
+        Overlapping samples needed for a ``'neighbor'`` pair.
+
+    Returns
+    -------
+    GapFilled
+
+    Examples
+    --------
+    >>> elev = np.array([0.5, 1.0, 1.5, 2.0])
+    >>> T = np.array([[8.0, 5.0, np.nan, -1.0], [9.0, 6.0, 3.0, 0.0]])
+    >>> out = fill_gaps(elev, T)
+    >>> out.values[0].round(2), out.flag[0]
+    (array([ 8.,  5.,  2., -1.]), array([0, 0, 1, 0], dtype=int8))
+    """
+    y = np.asarray(temperatures, dtype='float64')
+    values = y.copy()
+    flag = np.where(np.isnan(y), MISSING, OBSERVED).astype('int8')
+    for method in methods:
+        if method == 'lapse':
+            est = lapse_estimate(elevations, y, min_sensors)
+            code = FILLED_LAPSE
+        elif method == 'neighbor':
+            est = neighbor_estimate(y, lags, min_overlap)
+            code = FILLED_NEIGHBOR
+        else:
+            raise ValueError('unknown gap-filling method {!r}'.format(method))
+        use = (flag == MISSING) & ~np.isnan(est)
+        values[use] = est[use]
+        flag[use] = code
+    return GapFilled(values, flag)
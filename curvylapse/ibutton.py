@@ -0,0 +1,96 @@
+"""
+iButton raw download reader
+
+Reads the CSV files exported from the iButton sensors (e.g.
+``Lapse2_8-16-16_2180.csv``, ``Lapse7_8-16-16_RH.csv``). Each file starts with
+a free-text mission header whose length depends on the sensor model (the
+original script hard-coded ``skip_header=15`` for DS1921 temperature loggers
+and ``skip_header=20`` for DS1923 temperature/RH loggers), followed by rows of
+
+    12/4/15 2:01:01 PM,C,1.5
+
+The header length is detected from the first row that starts with a date, and
+timestamps are parsed in one vectorized call to ``datetime64[s]`` instead of a
+Python ``strptime`` per row.
+"""
+
+from collections import namedtuple
+import re
+
+import pandas as pd
+
+from .instrument import instrumented
+
+IBUTTON_DATETIME_FORMAT = '%m/%d/%y %I:%M:%S %p'
+
+_DATA_ROW = re.compile(r'^\s*\d{1,2}/\d{1,2}/\d{2,4}[ T]\d{1,2}:\d{2}')
+
+IButtonRecord = namedtuple('IButtonRecord',
+                           ['times', 'values', 'unit', 'header'])
+IButtonRecord.__doc__ = """\
+One iButton download: ``times`` (datetime64[s]), ``values`` (float), the
+``unit`` string of the value column (e.g. 'C' or '%RH') and the mission
+``header`` as a dict of ``key: value`` lines."""
+
+
+def read_header(path, max_lines=100):
+    """
+    Parse the mission header of an iButton export.
+
+    Parameters
+    ----------
+    path : str or path-like
+        iButton CSV file.
+    max_lines : int, optional
+        Give up if no data row is found within this many lines.
+
+    Returns
+    -------
+    nheader : int
+        Number of lines before the first data row.
+    header : dict
+        ``key: value`` pairs found in the header, stripped of whitespace.
+    """
+    header = {}
+    with open(path, 'r', errors='replace') as f:
+        for nheader, line in enumerate(f):
+            if _DATA_ROW.match(line):
+                return nheader, header
+            if nheader >= max_lines:
+                break
+            key, sep, value = line.partition(':')
+            if sep:
+                header[key.strip()] = value.strip()
+    raise ValueError('no iButton data rows found in {}'.format(path))
+
+
+@instrumented('load', rows=lambda r: r.values.shape[0])
+def read_ibutton_csv(path, dtype='float64',
+                     datetime_format=IBUTTON_DATETIME_FORMAT):
+    """
+    Read one raw iButton CSV export.
+
+    Parameters
+    ----------
+    path : str or path-like
+        iButton CSV file.
+    dtype : str or numpy.dtype, optional
+        Value dtype. ``'float32'`` halves memory and is ample for the 0.0625
+        deg C / 0.04 %RH sensor resolution.
+    datetime_format : str, optional
+        ``strftime`` format of the timestamp column.
+
+    Returns
+    -------
+    IButtonRecord
+    """
+    nheader, header = read_header(path)
+    table = pd.read_csv(path, skiprows=nheader, header=None,
+                        usecols=[0, 1, 2], names=['time', 'unit', 'value'],
+                        skipinitialspace=True)
+    times = pd.to_datetime(table['time'].str.strip(), format=datetime_format)
+    values = pd.to_numeric(table['value'], errors='coerce')
+    unit = table['unit'].iloc[0] if len(table) else ''
+    return IButtonRecord(times.values.astype('datetime64[s]'),
+                         values.values.astype(dtype),
+                         str(unit).strip(), header)
@@ -0,0 +1,262 @@
+"""
+Incremental lapse-rate updates
+
+Keeps running sufficient statistics so a new field download only updates the
+days and periods it touches instead of reprocessing the record from December
+2015. The state holds
+
+* per-day sums, counts, minima and maxima of every sensor (daily mean, min,
+  max as in ``daily_Tmean_*``, ``daily_Tmin_*``, ``daily_Tmax_*``);
+* per-period sums of each time step's centered regression sums
+  (:func:`curvylapse.regression.step_sums`), giving a pooled within-step
+  period lapse rate that changes in temperature or in which sensors report
+  during the period do not bias;
+* per-period sums of the per-time-step lapse rates, giving the mean of the
+  sub-daily lapse rates (the original ``LR_<month>`` definition).
+
+State can be saved to and restored from a ``.npz`` file between downloads.
+"""
+
+import numpy as np
+
+from .daily import DailyStats, day_key
+from .regression import batch_linregress, fit_from_step_sums, step_sums
+from .rollup import calendar_fields
+
+_PERIOD_FIELDS = ['n', 'sx', 'sy', 'ssxm', 'ssym', 'ssxym', 'steps',
+                  'slope_sum', 'slope_count']
+
+
+def period_key(times, by):
+    """
+    Sortable integer period key of each time.
+
+    ``by`` is ``'month'`` (months since 1970-01), ``'water_year'`` or
+    ``'year'``.
+    """
+    year, month = calendar_fields(times)
+    if by == 'month':
+        return (year - 1970) * 12 + (month - 1)
+    if by == 'water_year':
+        return year + (month >= 10)
+    if by == 'year':
+        return year
+    raise ValueError('unknown period {!r}'.format(by))
+
+
+def _merge_labels(labels, new):
+    """Union of two sorted label arrays and the positions of each in it."""
+    merged = np.union1d(labels, new)
+    return (merged, np.searchsorted(merged, labels),
+            np.searchsorted(merged, new))
+
+
+def _grow(array, size, positions, fill):
+    out = np.full((size,) + array.shape[1:], fill, dtype=array.dtype)
+    out[positions] = array
+    return out
+
+
+class IncrementalLapseRate:
+    """
+    Running daily and per-period lapse-rate statistics.
+
+    Parameters
+    ----------
+    elevations : array_like
+        Sensor elevations (km for deg C/km), shape (nsensor,).
+    by : {'month', 'water_year', 'year'}, optional
+        Period used for the rolled-up lapse rates.
+
+    Attributes
+    ----------
+    last_time : ndarray of datetime64[s]
+        Latest sample counted for each sensor, NaT before its first.
+    skipped : int
+        Samples of the last :meth:`update` that were already counted.
+
+    Examples
+    --------
+    ::
+
+        inc = IncrementalLapseRate.load('state.npz')
+        fit = inc.update(aligned.times, aligned.values)   # new rows only
+        inc.save('state.npz')
+        labels, monthly = inc.period_fit()
+    """
+
+    def __init__(self, elevations, by='month'):
+        self.elevations = np.asarray(elevations, dtype='float64')
+        self.by = by
+        nsensor = self.elevations.size
+        self.last_time = np.full(nsensor, np.datetime64('NaT', 's'))
+        self.skipped = 0
+        self.days = np.empty(0, dtype='datetime64[D]')
+        self.day_sum = np.zeros((0, nsensor))
+        self.day_count = np.zeros((0, nsensor), dtype='int64')
+        self.day_min = np.zeros((0, nsensor))
+        self.day_max = np.zeros((0, nsensor))
+        self.periods = np.empty(0, dtype='int64')
+        self.period_sums = np.zeros((0, len(_PERIOD_FIELDS)))
+
+    def update(self, times, temperatures):
+        """
+        Add a batch of time steps.
+
+        A sensor's samples at or before the last time already counted for
+        that sensor are skipped, so an overlapping re-download is not
+        counted twice, while a late download from one sensor fills in the
+        days and periods it covers. The per-step fits of steps that gain
+        samples are redone from the whole row, so the batch must still hold
+        the samples already counted at those steps, as a re-aligned record
+        of every sensor does.
+
+        Parameters
+        ----------
+        times : array_like of datetime64
+            Shape (ntime,), increasing.
+        temperatures : array_like
+            Shape (ntime, nsensor), NaN for missing sensors.
+
+        Returns
+        -------
+        LapseRateResult
+            Per-time-step fits of the rows that gained samples.
+        """
+        times = np.asarray(times, dtype='datetime64[s]')
+        y = np.asarray(temperatures, dtype='float64')
+        counted = ((times[:, np.newaxis] <= self.last_time)
+                   & ~np.isnan(y))
+        self.skipped = int(counted.sum())
+        fresh = np.where(counted, np.nan, y)
+        has = ~np.isnan(fresh)
+        rows = has.any(axis=1)
+        times, y, fresh = times[rows], y[rows], fresh[rows]
+        counted, has = counted[rows], has[rows]
+        fit = batch_linregress(self.elevations, y)
+        if times.size == 0:
+            return fit
+        latest = np.where(has, times.astype('int64')[:, np.newaxis],
+                          np.iinfo('int64').min).max(axis=0)
+        self.last_time = np.fmax(self.last_time,
+                                 latest.astype('datetime64[s]'))
+        self._update_days(times, fresh)
+        self._update_periods(times, y, fit.slope, counted)
+        return fit
+
+    def _update_days(self, times, y):
+        days = day_key(times)
+        uniq, codes = np.unique(days, return_inverse=True)
+        merged, old_pos, new_pos = _merge_labels(self.days, uniq)
+        size = merged.size
+        self.day_sum = _grow(self.day_sum, size, old_pos, 0.0)
+        self.day_count = _grow(self.day_count, size, old_pos, 0)
+        self.day_min = _grow(self.day_min, size, old_pos, np.nan)
+        self.day_max = _grow(self.day_max, size, old_pos, np.nan)
+        self.days = merged
+
+        rows = new_pos[codes]
+        valid = ~np.isnan(y)
+        np.add.at(self.day_sum, rows, np.where(valid, y, 0.0))
+        np.add.at(self.day_count, rows, valid.astype('int64'))
+        np.fmin.at(self.day_min, rows, y)
+        np.fmax.at(self.day_max, rows, y)
+
+    def _step_rows(self, y, slope):
+        has_slope = ~np.isnan(slope)
+        return np.column_stack([
+            step_sums(self.elevations, y), np.where(has_slope, slope, 0.0),
+            has_slope])
+
+    def _update_periods(self, times, y, slope, counted):
+        keys = period_key(times, self.by)
+        uniq, codes = np.unique(keys, return_inverse=True)
+        merged, old_pos, new_pos = _merge_labels(self.periods, uniq)
+        self.period_sums = _grow(self.period_sums, merged.size, old_pos, 0.0)
+        self.periods = merged
+
+        rows = new_pos[codes]
+        np.add.at(self.period_sums, rows, self._step_rows(y, slope))
+        # steps revised by a late download: take out what they added before
+        revised = counted.any(axis=1)
+        if revised.any():
+            old = np.where(counted[revised], y[revised], np.nan)
+            old_slope = batch_linregress(self.elevations, old).slope
+            np.subtract.at(self.period_sums, rows[revised],
+                           self._step_rows(old, old_slope))
+
+    def daily(self):
+        """
+        Daily statistics of everything added so far.
+
+        Returns
+        -------
+        DailyStats
+            Only days with at least one row are included.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(self.day_count > 0,
+                            self.day_sum / self.day_count, np.nan)
+        return DailyStats(self.days.copy(), mean, self.day_min.copy(),
+                          self.day_max.copy(), self.day_count.copy())
+
+    def period_labels(self):
+        """Period labels: ``datetime64[M]`` for months, else int years."""
+        if self.by == 'month':
+            return self.periods.astype('datetime64[M]')
+        return self.periods.copy()
+
+    def period_fit(self):
+        """
+        Pooled within-step lapse-rate fit of all samples in each period.
+
+        Every time step is centered on its own means before pooling, so a
+        sensor missing part of the period does not bias the slope.
+
+        Returns
+        -------
+        labels : ndarray
+        fit : LapseRateResult
+        """
+        nstep = _PERIOD_FIELDS.index('steps') + 1
+        return self.period_labels(), fit_from_step_sums(
+            self.period_sums[:, :nstep])
+
+    def period_mean_slope(self):
+        """
+        Mean of the per-time-step lapse rates in each period.
+
+        Returns
+        -------
+        labels, mean_slope, count : ndarray
+        """
+        total = self.period_sums[:, _PERIOD_FIELDS.index('slope_sum')]
+        count = self.period_sums[:, _PERIOD_FIELDS.index('slope_count')]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, total / count, np.nan)
+        return self.period_labels(), mean, count.astype('int64')
+
+    def save(self, path):
+        """Write the running state to a ``.npz`` file."""
+        np.savez(path, elevations=self.elevations, by=np.array(self.by),
+                 last_time=self.last_time,
+                 days=self.days, day_sum=self.day_sum,
+                 day_count=self.day_count, day_min=self.day_min,
+                 day_max=self.day_max, periods=self.periods,
+                 period_sums=self.period_sums)
+
+    @classmethod
+    def load(cls, path):
+        """Restore a state written by :meth:`save`."""
+        with np.load(path) as data:
+            inc = cls(data['elevations'], str(data['by']))
+            # older states hold one last time shared by every sensor
+            inc.last_time = np.broadcast_to(
+                data['last_time'], inc.elevations.shape).copy()
+            for name in ('days', 'day_sum', 'day_count', 'day_min',
+                         'day_max', 'periods', 'period_sums'):
+                setattr(inc, name, data[name])
+        if inc.period_sums.shape[1] != len(_PERIOD_FIELDS):
+            raise ValueError('{} holds period sums of an older format; '
+                             'rebuild the state'.format(path))
+        return inc
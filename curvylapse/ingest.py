@@ -0,0 +1,302 @@
+"""
+Daily file ingest
+
+Discovers the per-site, per-season daily files in ``Daily/`` by file name,
+takes each file's site from the logger named in its header, parses them in
+parallel and merges them into one wide table with the column
+names used by ``All_sites_dailyT.csv`` and the YODA export (``NFN1_AT``,
+``NFN4_ST``, ``NFN7_RH``, ...). Replaces the hand-written ``pd.read_csv`` and
+``combine_first`` cells of the ``archive/consolidate_daily*.ipynb`` notebooks.
+:func:`ingest_raw` does the same for folders of raw iButton downloads, giving
+one record per site and variable ready for
+:func:`curvylapse.align.align_sensors`.
+
+Recognised file names::
+
+    2017_NFN5_dailyRH.csv          (Daily/ naming)
+    2018_NFN7_2018_dailyT.csv
+    2016_NFN4_dailyT_ground.csv
+    Lapse5_data_2017_dailyT.csv    (naming used by the consolidate notebooks)
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from .ibutton import read_ibutton_csv
+from .instrument import instrumented
+from .registry import site_of
+
+DailyFile = namedtuple('DailyFile', ['path', 'site', 'year', 'variable'])
+DailyFile.__doc__ = """\
+A discovered daily file. ``site`` is the ODM site code (``NFN5``),
+``variable`` is ``AT`` (air), ``ST`` (ground) or ``RH``. The site is that
+of the logger named in the file's header where it names one, as the file
+name can be wrong (``2018_NFN2_dailyT.csv`` holds Lapse3 data from NFN3)."""
+
+RawFile = namedtuple('RawFile', ['path', 'site'])
+RawFile.__doc__ = """\
+A discovered raw iButton download and the ODM site code (``NFN2``) of its
+sensor."""
+
+_RAW_PATTERN = re.compile(r'^(?:Lapse(?P<lapse>\d+)|(?P<site>NFN\d+))_'
+                          r'.*\.csv$', re.IGNORECASE)
+
+_HEADER_LOGGER = re.compile(r'Lapse\d+')
+
+_PATTERNS = [
+    re.compile(r'^(?P<year>\d{4})_(?P<site>NFN\d+)_(?:\d{4}_)?'
+               r'daily(?P<var>T|RH)(?P<ground>_ground)?\.csv$'),
+    re.compile(r'^Lapse(?P<lapse>\d+)_data_(?P<year>\d{4})_'
+               r'daily(?P<var>T|RH|Tground)(?P<ground>_ground)?\.csv$'),
+]
+
+
+def parse_daily_filename(name):
+    """
+    Site, year and variable encoded in a daily file name.
+
+    Returns
+    -------
+    tuple of (str, int, str) or None
+        ``(site, year, variable)``, or None if the name is not recognised.
+    """
+    for pattern in _PATTERNS:
+        match = pattern.match(os.path.basename(name))
+        if match is None:
+            continue
+        groups = match.groupdict()
+        site = groups.get('site') or site_of('Lapse' + groups['lapse'])
+        if groups['var'] == 'RH':
+            variable = 'RH'
+        elif groups['ground'] or groups['var'] == 'Tground':
+            variable = 'ST'
+        else:
+            variable = 'AT'
+        return site, int(groups['year']), variable
+    return None
+
+
+def discover_daily_files(directory='Daily'):
+    """
+    List the recognised daily files in ``directory``.
+
+    The site of each file is that of the logger its header names
+    (``AirT_Lapse3_daily_mean``), falling back to the site in the file name.
+
+    Returns
+    -------
+    list of DailyFile
+        Sorted by site, variable, year and path, the order in which
+        :func:`merge_daily` lets earlier files take precedence.
+    """
+    found = []
+    for name in os.listdir(directory):
+        parsed = parse_daily_filename(name)
+        if parsed is not None:
+            site, year, variable = parsed
+            path = os.path.join(directory, name)
+            found.append(DailyFile(path, _header_site(path, site), year,
+                                   variable))
+    return sorted(found, key=lambda f: (f.site, f.variable, f.year, f.path))
+
+
+def _header_site(path, default):
+    """Site of the logger named in a daily file's header, or ``default``."""
+    with open(path) as f:
+        match = _HEADER_LOGGER.search(f.readline())
+    return default if match is None else site_of(match.group(0))
+
+
+def read_daily_file(path):
+    """
+    Read one two-column daily file.
+
+    Handles both the ISO (``2016-08-16``) and US (``8/16/2016``) date styles
+    found in ``Daily/`` and ignores trailing empty columns.
+
+    Returns
+    -------
+    dates : ndarray of datetime64[D]
+    values : ndarray of float64
+    """
+    table = pd.read_csv(path, usecols=[0, 1], header=0,
+                        names=['time', 'value'])
+    text = table['time'].astype(str).str.strip()
+    fmt = '%Y-%m-%d' if len(text) and '-' in text.iloc[0] else '%m/%d/%Y'
+    dates = pd.to_datetime(text, format=fmt).values.astype('datetime64[D]')
+    values = pd.to_numeric(table['value'], errors='coerce').values
+    return dates, values.astype('float64')
+
+
+def merge_daily(files, parsed):
+    """
+    Merge parsed daily files into one wide table on a continuous day axis.
+
+    Where files for the same site and variable overlap (the swap day of a
+    field download), the earlier file in ``files`` order wins and later files
+    only fill its gaps, as the ``combine_first`` chains of the consolidation
+    notebooks do. Over the days ``All_sites_dailyT.csv`` covers, the result
+    has its columns and values except on three swap days where that table
+    kept the later file.
+
+    Parameters
+    ----------
+    files : sequence of DailyFile
+    parsed : sequence of (dates, values)
+        Output of :func:`read_daily_file` for each entry of ``files``.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Indexed by date, one float64 column per ``<site>_<variable>``.
+    """
+    nonempty = [dates for dates, _ in parsed if dates.size]
+    if not nonempty:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='date'))
+    start = min(d.min() for d in nonempty)
+    end = max(d.max() for d in nonempty)
+    ndays = int((end - start).astype('int64')) + 1
+
+    columns = {}
+    for f, (dates, values) in zip(files, parsed):
+        key = '{}_{}'.format(f.site, f.variable)
+        column = columns.setdefault(key, np.full(ndays, np.nan))
+        slot = (dates - start).astype('int64')
+        empty = np.isnan(column[slot])
+        column[slot[empty]] = values[empty]
+
+    index = pd.DatetimeIndex(np.arange(start, end + np.timedelta64(1, 'D'),
+                                       dtype='datetime64[D]'), name='date')
+    return pd.DataFrame({key: columns[key] for key in sorted(columns)},
+                        index=index)
+
+
+@instrumented('load daily', rows=len)
+def ingest_daily(directory='Daily', max_workers=None):
+    """
+    Discover, parse in parallel and merge every daily file in a directory.
+
+    Parameters
+    ----------
+    directory : str or path-like, optional
+        Folder holding the daily files.
+    max_workers : int, optional
+        Size of the process pool; defaults to the number of CPUs. Use 1 to
+        parse serially in this process.
+
+    Returns
+    -------
+    pandas.DataFrame
+        See :func:`merge_daily`.
+    """
+    files = discover_daily_files(directory)
+    paths = [f.path for f in files]
+    if max_workers == 1 or len(paths) < 2:
+        parsed = [read_daily_file(p) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            parsed = list(pool.map(read_daily_file, paths))
+    return merge_daily(files, parsed)
+
+
+def discover_raw_files(directories):
+    """
+    List the raw iButton downloads under one or more folders.
+
+    Files named ``Lapse<N>_*.csv`` or ``NFN<N>_*.csv`` (e.g.
+    ``Lapse2_8-16-16_2180.csv``, ``Lapse7_8-16-16_RH.csv``) are found in
+    the folders and their subfolders; daily files are skipped. Loggers are
+    mapped to sites by :func:`curvylapse.registry.site_of`.
+
+    Returns
+    -------
+    list of RawFile
+        Sorted by site and path.
+    """
+    if isinstance(directories, (str, os.PathLike)):
+        directories = [directories]
+    found = []
+    for directory in directories:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames.sort()
+            for name in filenames:
+                match = _RAW_PATTERN.match(name)
+                if match is None or parse_daily_filename(name) is not None:
+                    continue
+                site = site_of(match.group('site').upper()
+                               if match.group('site')
+                               else 'Lapse' + match.group('lapse'))
+                found.append(RawFile(os.path.join(dirpath, name), site))
+    return sorted(found, key=lambda f: (f.site, f.path))
+
+
+def merge_raw(files, records):
+    """
+    Combine raw downloads into one record per site and variable.
+
+    The variable is ``RH`` for files whose unit is ``%RH`` and ``AT``
+    otherwise. Samples are sorted by time; where downloads overlap, the
+    download that starts first wins, as the ``combine_first`` chains of the
+    consolidation notebooks let the earlier season win.
+
+    Parameters
+    ----------
+    files : sequence of RawFile
+    records : sequence of IButtonRecord
+        Output of :func:`curvylapse.ibutton.read_ibutton_csv` for each entry
+        of ``files``.
+
+    Returns
+    -------
+    dict of str to (times, values)
+        Keyed by ``<site>_<variable>`` (``NFN7_RH``), sorted by key.
+    """
+    parts = {}
+    for f, rec in zip(files, records):
+        variable = 'RH' if 'RH' in rec.unit.upper() else 'AT'
+        parts.setdefault('{}_{}'.format(f.site, variable), []).append(rec)
+    series = {}
+    for key in sorted(parts):
+        parts[key].sort(key=lambda r: [r.times.min()] if r.times.size
+                        else [])
+        times = np.concatenate([r.times for r in parts[key]])
+        values = np.concatenate([r.values for r in parts[key]])
+        order = np.argsort(times, kind='stable')
+        times, values = times[order], values[order]
+        first = np.append(True, times[1:] != times[:-1])
+        series[key] = (times[first], values[first])
+    return series
+
+
+@instrumented('load raw', rows=lambda s: sum(t.size for t, _ in s.values()))
+def ingest_raw(directories, max_workers=None):
+    """
+    Discover, parse in parallel and merge raw iButton downloads.
+
+    Parameters
+    ----------
+    directories : str, path-like or sequence of them
+        Download folders, searched recursively.
+    max_workers : int, optional
+        Size of the process pool; defaults to the number of CPUs. Use 1 to
+        parse serially in this process.
+
+    Returns
+    -------
+    dict of str to (times, values)
+        See :func:`merge_raw`; pass it to
+        :func:`curvylapse.align.align_sensors`.
+    """
+    files = discover_raw_files(directories)
+    paths = [f.path for f in files]
+    if max_workers == 1 or len(paths) < 2:
+        records = [read_ibutton_csv(p) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            records = list(pool.map(read_ibutton_csv, paths))
+    return merge_raw(files, records)
@@ -0,0 +1,247 @@
+"""
+Stage instrumentation
+
+Records wall time, memory and rows processed for each analysis stage (load,
+daily aggregation, alignment, regression, segmented regression, RH
+thresholds, rollups -- the ``#%%`` cells of the original script) so a slow
+run can be traced to its stage from a report instead of a profiler session.
+
+Instrumentation is off by default and then costs one flag check per call.
+Turn it on with :func:`enable` or the ``CURVYLAPSE_PROFILE`` environment
+variable:
+
+``CURVYLAPSE_PROFILE=1``
+    record stages; read them with :func:`report`
+``CURVYLAPSE_PROFILE=report.json`` (or ``.csv``)
+    also write the report to that file when the interpreter exits
+
+Library functions are wrapped with :func:`instrumented`; any block can be
+timed with the :func:`stage` context manager. Memory is the peak of
+``tracemalloc``-traced allocations during the stage (Python and NumPy
+buffers) and the process peak RSS at its end. Stages may nest; each record
+names its parent.
+"""
+
+import atexit
+import contextlib
+import csv
+import functools
+import json
+import os
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+ENV_VAR = 'CURVYLAPSE_PROFILE'
+
+FIELDS = ['stage', 'parent', 'calls', 'seconds', 'rows', 'peak_traced_mb',
+          'max_rss_mb']
+
+_state = {'enabled': False, 'memory': False, 'records': [], 'stack': []}
+
+
+def enable(memory=True):
+    """Start recording stages; ``memory`` also traces allocations."""
+    _state['enabled'] = True
+    _state['memory'] = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """Stop recording. Records already taken are kept."""
+    _state['enabled'] = False
+    if _state['memory'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _state['memory'] = False
+
+
+def is_enabled():
+    return _state['enabled']
+
+
+def reset():
+    """Discard all records."""
+    del _state['records'][:]
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024.0 ** 2 if os.uname().sysname == 'Darwin' else 1024.0)
+
+
+def _count_rows(value):
+    if value is None:
+        return None
+    shape = getattr(value, 'shape', None)
+    if shape:
+        return int(shape[0])
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+@contextlib.contextmanager
+def stage(name, rows=None):
+    """
+    Record one stage.
+
+    Parameters
+    ----------
+    name : str
+        Stage name in the report.
+    rows : int, optional
+        Rows (time steps, samples, files) processed. Can also be set inside
+        the block through the yielded dict.
+
+    Examples
+    --------
+    ::
+
+        with stage('segment regress', rows=len(T)):
+            fit = segmented_linregress(z, T, segments)
+
+        with stage('load') as rec:
+            table = ingest_daily('Daily')
+            rec['rows'] = len(table)
+    """
+    if not _state['enabled']:
+        yield {}
+        return
+    memory = _state['memory'] and tracemalloc.is_tracing()
+    stack = _state['stack']
+    if memory:
+        _, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+    frame = {'name': name, 'rows': rows, 'peak': 0,
+             'base': tracemalloc.get_traced_memory()[0] if memory else 0}
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield frame
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        peak_mb = None
+        if memory:
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(frame['peak'], peak)
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            peak_mb = max(peak - frame['base'], 0) / 1024.0 ** 2
+        _state['records'].append({
+            'stage': name,
+            'parent': stack[-1]['name'] if stack else None,
+            'calls': 1,
+            'seconds': seconds,
+            'rows': frame['rows'],
+            'peak_traced_mb': peak_mb,
+            'max_rss_mb': _max_rss_mb(),
+        })
+
+
+def instrumented(name=None, rows=0):
+    """
+    Decorator recording every call of a function as a stage.
+
+    Parameters
+    ----------
+    name : str, optional
+        Stage name; defaults to ``module.function``.
+    rows : int, str or callable, optional
+        Positional index or keyword name of the argument whose length is
+        reported as rows processed, or a function of the return value giving
+        the rows; None records no rows.
+    """
+    def decorate(func):
+        label = name or '{}.{}'.format(func.__module__.rsplit('.', 1)[-1],
+                                       func.__name__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state['enabled']:
+                return func(*args, **kwargs)
+            arg = None
+            if isinstance(rows, str):
+                arg = kwargs.get(rows)
+            elif isinstance(rows, int) and len(args) > rows:
+                arg = args[rows]
+            with stage(label, _count_rows(arg)) as rec:
+                result = func(*args, **kwargs)
+                if callable(rows):
+                    rec['rows'] = rows(result)
+            return result
+        return wrapper
+    return decorate
+
+
+def report(aggregate=False):
+    """
+    Recorded stages.
+
+    Parameters
+    ----------
+    aggregate : bool, optional
+        Combine records with the same stage and parent: seconds and rows are
+        summed, memory figures are maxima.
+
+    Returns
+    -------
+    list of dict
+        One dict per record with the keys in :data:`FIELDS`.
+    """
+    records = [dict(r) for r in _state['records']]
+    if not aggregate:
+        return records
+    merged = {}
+    for r in records:
+        key = (r['stage'], r['parent'])
+        m = merged.get(key)
+        if m is None:
+            merged[key] = r
+            continue
+        m['calls'] += r['calls']
+        m['seconds'] += r['seconds']
+        if r['rows'] is not None:
+            m['rows'] = (m['rows'] or 0) + r['rows']
+        for field in ('peak_traced_mb', 'max_rss_mb'):
+            if r[field] is not None:
+                m[field] = max(m[field] or 0, r[field])
+    return list(merged.values())
+
+
+def write_report(path, aggregate=True):
+    """Write :func:`report` as JSON, or as CSV if ``path`` ends in .csv."""
+    rows = report(aggregate)
+    if path.lower().endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, 'w') as f:
+            json.dump(rows, f, indent=1)
+    return path
+
+
+def _from_environment():
+    value = os.environ.get(ENV_VAR, '').strip()
+    if value in ('', '0'):
+        return
+    enable()
+    if value.lower() not in ('1', 'true', 'yes', 'on'):
+        atexit.register(write_report, value)
+
+
+_from_environment()
@@ -0,0 +1,160 @@
+"""
+Inversions and freezing level
+
+Batch diagnostics of the fitted temperature profiles for every time step:
+
+* inversion flags -- a segment (``LR_23_4``, ``LR_4_6``, ``LR_6_7`` of the
+  original script, or any :func:`~.regression.segmented_linregress` output)
+  whose temperature rises with elevation;
+* freezing level -- the elevation where the fitted profile crosses 0 deg C
+  (the "0 C Isotherm" the 2020 figures notebook draws per site), the
+  rain/snow partition input of the snow model;
+* inversion frequency, number of events and event duration per month or water
+  year (any :mod:`~.rollup` grouping).
+
+Flags follow the other state arrays: 1.0 inverted, 0.0 not, NaN without a
+fit.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from .rollup import group_codes, reduce_groups
+from .runs import find_runs
+
+FreezingLevel = namedtuple('FreezingLevel', ['elevation', 'crossings'])
+FreezingLevel.__doc__ = """\
+Freezing-level ``elevation`` of every time step (NaN when the profile does
+not cross 0 deg C) and the number of ``crossings`` found; more than one means
+an inversion put a warm layer above sub-freezing air and ``elevation`` is the
+highest crossing."""
+
+InversionSummary = namedtuple('InversionSummary',
+                              ['labels', 'frequency', 'events',
+                               'mean_duration', 'max_duration'])
+InversionSummary.__doc__ = """\
+Per-period inversion statistics, shape (nperiod, nsegment): fraction of
+fitted steps inverted, number of inversion events starting in the period, and
+mean and longest event duration in time steps."""
+
+
+def inversion_flags(slope, threshold=0.0):
+    """
+    Inversion state of every fitted segment and time step.
+
+    Parameters
+    ----------
+    slope : array_like
+        Lapse rates, shape (ntime,) or (ntime, nsegment).
+    threshold : float, optional
+        Slope above which a segment counts as inverted.
+
+    Returns
+    -------
+    ndarray of float64
+        1.0 inverted, 0.0 not, NaN where the slope is NaN.
+    """
+    s = np.asarray(slope, dtype='float64')
+    with np.errstate(invalid='ignore'):
+        return np.where(np.isnan(s), np.nan, (s > threshold).astype('float64'))
+
+
+def freezing_level(slope, intercept, breakpoints=None, extrapolate=True,
+                   freezing=0.0):
+    """
+    Elevation where the fitted profile crosses the freezing point.
+
+    Segment ``k`` is evaluated between ``breakpoints[k]`` and
+    ``breakpoints[k + 1]``; with ``extrapolate`` the lowest and highest
+    segments continue beyond the sensor range, so a profile that is above
+    freezing everywhere still gets a level above the top sensor.
+
+    Parameters
+    ----------
+    slope, intercept : array_like
+        Fits of shape (ntime,) or (ntime, nsegment).
+    breakpoints : array_like, optional
+        Band edges (nsegment + 1 values); needed for several segments.
+    extrapolate : bool, optional
+        Allow crossings outside the breakpoint range.
+    freezing : float, optional
+        Temperature of the isotherm.
+
+    Returns
+    -------
+    FreezingLevel
+
+    Examples
+    --------
+    >>> slope = np.array([[-6.0, -4.0], [-5.0, 3.0]])
+    >>> intercept = np.array([[9.0, 7.0], [4.0, -6.0]])
+    >>> freezing_level(slope, intercept, [0.5, 1.2, 1.8]).elevation
+    array([1.75, 2.  ])
+    """
+    b = np.asarray(slope, dtype='float64')
+    a = np.asarray(intercept, dtype='float64')
+    if b.ndim == 1:
+        b, a = b[:, np.newaxis], a[:, np.newaxis]
+    nseg = b.shape[1]
+    if breakpoints is None:
+        if nseg > 1:
+            raise ValueError('{} segments need breakpoints'.format(nseg))
+        edges = np.array([-np.inf, np.inf])
+    else:
+        edges = np.asarray(breakpoints, dtype='float64').copy()
+        if edges.size != nseg + 1:
+            raise ValueError('{} segments need {} breakpoints'.format(
+                nseg, nseg + 1))
+        if extrapolate:
+            edges[0], edges[-1] = -np.inf, np.inf
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = (freezing - a) / b
+        # a crossing on a shared edge is counted once, in the lower segment
+        inside = (z >= edges[:-1]) & (z <= edges[1:])
+        inside[:, 1:] &= z[:, 1:] > edges[1:-1]
+    inside &= np.isfinite(z)
+    crossings = inside.sum(axis=1)
+    level = np.where(inside, z, -np.inf).max(axis=1)
+    level = np.where(crossings > 0, level, np.nan)
+    return FreezingLevel(level, crossings)
+
+
+def inversion_summary(times, flags, by='month'):
+    """
+    Inversion frequency and event durations per period.
+
+    Parameters
+    ----------
+    times : array_like of datetime64
+        Time of each row, on a regular axis.
+    flags : array_like
+        Output of :func:`inversion_flags`, shape (ntime,) or (ntime,
+        nsegment). A missing step ends an event.
+    by : str or array_like of datetime64
+        Grouping, as for :func:`curvylapse.rollup.rollup`; an event belongs
+        to the period it starts in.
+
+    Returns
+    -------
+    InversionSummary
+    """
+    f = np.asarray(flags, dtype='float64')
+    flat = f.ndim == 1
+    if flat:
+        f = f[:, np.newaxis]
+    codes, labels = group_codes(times, by)
+    nperiod, nseg = len(labels), f.shape[1]
+    frequency = reduce_groups(codes, f, nperiod)[0]
+
+    row, col, length = find_runs(f == 1.0)
+    run_codes = codes[row] * nseg + col
+    run_codes[codes[row] < 0] = -1
+    mean, _, _, longest, events = reduce_groups(run_codes, length,
+                                                nperiod * nseg)
+    out = [frequency, events.reshape(nperiod, nseg),
+           mean.reshape(nperiod, nseg), longest.reshape(nperiod, nseg)]
+    if flat:
+        out = [a[:, 0] for a in out]
+    return InversionSummary(labels, *out)
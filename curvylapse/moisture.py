@@ -0,0 +1,155 @@
+"""
+Wet/dry state from relative humidity
+
+Generalises the original script's ``RH_thold`` / ``RH_thold_day`` (Lapse 7
+only, 100 % threshold, per-day loop) to every RH sensor (NFN1, NFN5, NFN7) at
+once. States are float arrays, 1.0 = wet, 0.0 = dry and NaN where the RH
+sensor has no sample, so they can be averaged and aggregated like the other
+series.
+
+Persistence rules:
+
+* ``min_run`` -- a time step only counts as wet if it is part of at least
+  ``min_run`` consecutive steps at or above the threshold, which drops
+  isolated saturated readings;
+* ``min_wet_steps`` -- a day is wet if it has at least this many wet steps
+  (1 reproduces ``RH_thold_day``).
+"""
+
+import numpy as np
+
+from .daily import day_key
+from .instrument import instrumented
+from .runs import find_runs
+
+
+def _runs_at_least(flags, min_run):
+    """Keep only runs of True at least ``min_run`` long, column by column."""
+    if min_run <= 1:
+        return flags
+    row, col, length = find_runs(flags)
+    long = length >= min_run
+    # +1 at the start and -1 past the end of each long run, per column
+    edge = np.zeros((flags.shape[0] + 1, flags.shape[1]), dtype='int64')
+    np.add.at(edge, (row[long], col[long]), 1)
+    np.add.at(edge, (row[long] + length[long], col[long]), -1)
+    return np.cumsum(edge[:-1], axis=0) > 0
+
+
+@instrumented('RH threshold', rows=0)
+def classify_wet(rh, threshold=100.0, min_run=1):
+    """
+    Sub-daily wet/dry state of every RH sensor.
+
+    Parameters
+    ----------
+    rh : array_like
+        Relative humidity in %, shape (ntime,) or (ntime, nsensor), on a
+        regular time axis (see :func:`curvylapse.align.align_sensors`).
+    threshold : float, optional
+        RH at or above which a step is wet (``RH_Lapse7>=100``).
+    min_run : int, optional
+        Minimum number of consecutive wet steps.
+
+    Returns
+    -------
+    ndarray of float64
+        1.0 wet, 0.0 dry, NaN missing; same shape as ``rh``.
+
+    Examples
+    --------
+    >>> classify_wet([99.0, 100.5, 101.0, np.nan, 100.2], min_run=2)
+    array([ 0.,  1.,  1., nan,  0.])
+    """
+    rh = np.asarray(rh, dtype='float64')
+    flat = rh.ndim == 1
+    if flat:
+        rh = rh[:, np.newaxis]
+    valid = ~np.isnan(rh)
+    with np.errstate(invalid='ignore'):
+        wet = valid & (rh >= threshold)
+    wet = _runs_at_least(wet, int(min_run))
+    state = np.where(valid, wet.astype('float64'), np.nan)
+    return state[:, 0] if flat else state
+
+
+def daily_wet(times, state, min_wet_steps=1):
+    """
+    Daily wet/dry state from sub-daily states.
+
+    Parameters
+    ----------
+    times : array_like of datetime64
+        Time of each row of ``state``, increasing.
+    state : array_like
+        Output of :func:`classify_wet`.
+    min_wet_steps : int, optional
+        Wet steps needed for a wet day.
+
+    Returns
+    -------
+    dates : ndarray of datetime64[D]
+        Days with at least one row.
+    daily_state : ndarray of float64
+        1.0 wet, 0.0 dry, NaN when the sensor has no valid step that day.
+    """
+    days = day_key(times)
+    state = np.asarray(state, dtype='float64')
+    starts = np.concatenate(([0], np.flatnonzero(days[1:] != days[:-1]) + 1))
+    valid = ~np.isnan(state)
+    nwet = np.add.reduceat((state == 1.0).astype('int64'), starts, axis=0)
+    nvalid = np.add.reduceat(valid.astype('int64'), starts, axis=0)
+    daily = np.where(nvalid > 0, (nwet >= min_wet_steps).astype('float64'),
+                     np.nan)
+    return days[starts], daily
+
+
+def split_by_state(values, state):
+    """
+    Mean of ``values`` over wet and over dry steps.
+
+    Reproduces ``LR_rain`` / ``LR_no_rain`` (and the segment versions) for
+    every RH sensor and every value column at once.
+
+    Parameters
+    ----------
+    values : array_like
+        Shape (ntime,) or (ntime, k), e.g. per-step lapse rates of each
+        segment. NaN values are ignored.
+    state : array_like
+        Shape (ntime,) or (ntime, nsensor), from :func:`classify_wet`.
+
+    Returns
+    -------
+    wet_mean, dry_mean : ndarray
+        Shape (nsensor, k); a 1-D input axis is dropped.
+    wet_count, dry_count : ndarray of int64
+        Number of non-NaN values averaged.
+    """
+    v = np.asarray(values, dtype='float64')
+    s = np.asarray(state, dtype='float64')
+    v2 = v[:, np.newaxis] if v.ndim == 1 else v
+    s2 = s[:, np.newaxis] if s.ndim == 1 else s
+    vvalid = ~np.isnan(v2)
+    vfill = np.where(vvalid, v2, 0.0)
+    vcount = vvalid.astype('float64')
+
+    out = []
+    for flag in (1.0, 0.0):
+        m = (s2 == flag).astype('float64')
+        total = m.T @ vfill
+        count = m.T @ vcount
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, total / count, np.nan)
+        out.append((mean, count.astype('int64')))
+    (wet_mean, wet_count), (dry_mean, dry_count) = out
+
+    def squeeze(a):
+        if s.ndim == 1:
+            a = a[0]
+        if v.ndim == 1:
+            a = a[..., 0]
+        return a
+
+    return (squeeze(wet_mean), squeeze(dry_mean), squeeze(wet_count),
+            squeeze(dry_count))
@@ -0,0 +1,215 @@
+"""
+ODM1 export loader
+
+Reads the long-format CUAHSI ODM1 export in ``HydroServer-ODM1/``
+(``datavalues.csv`` plus the ``sites``, ``variables``, ``methods``,
+``sources`` and ``qualitycontrollevels`` sidecar tables) so analyses can run
+straight from the archive without the separately exported wide CSV.
+
+The code columns are dictionary-encoded to small integers, ``NoDataValue``
+(-9999) becomes NaN, and the rows are sorted once by (site, variable, quality
+control level, time). Every (site, variable, QC level) series is then a
+contiguous block, and :meth:`ODMDataset.series` returns zero-copy views.
+"""
+
+from collections import namedtuple
+import os
+
+import numpy as np
+import pandas as pd
+
+SeriesKey = namedtuple('SeriesKey', ['site', 'variable', 'qc'])
+
+
+def _parse_dates(text):
+    text = text.astype(str).str.strip()
+    try:
+        return pd.to_datetime(text, format='%m/%d/%Y')
+    except ValueError:
+        return pd.to_datetime(text)
+
+
+class ODMDataset:
+    """
+    Dictionary-encoded, indexed ODM1 data values.
+
+    Attributes
+    ----------
+    times : ndarray of datetime64[s]
+        ``LocalDateTime`` of every row.
+    values : ndarray of float64
+        ``DataValue``, NaN where it equals the variable's ``NoDataValue``.
+    codes : dict of str to ndarray of int
+        Integer codes of ``site``, ``variable``, ``method``, ``source`` and
+        ``qc`` for every row.
+    categories : dict of str to ndarray
+        Code-to-label lookup for each coded column.
+    sites, variables, methods, sources, qc_levels : pandas.DataFrame
+        Sidecar tables, indexed by their code column.
+    index : dict of SeriesKey to slice
+        Row range of every (site, variable, QC level) series.
+
+    Examples
+    --------
+    ::
+
+        odm = load_odm1('HydroServer-ODM1')
+        times, values = odm.series('NFN7', 'AirTemp_avg')
+    """
+
+    _COLUMNS = [('site', 'SiteCode'), ('variable', 'VariableCode'),
+                ('method', 'MethodCode'), ('source', 'SourceCode'),
+                ('qc', 'QualityControlLevelCode')]
+
+    def __init__(self, directory='HydroServer-ODM1'):
+        def sidecar(name, key):
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                return None
+            return pd.read_csv(path).set_index(key)
+
+        self.sites = sidecar('sites.csv', 'SiteCode')
+        self.variables = sidecar('variables.csv', 'VariableCode')
+        self.methods = sidecar('methods.csv', 'MethodCode')
+        self.sources = sidecar('sources.csv', 'SourceCode')
+        self.qc_levels = sidecar('qualitycontrollevels.csv',
+                                 'QualityControlLevelCode')
+
+        raw = pd.read_csv(os.path.join(directory, 'datavalues.csv'))
+        self.codes = {}
+        self.categories = {}
+        for short, column in self._COLUMNS:
+            codes, uniques = pd.factorize(raw[column], sort=True)
+            dtype = 'int8' if len(uniques) < 128 else 'int32'
+            self.codes[short] = codes.astype(dtype)
+            self.categories[short] = np.asarray(uniques)
+        times = _parse_dates(raw['LocalDateTime']).values.astype(
+            'datetime64[s]')
+        values = raw['DataValue'].values.astype('float64')
+
+        nodata = np.full(len(self.categories['variable']), np.nan)
+        if self.variables is not None and 'NoDataValue' in self.variables:
+            lookup = self.variables['NoDataValue']
+            for i, code in enumerate(self.categories['variable']):
+                if code in lookup.index:
+                    nodata[i] = lookup[code]
+        values[values == nodata[self.codes['variable']]] = np.nan
+
+        order = np.lexsort((times.astype('int64'), self.codes['qc'],
+                            self.codes['variable'], self.codes['site']))
+        self.times = times[order]
+        self.values = values[order]
+        for short in self.codes:
+            self.codes[short] = self.codes[short][order]
+        self.index = self._build_index()
+
+    def _build_index(self):
+        site, variable, qc = (self.codes['site'], self.codes['variable'],
+                              self.codes['qc'])
+        if site.size == 0:
+            return {}
+        change = ((site[1:] != site[:-1]) | (variable[1:] != variable[:-1])
+                  | (qc[1:] != qc[:-1]))
+        starts = np.concatenate(([0], np.flatnonzero(change) + 1))
+        stops = np.append(starts[1:], site.size)
+        index = {}
+        for start, stop in zip(starts, stops):
+            key = SeriesKey(self.categories['site'][site[start]],
+                            self.categories['variable'][variable[start]],
+                            self.categories['qc'][qc[start]].item())
+            index[key] = slice(int(start), int(stop))
+        return index
+
+    def keys(self, site=None, variable=None, qc=None):
+        """Series keys matching the given site, variable and QC level."""
+        return [k for k in self.index
+                if (site is None or k.site == site)
+                and (variable is None or k.variable == variable)
+                and (qc is None or k.qc == qc)]
+
+    def series(self, site, variable, qc=None):
+        """
+        Times and values of one series as views into the sorted arrays.
+
+        Parameters
+        ----------
+        site, variable : str
+            ``SiteCode`` and ``VariableCode``.
+        qc : int, optional
+            ``QualityControlLevelCode``; required only if the series exists
+            at several levels.
+
+        Returns
+        -------
+        times : ndarray of datetime64[s]
+        values : ndarray of float64
+        """
+        keys = self.keys(site, variable, qc)
+        if not keys:
+            raise KeyError((site, variable, qc))
+        if len(keys) > 1:
+            raise KeyError('{} {} exists at QC levels {}; pass qc'.format(
+                site, variable, sorted(k.qc for k in keys)))
+        rows = self.index[keys[0]]
+        return self.times[rows], self.values[rows]
+
+    def methods_of(self, site, variable, qc=None):
+        """Method codes of each row of :meth:`series`."""
+        rows = self.index[self.keys(site, variable, qc)[0]]
+        return self.categories['method'][self.codes['method'][rows]]
+
+    def pivot(self, variable, qc=None, sites=None):
+        """
+        Wide (time x site) table of one variable.
+
+        Only the requested series are touched; each is placed on the union of
+        their times with ``searchsorted``.
+
+        Parameters
+        ----------
+        variable : str
+            ``VariableCode``.
+        qc : int, optional
+            ``QualityControlLevelCode``.
+        sites : list of str, optional
+            Columns to include; defaults to every site with the variable.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Indexed by ``LocalDateTime``, one column per site.
+        """
+        keys = self.keys(variable=variable, qc=qc)
+        if sites is not None:
+            keys = [k for k in keys if k.site in sites]
+        names = [k.site for k in keys]
+        if len(set(names)) != len(names):
+            raise KeyError('{} exists at several QC levels; pass qc'.format(
+                variable))
+        rows = [self.index[k] for k in keys]
+        times = np.unique(np.concatenate(
+            [self.times[r] for r in rows] or [self.times[:0]]))
+        table = np.full((times.size, len(keys)), np.nan)
+        for j, r in enumerate(rows):
+            table[np.searchsorted(times, self.times[r]), j] = self.values[r]
+        return pd.DataFrame(table, index=pd.DatetimeIndex(
+            times, name='LocalDateTime'), columns=names)
+
+
+def read_elevations(path='Elevation.csv'):
+    """
+    Site elevations (m) keyed by ODM site code, from ``Elevation.csv``.
+
+    ``LapseN`` rows map to site ``NFNN``; rows without a value are skipped.
+    """
+    table = pd.read_csv(path, skipinitialspace=True, na_values=['NA'])
+    out = {}
+    for sensor, elev in zip(table.iloc[:, 0], table.iloc[:, 1]):
+        if pd.notna(elev):
+            out['NFN' + str(sensor).replace('Lapse', '')] = float(elev)
+    return out
+
+
+def load_odm1(directory='HydroServer-ODM1'):
+    """Load and index an ODM1 export folder. See :class:`ODMDataset`."""
+    return ODMDataset(directory)
@@ -0,0 +1,364 @@
+"""
+End-to-end pipeline
+
+Runs the whole analysis -- ingest, align, daily aggregate, lapse regression,
+rollups, figures and CSV exports -- from one configuration, replacing the
+consolidation notebook (with its hard-coded ``path_daily``), the figures
+notebook and the copying of CSVs between them::
+
+    python -m curvylapse --set by=water_year
+    python -m curvylapse --config nooksack.json --set estimator=huber
+
+Every stage is declared in :data:`STAGES` with the configuration keys it
+reads and the stages it consumes. Its output is cached under
+``<cache_dir>/pipeline/`` as an ``.npz`` file named by a hash of
+
+* the stage name and :data:`PIPELINE_VERSION`,
+* the source code of the stage function and of the package modules it
+  uses, so editing an estimator invalidates the fits made with it,
+* the values of the configuration keys the stage reads,
+* the fingerprint (path, size, modification time) of the files those keys
+  name, and
+* the hashes of the upstream stages,
+
+so changing one parameter reruns only the stage that reads it and the stages
+downstream of it; everything else is loaded from the cache. The final export
+stage always runs; its figures are skipped by
+:func:`curvylapse.figures.build_figures` when their data did not change.
+
+Two sources are understood: ``Daily/``-style files (:mod:`curvylapse.ingest`,
+the default) and folders of raw iButton CSV exports
+(:func:`curvylapse.ingest.ingest_raw`, set ``raw``).
+"""
+
+import argparse
+from collections import namedtuple
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from . import instrument
+from .align import align_sensors
+from .cache import DEFAULT_CACHE_DIR, source_fingerprint
+from .daily import daily_aggregate
+from .estimators import fit_lapse_rates
+from .figures import FigureSpec, build_figures
+from .ingest import ingest_daily, ingest_raw
+from .registry import site_metadata, site_of
+from .rollup import rollup
+
+PIPELINE_VERSION = 1
+
+DEFAULT_CONFIG = {
+    'daily': 'Daily',           # Daily/ folder (used when raw is None)
+    'raw': None,                # folder of raw iButton CSV exports
+    'variable': 'AT',           # AT, ST or RH
+    'step': 24,                 # grid step in hours; 3 or 4 for raw data
+    'span': 'union',
+    'tolerance': None,          # hours
+    'fill_missing_days': True,
+    'sites': os.path.join('HydroServer-ODM1', 'sites.csv'),
+    'elevations': 'Elevation.csv',
+    'statistic': 'mean',        # daily mean, min or max used for the fits
+    'estimator': 'ols',
+    'min_sensors': 3,
+    'by': 'month',
+    'output': 'output',
+    'dpi': 100,
+    'figures': True,
+    'max_workers': None,
+}
+
+Stage = namedtuple('Stage', ['name', 'func', 'inputs', 'params', 'sources',
+                             'modules', 'cached'])
+Stage.__doc__ = """\
+One pipeline stage: ``func(config, *upstream_outputs)`` returns a dict of
+arrays. ``inputs`` names the upstream stages, ``params`` the configuration
+keys it reads, ``sources`` those of its keys that name files or folders whose
+contents matter and ``modules`` the names of the package modules whose code
+determines its output. Stages with ``cached`` False always run."""
+
+
+def _ingest(config):
+    series = {}
+    suffix = '_' + config['variable']
+    if config['raw']:
+        for name, record in ingest_raw(config['raw'],
+                                       config['max_workers']).items():
+            if name.endswith(suffix):
+                series[name] = record
+    else:
+        table = ingest_daily(config['daily'], config['max_workers'])
+        times = table.index.values.astype('datetime64[s]')
+        for name in table.columns:
+            if name.endswith(suffix):
+                values = table[name].values
+                keep = ~np.isnan(values)
+                series[name] = (times[keep], values[keep])
+    if not series:
+        raise ValueError('no {} series found'.format(config['variable']))
+    names = sorted(series)
+    sizes = [len(series[n][0]) for n in names]
+    return {'names': np.array(names),
+            'offsets': np.concatenate(([0], np.cumsum(sizes))),
+            'times': np.concatenate([series[n][0] for n in names]).astype(
+                'datetime64[s]'),
+            'values': np.concatenate([series[n][1] for n in names]).astype(
+                'float64')}
+
+
+def _align(config, ingested):
+    off = ingested['offsets']
+    series = {name: (ingested['times'][off[j]:off[j + 1]],
+                     ingested['values'][off[j]:off[j + 1]])
+              for j, name in enumerate(ingested['names'].tolist())}
+    tolerance = config['tolerance']
+    if tolerance is not None:
+        tolerance = np.timedelta64(int(tolerance * 3600), 's')
+    record = align_sensors(series, step=config['step'], span=config['span'],
+                           tolerance=tolerance)
+    return {'times': record.times, 'values': record.values,
+            'names': np.array(record.names)}
+
+
+def _daily(config, aligned):
+    stats = daily_aggregate(aligned['times'], aligned['values'],
+                            config['fill_missing_days'])
+    return {'dates': stats.dates, 'mean': stats.mean, 'min': stats.min,
+            'max': stats.max, 'count': stats.count,
+            'names': aligned['names']}
+
+
+def _regress(config, daily):
+    metadata = site_metadata(config['sites'], config['elevations'])
+    names = daily['names'].tolist()
+    elev = np.array([metadata['Elevation'].get(site_of(n), np.nan)
+                     for n in names]) * 0.001
+    unknown = [n for n, z in zip(names, elev) if np.isnan(z)]
+    if unknown:
+        raise ValueError('no elevation for sensors {}; add their sites to {} '
+                         'or {}'.format(unknown, config['sites'],
+                                        config['elevations']))
+    T = daily[config['statistic']]
+    fit = fit_lapse_rates(elev, T, config['estimator'])
+    slope, intercept = fit.slope.copy(), fit.intercept.copy()
+    nobs = np.asarray(fit.nobs).astype('int64')
+    few = nobs < config['min_sensors']
+    slope[few] = np.nan
+    intercept[few] = np.nan
+    return {'dates': daily['dates'], 'slope': slope, 'intercept': intercept,
+            'nobs': nobs, 'elevations': elev, 'names': daily['names'],
+            'temperatures': T}
+
+
+def _rollup(config, fits):
+    stats = rollup(fits['dates'], fits['slope'], config['by'])
+    return dict(stats._asdict())
+
+
+def _export(config, daily, fits, rolled):
+    out = config['output']
+    os.makedirs(out, exist_ok=True)
+    index = pd.DatetimeIndex(daily['dates'], name='date')
+    paths = [os.path.join(out, 'daily_{}.csv'.format(config['variable']))]
+    pd.DataFrame(daily['mean'], index=index,
+                 columns=daily['names'].tolist()).to_csv(paths[-1])
+    paths.append(os.path.join(out, 'lapse_rates.csv'))
+    pd.DataFrame({'slope': fits['slope'], 'intercept': fits['intercept'],
+                  'nobs': fits['nobs']},
+                 index=pd.DatetimeIndex(fits['dates'], name='date')).to_csv(
+        paths[-1])
+    paths.append(os.path.join(out, 'lapse_rates_{}.csv'.format(
+        config['by'] if isinstance(config['by'], str) else 'custom')))
+    pd.DataFrame({f: rolled[f] for f in ('mean', 'std', 'min', 'max',
+                                         'count')},
+                 index=pd.Index(rolled['labels'], name='period')).to_csv(
+        paths[-1])
+    if config['figures'] and fits['names'].size:
+        spec = FigureSpec('site_panels_{}'.format(config['variable']),
+                          'site_panels',
+                          dict(dates=fits['dates'],
+                               temperatures=fits['temperatures'],
+                               names=fits['names'].tolist(),
+                               elevations_m=np.round(
+                                   fits['elevations'] * 1000).tolist()),
+                          {}, config['dpi'])
+        build_figures([spec], os.path.join(out, 'figures'),
+                      max_workers=1)
+    return {'paths': np.array(paths)}
+
+
+STAGES = [
+    Stage('ingest', _ingest, (), ('daily', 'raw', 'variable'),
+          ('daily', 'raw'), ('ingest', 'ibutton'), True),
+    Stage('align', _align, ('ingest',), ('step', 'span', 'tolerance'), (),
+          ('align',), True),
+    Stage('daily', _daily, ('align',), ('fill_missing_days',), (), ('daily',),
+          True),
+    Stage('regress', _regress, ('daily',),
+          ('sites', 'elevations', 'statistic', 'estimator', 'min_sensors'),
+          ('sites', 'elevations'),
+          ('estimators', 'regression', 'registry', 'odm'), True),
+    Stage('rollup', _rollup, ('regress',), ('by',), (), ('rollup',), True),
+    Stage('export', _export, ('daily', 'regress', 'rollup'),
+          ('output', 'dpi', 'figures', 'variable', 'by'), (), (), False),
+]
+
+
+def code_fingerprint(stage):
+    """Hash of the source of a stage function and of its ``modules``."""
+    h = hashlib.sha1(inspect.getsource(stage.func).encode())
+    for name in stage.modules:
+        module = importlib.import_module('.' + name, __package__)
+        with open(module.__file__, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def stage_key(stage, config, upstream_keys):
+    """Hex digest identifying the output of ``stage`` under ``config``."""
+    h = hashlib.sha1()
+    params = {p: config[p] for p in stage.params}
+    h.update(json.dumps([stage.name, PIPELINE_VERSION, params,
+                         list(upstream_keys), code_fingerprint(stage)],
+                        sort_keys=True, default=str).encode())
+    paths = [config[s] for s in stage.sources if config[s]]
+    if paths:
+        h.update(source_fingerprint(paths).encode())
+    return h.hexdigest()
+
+
+def _save(path, arrays):
+    tmp = '{}.tmp-{}.npz'.format(path[:-len('.npz')], os.getpid())
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def _load(path):
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+def run_pipeline(config=None, cache_dir=DEFAULT_CACHE_DIR, until=None,
+                 force=(), log=None):
+    """
+    Run the pipeline, reusing every cached stage whose key is unchanged.
+
+    Parameters
+    ----------
+    config : dict, optional
+        Overrides of :data:`DEFAULT_CONFIG`.
+    cache_dir : str, optional
+        Root cache folder; stage outputs go to ``<cache_dir>/pipeline``.
+    until : str, optional
+        Last stage to run.
+    force : sequence of str or True, optional
+        Stages to rerun regardless of the cache (True for all).
+    log : callable, optional
+        Called with one status line per stage, e.g. ``print``.
+
+    Returns
+    -------
+    outputs : dict of str to dict
+        Output arrays of every stage run.
+    status : dict of str to str
+        ``'ran'`` or ``'cached'`` for every stage.
+    """
+    cfg = dict(DEFAULT_CONFIG)
+    unknown = set(config or {}) - set(cfg)
+    if unknown:
+        raise ValueError('unknown config keys {}'.format(sorted(unknown)))
+    cfg.update(config or {})
+    names = [s.name for s in STAGES]
+    if until is not None and until not in names:
+        raise ValueError('unknown stage {!r}; choose from {}'.format(
+            until, names))
+    directory = os.path.join(cache_dir, 'pipeline')
+    os.makedirs(directory, exist_ok=True)
+
+    keys, outputs, status = {}, {}, {}
+    for stage in STAGES:
+        keys[stage.name] = stage_key(stage, cfg,
+                                     [keys[i] for i in stage.inputs])
+        path = os.path.join(directory, '{}-{}.npz'.format(
+            stage.name, keys[stage.name][:16]))
+        rerun = force is True or stage.name in force
+        if stage.cached and not rerun and os.path.exists(path):
+            outputs[stage.name] = _load(path)
+            status[stage.name] = 'cached'
+        else:
+            with instrument.stage('pipeline ' + stage.name):
+                outputs[stage.name] = stage.func(
+                    cfg, *[outputs[i] for i in stage.inputs])
+            if stage.cached:
+                _save(path, outputs[stage.name])
+            status[stage.name] = 'ran'
+        if log is not None:
+            log('{:<8s} {:<6s} {}'.format(stage.name, status[stage.name],
+                                          keys[stage.name][:12]))
+        if stage.name == until:
+            break
+    return outputs, status
+
+
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m curvylapse', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--config', metavar='JSON',
+                        help='JSON file of configuration overrides')
+    parser.add_argument('--set', action='append', default=[],
+                        metavar='KEY=VALUE',
+                        help='override one configuration value (JSON or '
+                             'text); may be repeated')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--until', metavar='STAGE',
+                        help='stop after this stage')
+    parser.add_argument('--force', action='append', default=[],
+                        metavar='STAGE', help="rerun a stage ('all' for every "
+                                              "stage)")
+    parser.add_argument('--show-config', action='store_true',
+                        help='print the effective configuration and exit')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='write per-stage time and memory to a .json or '
+                             '.csv report')
+    args = parser.parse_args(argv)
+
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config.update(json.load(f))
+    for item in args.set:
+        key, sep, value = item.partition('=')
+        if not sep:
+            parser.error('--set expects KEY=VALUE, got {!r}'.format(item))
+        config[key.strip()] = _parse_value(value)
+    if args.show_config:
+        cfg = dict(DEFAULT_CONFIG)
+        cfg.update(config)
+        json.dump(cfg, sys.stdout, indent=1, sort_keys=True)
+        print()
+        return 0
+    if args.profile:
+        instrument.enable()
+    force = True if 'all' in args.force else args.force
+    try:
+        run_pipeline(config, args.cache_dir, args.until, force, log=print)
+    except (ValueError, OSError) as err:
+        print('error: {}'.format(err), file=sys.stderr)
+        return 1
+    if args.profile:
+        instrument.write_report(args.profile)
+    return 0
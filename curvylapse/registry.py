@@ -0,0 +1,353 @@
+"""
+Sensor registry
+
+Replaces the per-sensor globals of the original script (``datetime_Lapse2``,
+``date_Lapse2``, ``time_Lapse2``, ``temp_Lapse2``,
+``grouped_daily_data_Lapse2``, ... for every sensor and variable) and the
+positional ``Elevation[i][1]`` lookups with one structure:
+
+* one ``datetime64[s]`` time index shared by every sensor, instead of object
+  arrays of Python ``datetime``/``date``/``time`` values (8 bytes per sample
+  rather than a pointer plus a boxed object for each of the three);
+* one contiguous (time x sensor) float array holding every sensor's values,
+  columns grouped by variable so a variable's block is a view;
+* one small :class:`Sensor` record per column with the site code, variable,
+  method, elevation and position from ``HydroServer-ODM1/sites.csv`` and
+  ``Elevation.csv``.
+
+Adding a sensor is a row in the site tables and a column in the array, not a
+new block of code.
+
+::
+
+    reg = SensorRegistry.from_odm(load_odm1('HydroServer-ODM1'))
+    T = reg.data(variable='AirTemp_avg')
+    fit = batch_linregress(reg.elevations(variable='AirTemp_avg'), T)
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from .odm import read_elevations
+
+
+class Sensor:
+    """
+    Metadata of one registry column.
+
+    Attributes
+    ----------
+    name : str
+        Column name, e.g. ``'NFN4_AirTemp_avg'``.
+    site : str
+        ODM ``SiteCode`` (``NFN1`` ... ``NFN7``).
+    variable, method : str
+        ODM ``VariableCode`` and ``MethodCode``; method may be None.
+    elevation : float
+        Elevation in metres, NaN if unknown.
+    latitude, longitude : float
+        WGS84 position, NaN if unknown.
+    column : int
+        Column of the sensor in :attr:`SensorRegistry.values`.
+    """
+
+    __slots__ = ('name', 'site', 'variable', 'method', 'elevation',
+                 'latitude', 'longitude', 'column')
+
+    def __init__(self, name, site, variable, method=None, elevation=np.nan,
+                 latitude=np.nan, longitude=np.nan, column=-1):
+        self.name = name
+        self.site = site
+        self.variable = variable
+        self.method = method
+        self.elevation = float(elevation)
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.column = column
+
+    def __repr__(self):
+        return ('Sensor({!r}, site={!r}, variable={!r}, method={!r}, '
+                'elevation={:g}, column={})'.format(
+                    self.name, self.site, self.variable, self.method,
+                    self.elevation, self.column))
+
+
+def site_metadata(sites='HydroServer-ODM1/sites.csv',
+                  elevations='Elevation.csv'):
+    """
+    Site names, positions and elevations keyed by site code.
+
+    Parameters
+    ----------
+    sites : str, optional
+        ODM1 ``sites.csv``; skipped if it does not exist.
+    elevations : str, optional
+        ``Elevation.csv`` (``LapseN`` rows, metres); skipped if it does not
+        exist.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Indexed by ``SiteCode`` with ``SiteName``, ``Latitude``,
+        ``Longitude`` and ``Elevation`` (m) columns, NaN where unknown.
+    """
+    columns = ['SiteName', 'Latitude', 'Longitude']
+    if sites and os.path.exists(sites):
+        table = pd.read_csv(sites).set_index('SiteCode')
+        table = table.reindex(columns=columns)
+    else:
+        table = pd.DataFrame(columns=columns,
+                             index=pd.Index([], name='SiteCode'))
+    elev = {}
+    if elevations and os.path.exists(elevations):
+        elev = read_elevations(elevations)
+    table = table.reindex(table.index.union(pd.Index(sorted(elev))))
+    table.index.name = 'SiteCode'
+    table['Elevation'] = [elev.get(code, np.nan) for code in table.index]
+    return table
+
+
+# Loggers that recorded at a site other than the one their number suggests.
+# Lapse2 (2016 files) and Lapse3 (2018 files) both recorded at HWY542, and
+# both records are NFN3 in ``All_sites_dailyT.csv`` and the ODM export.
+SENSOR_SITES = {'Lapse2': 'NFN3'}
+
+
+def site_of(name):
+    """
+    Site code of a sensor or column name.
+
+    ``NFN4_RH`` gives ``NFN4`` and logger names ``LapseN`` give ``NFNN``
+    unless :data:`SENSOR_SITES` places the logger elsewhere.
+
+    >>> site_of('Lapse4'), site_of('NFN7_RH'), site_of('Lapse2')
+    ('NFN4', 'NFN7', 'NFN3')
+    """
+    stem = str(name).split('_')[0]
+    if stem in SENSOR_SITES:
+        return SENSOR_SITES[stem]
+    if stem.startswith('Lapse'):
+        return 'NFN' + stem[len('Lapse'):]
+    return stem
+
+
+class SensorRegistry:
+    """
+    Sensors on one time index with their values in one 2-D array.
+
+    Parameters
+    ----------
+    times : array_like of datetime64
+        Shared time index, shape (ntime,), increasing.
+    values : array_like
+        Shape (ntime, nsensor), NaN where a sensor has no sample. Stored as a
+        C-contiguous array of ``dtype``.
+    sensors : sequence of Sensor
+        One per column, in column order; their ``column`` is set here.
+    dtype : str, optional
+        Storage dtype; float32 halves memory for long records.
+
+    Attributes
+    ----------
+    times : ndarray of datetime64[s]
+    values : ndarray
+    sensors : list of Sensor
+    """
+
+    def __init__(self, times, values, sensors, dtype='float64'):
+        self.times = np.asarray(times, dtype='datetime64[s]')
+        self.values = np.ascontiguousarray(values, dtype=dtype)
+        if self.values.ndim != 2:
+            raise ValueError('values must be 2-D (time x sensor)')
+        if self.values.shape != (self.times.size, len(sensors)):
+            raise ValueError('values shape {} does not match {} times and {} '
+                             'sensors'.format(self.values.shape,
+                                              self.times.size, len(sensors)))
+        self.sensors = list(sensors)
+        self._columns = {}
+        for j, sensor in enumerate(self.sensors):
+            if sensor.name in self._columns:
+                raise ValueError('duplicate sensor {!r}'.format(sensor.name))
+            sensor.column = j
+            self._columns[sensor.name] = j
+
+    @classmethod
+    def from_record(cls, record, variable='AirTemp_avg', method=None,
+                    metadata=None, dtype='float64'):
+        """
+        Registry of an :class:`~curvylapse.align.AlignedRecord`.
+
+        Sensor names such as ``Lapse4`` or ``NFN4`` are matched to their site
+        in ``metadata`` (default :func:`site_metadata`).
+        """
+        if metadata is None:
+            metadata = site_metadata()
+        sensors = [_sensor(name, site_of(name), variable, method, metadata)
+                   for name in record.names]
+        return cls(record.times, record.values, sensors, dtype)
+
+    @classmethod
+    def from_odm(cls, odm, variables=('AirTemp_avg',), qc=None,
+                 elevations='Elevation.csv', dtype='float64'):
+        """
+        Registry of ODM1 series, one column per (site, variable).
+
+        Parameters
+        ----------
+        odm : ODMDataset
+            Loaded export (:func:`curvylapse.odm.load_odm1`); positions come
+            from its ``sites`` table.
+        variables : sequence of str, optional
+            ``VariableCode`` values to include; each variable's columns are
+            adjacent.
+        qc : int, optional
+            ``QualityControlLevelCode``.
+        elevations : str, optional
+            ``Elevation.csv`` path.
+        """
+        metadata = site_metadata(None, elevations)
+        if odm.sites is not None:
+            positions = odm.sites.reindex(
+                columns=['SiteName', 'Latitude', 'Longitude'])
+            metadata = positions.join(metadata[['Elevation']], how='outer')
+        tables, sensors = [], []
+        for variable in variables:
+            table = odm.pivot(variable, qc)
+            tables.append(table)
+            for site in table.columns:
+                methods = np.unique(odm.methods_of(site, variable, qc))
+                sensors.append(_sensor('{}_{}'.format(site, variable), site,
+                                       variable, ','.join(methods),
+                                       metadata))
+        if not tables:
+            raise ValueError('no variables requested')
+        times = np.unique(np.concatenate(
+            [t.index.values.astype('datetime64[s]') for t in tables]))
+        values = np.full((times.size, len(sensors)), np.nan, dtype=dtype)
+        j = 0
+        for table in tables:
+            rows = np.searchsorted(times, table.index.values.astype(
+                'datetime64[s]'))
+            values[rows, j:j + table.shape[1]] = table.values
+            j += table.shape[1]
+        return cls(times, values, sensors, dtype)
+
+    def __len__(self):
+        return len(self.sensors)
+
+    def __iter__(self):
+        return iter(self.sensors)
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __getitem__(self, name):
+        """The :class:`Sensor` called ``name``."""
+        return self.sensors[self._columns[name]]
+
+    @property
+    def names(self):
+        return [s.name for s in self.sensors]
+
+    @property
+    def nbytes(self):
+        """Bytes held by the time index and values."""
+        return self.times.nbytes + self.values.nbytes
+
+    def select(self, site=None, variable=None):
+        """Sensors with the given site code(s) and variable(s)."""
+        def match(value, wanted):
+            if wanted is None:
+                return True
+            if isinstance(wanted, str):
+                return value == wanted
+            return value in wanted
+        return [s for s in self.sensors
+                if match(s.site, site) and match(s.variable, variable)]
+
+    def _columns_of(self, sensors, site, variable):
+        if sensors is None:
+            sensors = self.select(site, variable)
+        return np.array([self._columns[s] if isinstance(s, str) else s.column
+                         for s in sensors], dtype='intp')
+
+    def data(self, sensors=None, site=None, variable=None):
+        """
+        Values of some sensors, shape (ntime, nselected).
+
+        Parameters
+        ----------
+        sensors : sequence of str or Sensor, optional
+            Columns to return, in this order; by default every sensor
+            matching ``site`` and ``variable``.
+
+        Returns
+        -------
+        ndarray
+            A view into :attr:`values` when the columns are adjacent and in
+            order (e.g. one variable), otherwise a copy.
+        """
+        cols = self._columns_of(sensors, site, variable)
+        if cols.size and np.all(np.diff(cols) == 1):
+            return self.values[:, cols[0]:cols[-1] + 1]
+        return self.values[:, cols]
+
+    def column(self, name):
+        """Values of one sensor as a (strided) view, shape (ntime,)."""
+        return self.values[:, self._columns[name]]
+
+    def elevations(self, sensors=None, site=None, variable=None,
+                   scale=0.001):
+        """
+        Elevations of the columns :meth:`data` returns, in km by default.
+
+        ``scale`` converts from metres (1.0 keeps metres).
+        """
+        cols = self._columns_of(sensors, site, variable)
+        return np.array([self.sensors[j].elevation for j in cols]) * scale
+
+    def add(self, sensor, times, values):
+        """
+        Add one sensor column.
+
+        Samples at times not yet in the index extend it; other sensors are
+        NaN there.
+
+        Parameters
+        ----------
+        sensor : Sensor
+        times : array_like of datetime64
+        values : array_like
+            Shape (len(times),).
+        """
+        if sensor.name in self._columns:
+            raise ValueError('duplicate sensor {!r}'.format(sensor.name))
+        times = np.asarray(times, dtype='datetime64[s]')
+        merged = np.union1d(self.times, times)
+        out = np.full((merged.size, len(self.sensors) + 1), np.nan,
+                      dtype=self.values.dtype)
+        out[np.searchsorted(merged, self.times), :-1] = self.values
+        out[np.searchsorted(merged, times), -1] = values
+        self.times, self.values = merged, out
+        sensor.column = len(self.sensors)
+        self.sensors.append(sensor)
+        self._columns[sensor.name] = sensor.column
+        return sensor
+
+    def metadata(self):
+        """Sensor table: one row per column, indexed by sensor name."""
+        return pd.DataFrame(
+            [[getattr(s, f) for f in Sensor.__slots__[1:]]
+             for s in self.sensors],
+            index=pd.Index(self.names, name='name'),
+            columns=list(Sensor.__slots__[1:]))
+
+
+def _sensor(name, site, variable, method, metadata):
+    row = (metadata.loc[site] if site in metadata.index
+           else pd.Series(dtype='float64'))
+    return Sensor(name, site, variable, method or None,
+                  row.get('Elevation', np.nan), row.get('Latitude', np.nan),
+                  row.get('Longitude', np.nan))
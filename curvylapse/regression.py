@@ -0,0 +1,276 @@
+"""
+Batch lapse-rate regression
+
+Closed-form ordinary least squares of temperature on elevation for every time
+step of a (time x sensor) matrix at once. Replaces the per-time-step
+``stats.linregress`` loops in ``archive/script_NooksackTempLapse_noLapse5.py``
+(``subdaily_LR``, ``daily_Tmean_LR``, ...) and returns float64 arrays instead
+of ``dtype=object`` arrays.
+
+Missing sensors are given as NaN. Each time step is fit using only the sensors
+that reported at that step; steps with fewer than two valid sensors return NaN.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+from scipy import stats
+
+from .instrument import instrumented
+
+LapseRateResult = namedtuple('LapseRateResult',
+                             ['slope', 'intercept', 'rvalue', 'pvalue',
+                              'stderr', 'nobs'])
+LapseRateResult.__doc__ = """\
+Per-time-step regression output, one float64 array per field. Field names
+follow ``scipy.stats.linregress``; ``nobs`` is the number of sensors used."""
+
+
+def _as_arrays(elevations, temperatures):
+    """Return elevations as a float64 row and temperatures as a 2-D matrix."""
+    x = np.asarray(elevations, dtype='float64')
+    y = np.asarray(temperatures, dtype='float64')
+    if y.ndim == 1:
+        y = y[np.newaxis, :]
+    if x.ndim == 1:
+        x = np.broadcast_to(x, y.shape)
+    if x.shape != y.shape:
+        raise ValueError('elevations of shape {} do not match temperatures '
+                         'of shape {}'.format(x.shape, y.shape))
+    return x, y
+
+
+def regression_sums(elevations, temperatures):
+    """
+    Centered sums of squares needed for the lapse-rate fit.
+
+    Parameters
+    ----------
+    elevations : array_like
+        Sensor elevations, shape (nsensor,) or (ntime, nsensor).
+    temperatures : array_like
+        Temperatures, shape (ntime, nsensor); NaN marks a missing sensor.
+
+    Returns
+    -------
+    n, xmean, ymean, ssxm, ssym, ssxym : ndarray
+        Sensor count, means and centered sums for each time step.
+    """
+    x, y = _as_arrays(elevations, temperatures)
+    valid = np.isfinite(y) & np.isfinite(x)
+    n = valid.sum(axis=1).astype('float64')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        xmean = np.where(valid, x, 0.0).sum(axis=1) / n
+        ymean = np.where(valid, y, 0.0).sum(axis=1) / n
+    dx = np.where(valid, x - xmean[:, np.newaxis], 0.0)
+    dy = np.where(valid, y - ymean[:, np.newaxis], 0.0)
+    ssxm = np.einsum('ij,ij->i', dx, dx)
+    ssym = np.einsum('ij,ij->i', dy, dy)
+    ssxym = np.einsum('ij,ij->i', dx, dy)
+    return n, xmean, ymean, ssxm, ssym, ssxym
+
+
+def step_sums(elevations, temperatures):
+    """
+    Per-step sums that add up to a pooled within-step fit.
+
+    Rows of the result can be summed over any set of time steps (a window, a
+    month) and passed to :func:`fit_from_step_sums`. Each step is centered
+    on its own means, so the pooled slope is not biased by temperature
+    changes between steps or by sensors that report in only some of them.
+    Steps with fewer than two sensors add nothing.
+
+    Returns
+    -------
+    ndarray
+        Shape (ntime, 7): n, n * xmean, n * ymean, ssxm, ssym, ssxym and 1
+        for each step used.
+    """
+    n, xmean, ymean, ssxm, ssym, ssxym = regression_sums(elevations,
+                                                         temperatures)
+    used = n >= 2
+    columns = [n, n * xmean, n * ymean, ssxm, ssym, ssxym, used]
+    return np.stack([np.where(used, c, 0.0) for c in columns], axis=1)
+
+
+def fit_from_step_sums(sums):
+    """
+    Pooled within-step fit from summed :func:`step_sums` rows.
+
+    The degrees of freedom allow for one mean per step; ``nobs`` is the
+    number of samples pooled.
+
+    Parameters
+    ----------
+    sums : array_like
+        Shape (..., 7).
+
+    Returns
+    -------
+    LapseRateResult
+    """
+    n, sx, sy, ssxm, ssym, ssxym, steps = np.moveaxis(
+        np.asarray(sums, dtype='float64'), -1, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        xmean = sx / n
+        ymean = sy / n
+    # n - steps + 1 gives fit_from_sums n - steps - 1 degrees of freedom
+    fit = fit_from_sums(n - steps + 1, xmean, ymean, np.maximum(ssxm, 0.0),
+                        np.maximum(ssym, 0.0), ssxym)
+    return fit._replace(nobs=n)
+
+
+def fit_from_sums(n, xmean, ymean, ssxm, ssym, ssxym):
+    """
+    Slope, intercept, r, p and standard error from centered sums.
+
+    Mirrors the edge cases of ``scipy.stats.linregress``: a two-sensor fit has
+    zero standard error, and a flat temperature profile has r = 0. Steps with
+    fewer than two sensors, or with all sensors at one elevation, are NaN.
+
+    Returns
+    -------
+    LapseRateResult
+    """
+    n = np.asarray(n, dtype='float64')
+    ok = (n >= 2) & (ssxm > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = np.where(ok, ssxym / ssxm, np.nan)
+        intercept = ymean - slope * xmean
+        r = ssxym / np.sqrt(ssxm * ssym)
+        r = np.where(ssym > 0, np.clip(r, -1.0, 1.0), 0.0)
+        r = np.where(ok, r, np.nan)
+
+        df = n - 2
+        t = r * np.sqrt(df / ((1.0 - r) * (1.0 + r)))
+        pvalue = 2 * stats.t.sf(np.abs(t), np.where(df > 0, df, 1))
+        pvalue = np.where(np.abs(r) == 1.0, 0.0, pvalue)
+        stderr = np.sqrt((1 - r ** 2) * ssym / ssxm / df)
+
+    two = ok & (n == 2)
+    pvalue = np.where(two, np.where(ssym > 0, 0.0, 1.0), pvalue)
+    stderr = np.where(two, 0.0, stderr)
+    pvalue = np.where(ok, pvalue, np.nan)
+    stderr = np.where(ok, stderr, np.nan)
+    return LapseRateResult(slope, intercept, r, pvalue, stderr, n)
+
+
+@instrumented('regress', rows=1)
+def batch_linregress(elevations, temperatures):
+    """
+    Lapse-rate regression for every time step in one vectorized pass.
+
+    Equivalent to calling ``stats.linregress(elevations, temperatures[i])``
+    for each row ``i``, but NaN-aware and without a Python loop.
+
+    Parameters
+    ----------
+    elevations : array_like
+        Sensor elevations, shape (nsensor,). Use km to get lapse rates in
+        deg C/km, as in the original script (``elevations_km``).
+    temperatures : array_like
+        Temperatures, shape (ntime, nsensor) or (nsensor,); NaN marks a
+        missing sensor.
+
+    Returns
+    -------
+    LapseRateResult
+        Arrays of shape (ntime,).
+
+    Examples
+    --------
+    >>> elevations_km = np.array([0.664, 1.056, 1.575, 1.743])
+    >>> T = np.array([[5.0, 3.0, 0.5, -0.5], [6.0, np.nan, 2.0, 1.0]])
+    >>> fit = batch_linregress(elevations_km, T)
+    >>> fit.slope.round(2)
+    array([-5.03, -4.55])
+    """
+    return fit_from_sums(*regression_sums(elevations, temperatures))
+
+
+def segments_from_breakpoints(elevations, breakpoints):
+    """
+    Sensor groups for elevation bands.
+
+    Band ``k`` holds the sensors with ``breakpoints[k] <= elevation <=
+    breakpoints[k + 1]``, so a sensor sitting on a breakpoint belongs to both
+    neighbouring bands, as Lapse4 did in the original ``elevations_23_4`` and
+    ``elevations_4_6`` fits.
+
+    Parameters
+    ----------
+    elevations : array_like
+        Sensor elevations, shape (nsensor,).
+    breakpoints : array_like
+        Increasing band edges, in the units of ``elevations``.
+
+    Returns
+    -------
+    list of ndarray
+        Sensor indices of each band.
+    """
+    x = np.asarray(elevations, dtype='float64')
+    edges = np.asarray(breakpoints, dtype='float64')
+    # small tolerance so edges copied from rounded elevations still match
+    tol = 1e-9 * max(1.0, float(np.nanmax(np.abs(x))))
+    return [np.flatnonzero((x >= lo - tol) & (x <= hi + tol))
+            for lo, hi in zip(edges[:-1], edges[1:])]
+
+
+@instrumented('segment regress', rows=1)
+def segmented_linregress(elevations, temperatures, segments):
+    """
+    Per-segment lapse rates for every time step in one vectorized pass.
+
+    Generalises the original ``subdaily_LR_23_4``, ``subdaily_LR_4_6`` and
+    ``subdaily_LR_6_7`` loops to any number of sensor groups. Per-sensor
+    products are formed once and summed into every segment with a single
+    matrix product, so sweeping many band configurations costs little more
+    than fitting one.
+
+    Parameters
+    ----------
+    elevations : array_like
+        Sensor elevations, shape (nsensor,).
+    temperatures : array_like
+        Temperatures, shape (ntime, nsensor); NaN marks a missing sensor.
+    segments : sequence of sequence of int
+        Sensor indices of each segment, e.g. ``[[0, 1, 2], [2, 3], [3, 4]]``
+        or the output of :func:`segments_from_breakpoints`.
+
+    Returns
+    -------
+    LapseRateResult
+        Arrays of shape (ntime, nsegment).
+    """
+    x, y = _as_arrays(elevations, temperatures)
+    nsensor = y.shape[1]
+    member = np.zeros((nsensor, len(segments)))
+    for k, idx in enumerate(segments):
+        member[np.asarray(idx, dtype='int64'), k] = 1.0
+
+    valid = np.isfinite(y) & np.isfinite(x)
+    # shift by common offsets to keep the uncentered sums well conditioned
+    x0 = np.nanmean(x[0])
+    count = valid.sum(axis=1)
+    y0 = np.where(valid, y, 0.0).sum(axis=1) / np.maximum(count, 1)
+    y0 = y0[:, np.newaxis]
+    dx = np.where(valid, x - x0, 0.0)
+    dy = np.where(valid, y - y0, 0.0)
+
+    n = valid.astype('float64') @ member
+    sx = dx @ member
+    sy = dy @ member
+    sxx = (dx * dx) @ member
+    syy = (dy * dy) @ member
+    sxy = (dx * dy) @ member
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mx = sx / n
+        my = sy / n
+        ssxm = sxx - sx * mx
+        # cancellation leaves round-off when a segment's sensors share an
+        # elevation; treat that as the degenerate case linregress rejects
+        ssxm = np.where(ssxm > 1e-12 * sxx, ssxm, 0.0)
+        ssym = np.maximum(syy - sy * my, 0.0)
+        ssxym = sxy - sx * my
+    return fit_from_sums(n, mx + x0, my + y0, ssxm, ssym, ssxym)
@@ -0,0 +1,125 @@
+"""
+Rolling-window lapse rates
+
+A lapse rate for every time step from all samples of every sensor within a
+window around it: a middle ground between the noisy per-step fits of the
+original script and monthly means of them, and a moving version of the
+2020 notebook's ``lapse_one_month`` pooled fit.
+
+Each time step's sums are centered on that step's own means (see
+:func:`curvylapse.regression.step_sums`) before pooling, so the window
+slope is the common within-step slope: warming or cooling over the window
+does not leak into it, even when sensors enter or leave the window part way
+through. The centered sums of every step are accumulated once along time; the
+sums of any window are then the difference of two cumulative rows, so each
+step costs O(1) whatever the window length, and one pass of cumulative sums
+serves a whole sweep of window lengths. Missing samples contribute nothing.
+"""
+
+import numpy as np
+
+from .regression import LapseRateResult, fit_from_step_sums, step_sums
+
+
+def _cumulative_sums(elevations, temperatures):
+    """Per-step centered regression sums, accumulated along time."""
+    y = np.asarray(temperatures, dtype='float64')
+    if y.ndim == 1:
+        y = y[:, np.newaxis]
+    per_step = step_sums(elevations, y)
+    cum = np.zeros((y.shape[0] + 1, per_step.shape[1]))
+    np.cumsum(per_step, axis=0, out=cum[1:])
+    return cum
+
+
+def window_bounds(ntime, window, times=None, center=True):
+    """
+    First and one-past-last row of the window around every time step.
+
+    Parameters
+    ----------
+    ntime : int
+        Number of time steps.
+    window : int or numpy.timedelta64
+        Length in samples, or in time when ``times`` is given.
+    times : array_like of datetime64, optional
+        Increasing times of the rows; needed for a timedelta window.
+    center : bool, optional
+        Centered window, or trailing (ending at the step) if False.
+
+    Returns
+    -------
+    lo, hi : ndarray of intp
+    """
+    if isinstance(window, np.timedelta64):
+        if times is None:
+            raise ValueError('a timedelta window needs times')
+        t = np.asarray(times, dtype='datetime64[s]')
+        width = window.astype('timedelta64[s]')
+        if center:
+            half = width / 2
+            return (np.searchsorted(t, t - half, side='left'),
+                    np.searchsorted(t, t + half, side='right'))
+        return (np.searchsorted(t, t - width, side='right'),
+                np.arange(1, ntime + 1))
+    window = int(window)
+    if window < 1:
+        raise ValueError('window must be at least one sample')
+    step = np.arange(ntime)
+    lo = step - window // 2 if center else step - window + 1
+    return np.clip(lo, 0, ntime), np.clip(lo + window, 0, ntime)
+
+
+def rolling_linregress(elevations, temperatures, window, times=None,
+                       center=True, min_obs=2):
+    """
+    Pooled lapse-rate fit over a moving window, for one or many windows.
+
+    Parameters
+    ----------
+    elevations : array_like
+        Sensor elevations, shape (nsensor,).
+    temperatures : array_like
+        Shape (ntime, nsensor), NaN for missing samples; daily or sub-daily.
+    window : int, numpy.timedelta64 or sequence of them
+        Window length in samples, or in time (e.g. ``np.timedelta64(15,
+        'D')``) with ``times`` given. A sequence sweeps several windows from
+        the same cumulative sums.
+    times : array_like of datetime64, optional
+        Time of each row, for timedelta windows; rows need not be regular.
+    center : bool, optional
+        Centered (default) or trailing windows.
+    min_obs : int, optional
+        Samples needed in a window; fewer gives NaN.
+
+    Returns
+    -------
+    LapseRateResult
+        Arrays of shape (ntime,), or (ntime, nwindow) for a sequence of
+        windows. ``intercept`` is that of the line through the window's mean
+        elevation and temperature, and ``nobs`` counts the window's samples
+        at steps with two or more sensors. ``pvalue`` and ``stderr`` allow
+        for one mean per step but treat samples as independent otherwise, so
+        they are optimistic for autocorrelated data.
+
+    Examples
+    --------
+    >>> z = np.array([0.5, 1.0, 1.5])
+    >>> T = np.array([[9.0, 6.0, 3.0], [8.0, np.nan, 2.0], [10.0, 7.0, 4.0]])
+    >>> rolling_linregress(z, T, 3).slope
+    array([-6., -6., -6.])
+    """
+    cum = _cumulative_sums(elevations, temperatures)
+    ntime = cum.shape[0] - 1
+    single = isinstance(window, (int, np.integer, np.timedelta64))
+    windows = [window] if single else list(window)
+
+    fits = []
+    for w in windows:
+        lo, hi = window_bounds(ntime, w, times, center)
+        sums = cum[hi] - cum[lo]
+        sums[sums[:, 0] < max(min_obs, 2)] = 0.0
+        fits.append(fit_from_step_sums(sums))
+    if single:
+        return fits[0]
+    return LapseRateResult(*[np.stack(field, axis=1) for field in zip(*fits)])
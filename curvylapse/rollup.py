@@ -0,0 +1,200 @@
+"""
+Temporal rollups
+
+Groups any per-time-step output (lapse rates, segment lapse rates, daily
+temperatures) by month, season, water year or an arbitrary calendar and
+reduces every group and every column in one pass. Replaces the original
+script's ``grouped_month`` loop, the hand-written ``ind_dec`` ... ``ind_aug``
+indices and the 36 ``LR_*_<month>`` variables, and the literal water-year
+slices (``lapse_ODM2['10/1/2016':'9/30/2017']``) of the 2020 notebook.
+
+Periods are turned into integer group codes; samples are sorted by code once
+and reduced with ``ufunc.reduceat``.
+
+Groupings (``by``):
+
+``'month'``          calendar months (labels ``datetime64[M]``)
+``'water_year'``     October-September water years, labelled by the year
+                     they end in (WY2017 = 10/1/2016-9/30/2017)
+``'season'``         DJF/MAM/JJA/SON of each year (``'2016-DJF'``;
+                     December counts toward the following year's winter)
+``'month_of_year'``  months pooled across years (labels 1-12)
+``'season_of_year'`` seasons pooled across years
+``'year'``           calendar years
+array of datetime64  custom calendar: period ``k`` is
+                     ``edges[k] <= t < edges[k + 1]``
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from .instrument import instrumented
+
+RollupStats = namedtuple('RollupStats',
+                         ['labels', 'mean', 'std', 'min', 'max', 'count'])
+RollupStats.__doc__ = """\
+Per-period statistics. ``labels`` has shape (nperiod,); the other fields have
+shape (nperiod,) + the trailing shape of the input values. ``std`` is the
+sample standard deviation (ddof=1)."""
+
+_SEASON_INDEX = np.array([0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0])
+_SEASON_NAMES = np.array(['DJF', 'MAM', 'JJA', 'SON'])
+
+
+def calendar_fields(times):
+    """
+    Calendar year and month (1-12) of each time.
+
+    Returns
+    -------
+    year, month : ndarray of int64
+    """
+    months = np.asarray(times, dtype='datetime64[s]').astype(
+        'datetime64[M]').astype('int64')
+    return months // 12 + 1970, months % 12 + 1
+
+
+def water_year(times):
+    """Water year (October-September, named for its ending year)."""
+    year, month = calendar_fields(times)
+    return year + (month >= 10)
+
+
+def group_codes(times, by='month'):
+    """
+    Integer period code of each time.
+
+    Parameters
+    ----------
+    times : array_like of datetime64
+    by : str or array_like of datetime64
+        Grouping, see the module docstring.
+
+    Returns
+    -------
+    codes : ndarray of int64
+        Period index of each time, -1 for times outside a custom calendar.
+    labels : ndarray
+        Label of each period, in code order.
+    """
+    times = np.asarray(times, dtype='datetime64[s]')
+    if not isinstance(by, str):
+        edges = np.asarray(by, dtype='datetime64[s]')
+        codes = np.searchsorted(edges, times, side='right') - 1
+        codes[(codes < 0) | (codes >= edges.size - 1)] = -1
+        return codes.astype('int64'), edges[:-1]
+
+    year, month = calendar_fields(times)
+    if by == 'month':
+        key = (year - 1970) * 12 + (month - 1)
+        uniq, codes = np.unique(key, return_inverse=True)
+        return codes, uniq.astype('datetime64[M]')
+    if by == 'year':
+        uniq, codes = np.unique(year, return_inverse=True)
+        return codes, uniq
+    if by == 'water_year':
+        uniq, codes = np.unique(year + (month >= 10), return_inverse=True)
+        return codes, uniq
+    if by == 'month_of_year':
+        uniq, codes = np.unique(month, return_inverse=True)
+        return codes, uniq
+    if by == 'season':
+        season_year = year + (month == 12)
+        key = season_year * 4 + _SEASON_INDEX[month - 1]
+        uniq, codes = np.unique(key, return_inverse=True)
+        labels = np.array(['{}-{}'.format(k // 4, _SEASON_NAMES[k % 4])
+                           for k in uniq])
+        return codes, labels
+    if by == 'season_of_year':
+        uniq, codes = np.unique(_SEASON_INDEX[month - 1], return_inverse=True)
+        return codes, _SEASON_NAMES[uniq]
+    raise ValueError('unknown grouping {!r}'.format(by))
+
+
+def reduce_groups(codes, values, ngroup):
+    """
+    NaN-aware mean, std, min, max and count of ``values`` per group code.
+
+    Parameters
+    ----------
+    codes : ndarray of int
+        Group of each row; rows with a negative code are ignored.
+    values : array_like
+        Shape (nrow,) or (nrow, ...).
+    ngroup : int
+        Number of groups.
+
+    Returns
+    -------
+    mean, std, min, max, count : ndarray
+        Shape (ngroup,) + values.shape[1:].
+    """
+    values = np.asarray(values, dtype='float64')
+    codes = np.asarray(codes).ravel()
+    keep = codes >= 0
+    codes, values = codes[keep], values[keep]
+    order = np.argsort(codes, kind='stable')
+    codes, values = codes[order], values[order]
+
+    shape = (ngroup,) + values.shape[1:]
+    mean = np.full(shape, np.nan)
+    std = np.full(shape, np.nan)
+    vmin = np.full(shape, np.nan)
+    vmax = np.full(shape, np.nan)
+    count = np.zeros(shape, dtype='int64')
+    if codes.size == 0:
+        return mean, std, vmin, vmax, count
+
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1))
+    groups = codes[starts]
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    n = np.add.reduceat(valid.astype('int64'), starts, axis=0)
+    total = np.add.reduceat(filled, starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        m = total / n
+        # second pass about the group mean for a stable variance
+        dev = np.where(valid, values - np.repeat(m, np.diff(
+            np.append(starts, codes.size)), axis=0), 0.0)
+        ss = np.add.reduceat(dev * dev, starts, axis=0)
+        s = np.sqrt(ss / (n - 1))
+    mean[groups] = np.where(n > 0, m, np.nan)
+    std[groups] = np.where(n > 1, s, np.nan)
+    vmin[groups] = np.fmin.reduceat(values, starts, axis=0)
+    vmax[groups] = np.fmax.reduceat(values, starts, axis=0)
+    count[groups] = n
+    return mean, std, vmin, vmax, count
+
+
+@instrumented('rollup', rows=1)
+def rollup(times, values, by='month'):
+    """
+    Statistics of ``values`` for every period of a grouping.
+
+    Parameters
+    ----------
+    times : array_like of datetime64
+        Time of each row, shape (ntime,).
+    values : array_like
+        Shape (ntime,) or (ntime, ...), e.g. ``fit.slope`` of a
+        :func:`curvylapse.regression.segmented_linregress` result to roll up
+        every segment at once.
+    by : str or array_like of datetime64
+        Grouping, see the module docstring.
+
+    Returns
+    -------
+    RollupStats
+
+    Examples
+    --------
+    >>> t = np.array(['2016-09-30', '2016-10-01', '2017-09-30'],
+    ...              dtype='datetime64[D]')
+    >>> wy = rollup(t, [1.0, 2.0, 4.0], by='water_year')
+    >>> wy.labels, wy.mean
+    (array([2016, 2017]), array([1., 3.]))
+    """
+    codes, labels = group_codes(times, by)
+    stats = reduce_groups(codes, values, len(labels))
+    return RollupStats(labels, *stats)
@@ -0,0 +1,43 @@
+"""
+Run detection
+
+Start, column and length of every run of flagged steps in a (time x site)
+array, found from the edges of the padded flags rather than by walking
+each series. Shared by the inversion-episode and wet-spell statistics
+(:mod:`curvylapse.inversion`, :mod:`curvylapse.moisture`).
+"""
+
+import numpy as np
+
+
+def find_runs(flags):
+    """
+    Runs of True in every column of a boolean array.
+
+    Parameters
+    ----------
+    flags : array_like of bool
+        Shape (ntime,) or (ntime, ncol); runs never continue from one column
+        into the next.
+
+    Returns
+    -------
+    row, col, length : ndarray of int64
+        Start row, column and length of every run, ordered by column then
+        row.
+
+    Examples
+    --------
+    >>> find_runs([True, True, False, True])
+    (array([0, 3]), array([0, 0]), array([2, 1]))
+    """
+    on = np.asarray(flags, dtype=bool)
+    if on.ndim == 1:
+        on = on[:, np.newaxis]
+    # pad every column with False so each run has a rising and falling edge
+    padded = np.zeros((on.shape[1], on.shape[0] + 2), dtype='int8')
+    padded[:, 1:-1] = on.T
+    edge = np.diff(padded, axis=1)
+    col, row = np.nonzero(edge == 1)
+    _, stop = np.nonzero(edge == -1)
+    return row, col, stop - row
@@ -0,0 +1,215 @@
+"""
+Snow presence from ground temperature
+
+The ground sensors buried 3 cm below each air sensor (``Lapse4_ground``,
+``Lapse6_ground``, ``Lapse7_ground``, the ``NFN*_ST`` columns and
+``Daily/*_dailyT_ground.csv``) record snow cover: under snow the ground
+temperature stays near 0 deg C and its variability collapses (Lundquist and
+Lott, 2008). This module runs that test over every ground series at once.
+
+A time step is snow-covered when, over a centered window,
+
+* the standard deviation of ground temperature is at most ``max_std``, and
+* the window maximum is at most ``max_temp``.
+
+Window counts, sums and sums of squares are differences of cumulative sums
+along time and the window maximum is a running ``np.maximum`` over shifted
+views, so no Python loop runs over time or sites and memory stays at a few
+(time x site) arrays whatever the window length. The daily masks feed
+per-water-year season start/end dates and snow-covered-area fractions by
+elevation band.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from .daily import day_key
+from .rollup import group_codes, reduce_groups
+
+SnowSeason = namedtuple('SnowSeason', ['water_years', 'start', 'end', 'days'])
+SnowSeason.__doc__ = """\
+Snow season of each site and water year: ``start`` and ``end`` are the first
+and last snow-covered days (datetime64[D], NaT if none) and ``days`` the
+number of snow-covered days, each of shape (nwater_year, nsite)."""
+
+
+def window_sums(values, window):
+    """
+    Sums over centered windows along axis 0, from cumulative sums.
+
+    Parameters
+    ----------
+    values : ndarray
+        Shape (ntime, ...); NaN is not allowed (zero-fill missing samples).
+    window : int
+        Odd window length in samples; windows are cut at the record ends.
+
+    Returns
+    -------
+    ndarray
+        Same shape as ``values``.
+    """
+    if window < 1 or window % 2 == 0:
+        raise ValueError('window must be a positive odd number')
+    half = window // 2
+    ntime = values.shape[0]
+    cum = np.zeros((ntime + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=cum[1:])
+    step = np.arange(ntime)
+    return (cum[np.minimum(step + half + 1, ntime)]
+            - cum[np.maximum(step - half, 0)])
+
+
+def window_max(values, window):
+    """
+    Maximum over centered windows along axis 0.
+
+    NaN is ignored; a window without samples gives -inf. Memory is one
+    padded copy of ``values`` whatever the window length.
+    """
+    half = window // 2
+    ntime = values.shape[0]
+    padded = np.full((ntime + 2 * half,) + values.shape[1:], -np.inf)
+    padded[half:half + ntime] = np.where(np.isnan(values), -np.inf, values)
+    out = padded[:ntime].copy()
+    for k in range(1, window):
+        np.maximum(out, padded[k:k + ntime], out=out)
+    return out
+
+
+def detect_snow(ground, window=9, max_std=0.5, max_temp=2.0,
+                min_valid=None):
+    """
+    Snow-covered state of every ground sensor.
+
+    Parameters
+    ----------
+    ground : array_like
+        Ground temperature (deg C), shape (ntime,) or (ntime, nsite), on a
+        regular time axis.
+    window : int, optional
+        Centered window in samples. The default 9 spans a day of 3-hourly
+        data; use about 5 for daily means.
+    max_std : float, optional
+        Largest window standard deviation (deg C) for snow cover.
+    max_temp : float, optional
+        Largest window maximum (deg C) for snow cover.
+    min_valid : int, optional
+        Valid samples needed in a window; defaults to half the window.
+
+    Returns
+    -------
+    ndarray of float64
+        1.0 snow, 0.0 no snow, NaN where the window has too few samples.
+    """
+    g = np.asarray(ground, dtype='float64')
+    if min_valid is None:
+        min_valid = (window + 1) // 2
+    valid = ~np.isnan(g)
+    # center on each site's mean so the sums of squares stay well conditioned
+    with np.errstate(invalid='ignore'):
+        offset = np.nanmean(np.where(valid.any(axis=0), g, 0.0), axis=0)
+    dev = np.where(valid, g - offset, 0.0)
+    n = window_sums(valid.astype('float64'), window)
+    s1 = window_sums(dev, window)
+    s2 = window_sums(dev * dev, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var = np.maximum(s2 - s1 * s1 / n, 0.0) / (n - 1)
+        snow = ((np.sqrt(var) <= max_std)
+                & (window_max(g, window) <= max_temp))
+    return np.where(n >= max(min_valid, 2), snow.astype('float64'), np.nan)
+
+
+def daily_snow(times, state, min_fraction=0.5):
+    """
+    Daily snow-on/snow-off mask from sub-daily states.
+
+    A day is snow-covered when at least ``min_fraction`` of its valid steps
+    are. With daily input this returns the state unchanged.
+
+    Returns
+    -------
+    dates : ndarray of datetime64[D]
+    daily_state : ndarray of float64
+        1.0 snow, 0.0 no snow, NaN without valid steps.
+    """
+    days = day_key(times)
+    state = np.asarray(state, dtype='float64')
+    starts = np.concatenate(([0], np.flatnonzero(days[1:] != days[:-1]) + 1))
+    valid = ~np.isnan(state)
+    nsnow = np.add.reduceat((state == 1.0).astype('int64'), starts, axis=0)
+    nvalid = np.add.reduceat(valid.astype('int64'), starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = nsnow / nvalid
+    daily = np.where(nvalid > 0, (frac >= min_fraction).astype('float64'),
+                     np.nan)
+    return days[starts], daily
+
+
+def snow_seasons(dates, daily_state):
+    """
+    First and last snow-covered day of each site and water year.
+
+    Parameters
+    ----------
+    dates : array_like of datetime64[D]
+    daily_state : array_like
+        Shape (ndays, nsite) from :func:`daily_snow`.
+
+    Returns
+    -------
+    SnowSeason
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    state = np.asarray(daily_state, dtype='float64')
+    if state.ndim == 1:
+        state = state[:, np.newaxis]
+    codes, labels = group_codes(dates, 'water_year')
+    ordinal = dates.astype('int64').astype('float64')[:, np.newaxis]
+    snow_day = np.where(state == 1.0, ordinal, np.nan)
+    _, _, first, last, count = reduce_groups(codes, snow_day, len(labels))
+
+    def to_date(a):
+        out = np.full(a.shape, np.datetime64('NaT'), dtype='datetime64[D]')
+        ok = ~np.isnan(a)
+        out[ok] = a[ok].astype('int64').astype('datetime64[D]')
+        return out
+
+    return SnowSeason(labels, to_date(first), to_date(last), count)
+
+
+def snow_covered_fraction(daily_state, elevations, bands=None):
+    """
+    Fraction of reporting sites that are snow-covered, by elevation band.
+
+    Parameters
+    ----------
+    daily_state : array_like
+        Shape (ndays, nsite) from :func:`daily_snow`.
+    elevations : array_like
+        Site elevations, shape (nsite,).
+    bands : array_like, optional
+        Band edges; band ``k`` holds ``edges[k] <= elevation <
+        edges[k + 1]``. Defaults to one band covering every site.
+
+    Returns
+    -------
+    ndarray of float64
+        Shape (ndays, nband); NaN on days without a reporting site in a band.
+    """
+    state = np.asarray(daily_state, dtype='float64')
+    elev = np.asarray(elevations, dtype='float64')
+    if bands is None:
+        bands = [elev.min(), np.nextafter(elev.max(), np.inf)]
+    edges = np.asarray(bands, dtype='float64')
+    band = np.searchsorted(edges, elev, side='right') - 1
+    member = np.zeros((elev.size, edges.size - 1))
+    inside = (band >= 0) & (band < edges.size - 1)
+    member[np.flatnonzero(inside), band[inside]] = 1.0
+
+    valid = ~np.isnan(state)
+    nsnow = (state == 1.0).astype('float64') @ member
+    nvalid = valid.astype('float64') @ member
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(nvalid > 0, nsnow / nvalid, np.nan)
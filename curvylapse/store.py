@@ -0,0 +1,192 @@
+"""
+Append-only sub-daily sensor store
+
+An on-disk store for the multi-year 3-4 hourly record. The store is a folder
+holding
+
+* ``time.i8``    -- the shared time axis, int64 seconds since 1970 (UTC-naive
+  local time, as in the iButton downloads), strictly increasing;
+* ``<name>.f4``  -- one float32 file per sensor/variable column (``Lapse4``,
+  ``Lapse4_ground``, ``Lapse7_RH``, ...), NaN where the sensor has no sample;
+* ``store.json`` -- the column list.
+
+Every file is opened with ``np.memmap``, so reading a year range or a subset
+of sites touches only those bytes. A new download is appended to the end of
+each file; history is never rewritten, and adding a sensor only creates its
+own NaN-padded file. Downloads from several sensors covering the same season
+are appended together as one batch on a common time axis.
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+
+_TIME_FILE = 'time.i8'
+_META_FILE = 'store.json'
+_NAME = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+
+class TimeSeriesStore:
+    """
+    Memory-mapped, append-only (time x column) float32 store.
+
+    Parameters
+    ----------
+    path : str
+        Store folder; created if it does not exist.
+
+    Examples
+    --------
+    ::
+
+        store = TimeSeriesStore('store')
+        store.append(record.times, {'Lapse4': record.values})
+        times, T = store.read(['Lapse4', 'Lapse6'], '2016-10-01', '2017-10-01')
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        meta = os.path.join(path, _META_FILE)
+        if os.path.exists(meta):
+            with open(meta) as f:
+                self._columns = json.load(f)['columns']
+        else:
+            self._columns = []
+            self._write_meta()
+        time_file = os.path.join(path, _TIME_FILE)
+        if not os.path.exists(time_file):
+            open(time_file, 'wb').close()
+
+    def _write_meta(self):
+        tmp = os.path.join(self.path, _META_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'columns': self._columns}, f, indent=1)
+        os.replace(tmp, os.path.join(self.path, _META_FILE))
+
+    def _column_file(self, name):
+        return os.path.join(self.path, name + '.f4')
+
+    @property
+    def columns(self):
+        """Column names in storage order."""
+        return list(self._columns)
+
+    def __len__(self):
+        return os.path.getsize(os.path.join(self.path, _TIME_FILE)) // 8
+
+    @property
+    def times(self):
+        """Read-only ``datetime64[s]`` view of the time axis."""
+        n = len(self)
+        if n == 0:
+            return np.empty(0, dtype='datetime64[s]')
+        return np.memmap(os.path.join(self.path, _TIME_FILE), dtype='int64',
+                         mode='r', shape=(n,)).view('datetime64[s]')
+
+    def column(self, name):
+        """Read-only float32 memmap of one column."""
+        if name not in self._columns:
+            raise KeyError(name)
+        n = len(self)
+        if n == 0:
+            return np.empty(0, dtype='float32')
+        return np.memmap(self._column_file(name), dtype='float32', mode='r',
+                         shape=(n,))
+
+    def add_column(self, name):
+        """Add an all-NaN column covering the existing time axis."""
+        if not _NAME.match(name):
+            raise ValueError('invalid column name {!r}'.format(name))
+        if name in self._columns:
+            return
+        with open(self._column_file(name), 'wb') as f:
+            np.full(len(self), np.nan, dtype='float32').tofile(f)
+        self._columns.append(name)
+        self._write_meta()
+
+    def append(self, times, data):
+        """
+        Append rows after the current end of the record.
+
+        Parameters
+        ----------
+        times : array_like of datetime64
+            New sample times, strictly increasing and later than the last
+            stored time.
+        data : dict of str to array_like
+            Values per column, each the length of ``times``. Columns that are
+            not given are filled with NaN; unknown columns are added.
+        """
+        t = np.asarray(times, dtype='datetime64[s]').astype('int64')
+        if t.size == 0:
+            return
+        if np.any(np.diff(t) <= 0):
+            raise ValueError('times must be strictly increasing')
+        n = len(self)
+        if n and t[0] <= int(self.times[-1].astype('int64')):
+            raise ValueError('appended times must follow the stored record '
+                             '(last stored time {})'.format(self.times[-1]))
+        for name in data:
+            if len(data[name]) != t.size:
+                raise ValueError('column {!r} has {} values for {} times'
+                                 .format(name, len(data[name]), t.size))
+            self.add_column(name)
+
+        for name in self._columns:
+            values = data.get(name)
+            if values is None:
+                values = np.full(t.size, np.nan, dtype='float32')
+            path = self._column_file(name)
+            with open(path, 'r+b') as f:
+                # drop any tail left by an interrupted append
+                f.truncate(n * 4)
+                f.seek(n * 4)
+                np.asarray(values, dtype='float32').tofile(f)
+        # the time axis is written last: it defines the committed length
+        with open(os.path.join(self.path, _TIME_FILE), 'ab') as f:
+            t.tofile(f)
+
+    def slice(self, start=None, end=None):
+        """
+        Row range covering ``start <= time < end``.
+
+        Returns
+        -------
+        slice
+        """
+        times = self.times
+        i0 = 0 if start is None else int(np.searchsorted(
+            times, np.datetime64(start, 's'), side='left'))
+        i1 = len(times) if end is None else int(np.searchsorted(
+            times, np.datetime64(end, 's'), side='left'))
+        return slice(i0, i1)
+
+    def read(self, columns=None, start=None, end=None, dtype='float32'):
+        """
+        Read a time range of selected columns into memory.
+
+        Parameters
+        ----------
+        columns : sequence of str, optional
+            Defaults to every column.
+        start, end : datetime64 or str, optional
+            Half-open time range.
+        dtype : str, optional
+            Output dtype.
+
+        Returns
+        -------
+        times : ndarray of datetime64[s]
+        values : ndarray
+            Shape (ntime, ncolumn).
+        """
+        if columns is None:
+            columns = self._columns
+        rows = self.slice(start, end)
+        out = np.empty((rows.stop - rows.start, len(columns)), dtype=dtype)
+        for j, name in enumerate(columns):
+            out[:, j] = self.column(name)[rows]
+        return np.array(self.times[rows]), out
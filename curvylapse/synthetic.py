@@ -0,0 +1,203 @@
+"""
+Synthetic sensor networks
+
+Generates iButton-like temperature records at any scale (sites, years,
+sampling interval) for benchmarking and for checking the analysis against a
+known truth. Temperature at elevation ``z`` (km) and time ``t`` is
+
+    T = annual cycle + lapse(t) * (z - z0) + diurnal cycle(z) + AR(1) noise
+
+with the lapse rate itself following a seasonal cycle (shallow in winter,
+steep in summer) and the diurnal amplitude shrinking with elevation. Gaps are
+runs of missing samples (dead loggers, missed downloads) that cover about
+``gap_rate`` of each record. Everything is drawn from one seeded generator,
+so the same arguments always give the same network.
+
+:func:`write_ibutton_csvs` and :func:`write_daily_files` write the network in
+the raw iButton and ``Daily/`` formats so the readers can be timed too.
+"""
+
+from collections import namedtuple
+import os
+
+import numpy as np
+import pandas as pd
+
+from .align import as_timedelta
+from .daily import daily_aggregate
+
+SyntheticNetwork = namedtuple('SyntheticNetwork',
+                              ['times', 'temperatures', 'elevations',
+                               'names', 'lapse_rate'])
+SyntheticNetwork.__doc__ = """\
+A generated network: ``times`` (datetime64[s], shape (ntime,)),
+``temperatures`` (shape (ntime, nsite), NaN in gaps), site ``elevations``
+(km), site ``names`` and the true ``lapse_rate`` (deg C/km) of each step."""
+
+
+def synthetic_network(nsite=6, years=3, step=3, gap_rate=0.05,
+                      start='2015-10-01', elevation_range=(0.5, 1.75),
+                      mean_lapse=-5.0, lapse_amplitude=1.5, seed=0,
+                      dtype='float64'):
+    """
+    Generate a sensor network on a regular time grid.
+
+    Parameters
+    ----------
+    nsite : int, optional
+        Number of sites, spread evenly over ``elevation_range``.
+    years : float, optional
+        Record length in years.
+    step : timedelta64 or float, optional
+        Sampling interval, hours if a number (3 for DS1923 loggers).
+    gap_rate : float, optional
+        Approximate fraction of each record that is missing.
+    start : str or datetime64, optional
+        First sample time.
+    elevation_range : (float, float), optional
+        Lowest and highest site elevation in km.
+    mean_lapse, lapse_amplitude : float, optional
+        Annual mean and seasonal amplitude of the true lapse rate (deg C/km).
+    seed : int, optional
+        Seed of the random generator.
+    dtype : str, optional
+        Dtype of ``temperatures``.
+
+    Returns
+    -------
+    SyntheticNetwork
+    """
+    rng = np.random.default_rng(seed)
+    dt = as_timedelta(step)
+    ntime = int(years * 365.25 * 86400 // dt.astype('int64'))
+    times = np.datetime64(start, 's') + dt * np.arange(ntime)
+    elev = np.linspace(elevation_range[0], elevation_range[1], nsite)
+
+    day = (times - times.astype('datetime64[Y]')).astype('float64') / 86400
+    hour = (times - times.astype('datetime64[D]')).astype('float64') / 3600
+    # annual cycle peaks in late July, lapse rate steepest in early summer
+    season = np.cos(2 * np.pi * (day - 205) / 365.25)
+    lapse = mean_lapse - lapse_amplitude * np.cos(
+        2 * np.pi * (day - 170) / 365.25)
+    base = 8.0 + 9.0 * season
+    diurnal = np.cos(2 * np.pi * (hour - 15) / 24)
+    amplitude = 5.0 - 1.5 * (elev - elev.min())
+
+    # AR(1) weather noise shared across sites plus a small local part
+    phi = 0.97 ** (dt.astype('int64') / 3600)
+    shocks = rng.standard_normal(ntime) * 1.5 * np.sqrt(1 - phi ** 2)
+    weather = _ar1(shocks, phi)
+    local = rng.standard_normal((ntime, nsite)) * 0.3
+
+    temps = (base[:, np.newaxis] + lapse[:, np.newaxis] * (elev - elev[0])
+             + diurnal[:, np.newaxis] * amplitude
+             + weather[:, np.newaxis] + local)
+    temps[_gap_mask(rng, ntime, nsite, gap_rate)] = np.nan
+    names = ['NFN{}'.format(j + 1) for j in range(nsite)]
+    return SyntheticNetwork(times, temps.astype(dtype), elev, names, lapse)
+
+
+def _ar1(shocks, phi):
+    """AR(1) series ``x[t] = phi * x[t-1] + shocks[t]`` without a loop."""
+    n = shocks.size
+    if n == 0:
+        return shocks.copy()
+    # x[t] = sum_k phi^(t-k) shocks[k], evaluated in blocks to stay finite
+    out = np.empty(n)
+    block = max(1, int(min(n, 700 / max(-np.log(phi), 1e-12))))
+    carry = 0.0
+    for b0 in range(0, n, block):
+        s = shocks[b0:b0 + block]
+        powers = phi ** np.arange(s.size)
+        x = np.cumsum(s / powers) * powers + carry * phi * powers
+        out[b0:b0 + s.size] = x
+        carry = x[-1]
+    return out
+
+
+def _gap_mask(rng, ntime, nsite, gap_rate):
+    """Runs of missing samples covering about ``gap_rate`` of each column."""
+    mask = np.zeros((ntime, nsite), dtype=bool)
+    if gap_rate <= 0 or ntime == 0:
+        return mask
+    mean_length = max(1, ntime // 50)
+    ngap = rng.poisson(gap_rate * ntime / mean_length, size=nsite)
+    for j, count in enumerate(ngap):
+        starts = rng.integers(0, ntime, size=count)
+        lengths = rng.geometric(1.0 / mean_length, size=count)
+        # mark run edges and fill with a cumulative sum
+        edge = np.zeros(ntime + 1, dtype='int64')
+        np.add.at(edge, starts, 1)
+        np.add.at(edge, np.minimum(starts + lengths, ntime), -1)
+        mask[:, j] = np.cumsum(edge[:-1]) > 0
+    return mask
+
+
+def write_ibutton_csvs(network, directory, unit='C'):
+    """
+    Write one raw iButton CSV export per site.
+
+    Files are named ``<site>_synthetic.csv`` and have a mission header
+    followed by ``12/4/15 2:01:01 PM,C,1.5`` rows, as read by
+    :func:`curvylapse.ibutton.read_ibutton_csv`. Gap samples are left out.
+
+    Returns
+    -------
+    list of str
+        Paths written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamps = pd.DatetimeIndex(network.times).strftime('%m/%d/%y %I:%M:%S %p')
+    stamps = np.asarray(stamps, dtype=object)
+    paths = []
+    for j, name in enumerate(network.names):
+        values = network.temperatures[:, j]
+        keep = ~np.isnan(values)
+        path = os.path.join(directory, '{}_synthetic.csv'.format(name))
+        with open(path, 'w') as f:
+            f.write('1-Wire/iButton Part Number: DS1923\n'
+                    'Device Name: {}\n'
+                    'Mission Start: {}\n'
+                    'Sample Rate: Every {} minute(s)\n'
+                    '\nDate/Time,Unit,Value\n'.format(
+                        name, stamps[0] if stamps.size else '',
+                        _step_minutes(network.times)))
+            pd.DataFrame({'t': stamps[keep], 'u': unit,
+                          'v': np.round(values[keep], 4)}).to_csv(
+                f, header=False, index=False)
+        paths.append(path)
+    return paths
+
+
+def _step_minutes(times):
+    if len(times) < 2:
+        return 0
+    return int((times[1] - times[0]).astype('int64') // 60)
+
+
+def write_daily_files(network, directory):
+    """
+    Write daily means in the ``Daily/`` layout, one file per site and year.
+
+    Files are named ``<year>_<site>_dailyT.csv`` so
+    :func:`curvylapse.ingest.ingest_daily` discovers them.
+
+    Returns
+    -------
+    list of str
+        Paths written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    daily = daily_aggregate(network.times, network.temperatures)
+    years = daily.dates.astype('datetime64[Y]').astype('int64') + 1970
+    paths = []
+    for year in np.unique(years):
+        rows = years == year
+        for j, name in enumerate(network.names):
+            path = os.path.join(directory, '{}_{}_dailyT.csv'.format(year,
+                                                                     name))
+            pd.DataFrame({'Time': daily.dates[rows].astype(str),
+                          'AirT_daily_mean': daily.mean[rows, j]}).to_csv(
+                path, index=False)
+            paths.append(path)
+    return paths
@@ -0,0 +1,29 @@
+import numpy as np
+
+from curvylapse.align import snap_to_grid
+
+
+def test_nearest_sample_wins_a_shared_slot():
+    grid = np.array(['2016-01-01T00', '2016-01-01T03'], dtype='datetime64[s]')
+    times = np.array(['2016-01-01T00:50', '2016-01-01T00:10'],
+                     dtype='datetime64[s]')
+    out = snap_to_grid(grid, times, [5.0, 4.0])
+    assert out.tolist()[0] == 4.0
+    assert np.isnan(out[1])
+
+
+def test_missing_sample_does_not_hide_a_valid_one():
+    grid = np.array(['2016-01-01T00', '2016-01-01T03'], dtype='datetime64[s]')
+    times = np.array(['2016-01-01T00:10', '2016-01-01T00:50'],
+                     dtype='datetime64[s]')
+    assert snap_to_grid(grid, times, [np.nan, 5.0])[0] == 5.0
+    two = snap_to_grid(grid, times, [[np.nan, np.nan], [5.0, 6.0]])
+    assert two[0].tolist() == [5.0, 6.0]
+
+
+def test_first_of_equally_near_samples_wins():
+    grid = np.array(['2016-01-01T00', '2016-01-01T03'], dtype='datetime64[s]')
+    times = np.array(['2016-01-01T00:30', '2015-12-31T23:30',
+                      '2016-01-01T03:00'], dtype='datetime64[s]')
+    out = snap_to_grid(grid, times, [1.0, 2.0, 3.0])
+    assert out.tolist() == [1.0, 3.0]
@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from curvylapse.cache import cached_table, load_columns
+
+
+def test_round_trip_and_rebuild_when_a_source_changes(tmp_path):
+    source = tmp_path / 'source.txt'
+    source.write_text('v1')
+    days = np.arange('2016-10-01', '2016-10-06', dtype='datetime64[D]')
+    index = pd.DatetimeIndex(days, name='date')
+    table = pd.DataFrame({'NFN1_AT': [1.0, np.nan, 3.0, 4.0, 5.0],
+                          'NFN4_ST': np.arange(5, dtype='float32')},
+                         index=index)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return table
+
+    cache = str(tmp_path / 'cache')
+    first = cached_table('t', build, [str(source)], cache)
+    again = cached_table('t', build, [str(source)], cache)
+    assert len(builds) == 1
+    pd.testing.assert_frame_equal(again, table)
+    pd.testing.assert_frame_equal(first, table)
+    _, columns = load_columns(os.path.join(cache, 't'), ['NFN4_ST'])
+    assert list(columns) == ['NFN4_ST']
+    assert columns['NFN4_ST'].dtype == np.float32
+
+    source.write_text('version 2')
+    cached_table('t', build, [str(source)], cache)
+    assert len(builds) == 2
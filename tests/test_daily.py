@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from curvylapse.daily import daily_aggregate
+
+
+def test_matches_pandas_daily_resample_on_shuffled_input():
+    rng = np.random.default_rng(2)
+    times = (np.datetime64('2016-10-01', 's')
+             + np.arange(400) * np.timedelta64(3, 'h'))
+    values = rng.normal(5.0, 4.0, (times.size, 3))
+    values[rng.random(values.shape) < 0.2] = np.nan
+    values[80:120, 1] = np.nan              # whole days missing
+    keep = np.ones(times.size, dtype=bool)
+    keep[200:224] = False                   # three days with no rows
+    order = rng.permutation(np.flatnonzero(keep))
+
+    daily = daily_aggregate(times[order], values[order])
+    ref = pd.DataFrame(values[keep], index=times[keep]).resample('D')
+    assert np.array_equal(daily.dates,
+                          ref.mean().index.values.astype('datetime64[D]'))
+    np.testing.assert_allclose(daily.mean, ref.mean().values)
+    np.testing.assert_allclose(daily.min, ref.min().values)
+    np.testing.assert_allclose(daily.max, ref.max().values)
+    assert np.array_equal(daily.count, ref.count().values)
+
+    sparse = daily_aggregate(times[order], values[order],
+                             fill_missing_days=False)
+    assert sparse.dates.size == daily.dates.size - 3
@@ -0,0 +1,41 @@
+import numpy as np
+
+from curvylapse.degreedays import degree_days, dem_bands, period_totals
+
+
+def test_water_year_totals_match_a_loop():
+    rng = np.random.default_rng(12)
+    dates = np.arange('2016-08-01', '2018-03-01', dtype='datetime64[D]')
+    T = rng.normal(4.0, 6.0, (dates.size, 2))
+    T[rng.random(T.shape) < 0.1] = np.nan
+    thresholds = [0.0, 5.0]
+    totals = period_totals(degree_days(dates, T, thresholds))
+
+    wy = (dates.astype('datetime64[Y]').astype('int64') + 1970
+          + (dates.astype('datetime64[M]').astype('int64') % 12 >= 9))
+    assert totals.labels.tolist() == [2016, 2017, 2018]
+    for p, year in enumerate(totals.labels):
+        rows = T[wy == year]
+        assert totals.dates[p] == dates[wy == year][-1]
+        for i, base in enumerate(thresholds):
+            for j in range(2):
+                t = rows[~np.isnan(rows[:, j]), j]
+                expect = [np.sum(np.maximum(t - base, 0)),
+                          np.sum(np.maximum(base - t, 0)),
+                          np.sum(t > base), np.sum(t < base), t.size]
+                got = [totals.positive[p, i, j], totals.negative[p, i, j],
+                       totals.days_above[p, i, j],
+                       totals.days_below[p, i, j], totals.valid[p, i, j]]
+                np.testing.assert_allclose(got, expect, rtol=1e-9,
+                                           atol=1e-9)
+
+
+def test_dem_bands_in_tiles_skip_nodata(tmp_path):
+    dem = np.array([[500.0, 700.0, -9999.0], [900.0, np.nan, 1500.0],
+                    [1100.0, 1300.0, 1700.0]])
+    path = tmp_path / 'dem.npy'
+    np.save(str(path), dem)
+    mean, cells = dem_bands(path, [0.5, 1.0, 1.5, 2.0], 0.001, -9999.0,
+                            tile_rows=2)
+    assert cells.tolist() == [3, 2, 2]
+    np.testing.assert_allclose(mean, [0.7, 1.2, 1.6])
@@ -0,0 +1,57 @@
+import warnings
+
+import numpy as np
+from scipy import stats
+
+from curvylapse.estimators import fit_lapse_rates, predict
+
+
+def _network(seed=9):
+    rng = np.random.default_rng(seed)
+    z = np.array([0.51, 0.66, 1.06, 1.29, 1.58, 1.74])
+    T = (9.0 - 5.5 * z + 2.0 * (z - 1.1) ** 2
+         + 0.3 * rng.standard_normal((80, z.size)))
+    T[rng.random(T.shape) < 0.2] = np.nan
+    T[0] = np.nan
+    return z, T
+
+
+def test_theilsen_matches_scipy_theilslopes():
+    z, T = _network()
+    fit = fit_lapse_rates(z, T, 'theilsen')
+    assert np.isnan(fit.slope[0])
+    for i in range(1, T.shape[0]):
+        ok = ~np.isnan(T[i])
+        if ok.sum() < 2:
+            continue
+        ref = stats.theilslopes(T[i, ok], z[ok])
+        np.testing.assert_allclose([fit.slope[i], fit.intercept[i]],
+                                   [ref[0], ref[1]], rtol=1e-9)
+
+
+def test_quadratic_matches_polyfit():
+    z, T = _network()
+    fit = fit_lapse_rates(z, T, 'quadratic')
+    grid = np.linspace(0.5, 1.8, 5)
+    curve = predict(fit, grid)
+    for i in range(T.shape[0]):
+        ok = ~np.isnan(T[i])
+        if ok.sum() < 3:
+            assert np.isnan(fit.curvature[i])
+            continue
+        coef = np.polyfit(z[ok], T[i, ok], 2)
+        np.testing.assert_allclose(fit.curvature[i], coef[0], rtol=1e-7)
+        np.testing.assert_allclose(curve[i], np.polyval(coef, grid),
+                                   rtol=1e-7, atol=1e-9)
+
+
+def test_huber_resists_an_outlier_without_warnings():
+    z = np.array([0.51, 0.66, 1.06, 1.29, 1.58, 1.74])
+    T = np.vstack([10.0 - 5.0 * z, np.full(z.size, np.nan)])
+    T[0, -1] += 8.0                     # a sensor in the sun
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        fit = fit_lapse_rates(z, T, 'huber')
+    ols = fit_lapse_rates(z, T, 'ols')
+    assert abs(fit.slope[0] + 5.0) < 0.5 * abs(ols.slope[0] + 5.0)
+    assert np.isnan(fit.slope[1]) and fit.nobs[1] == 0
@@ -0,0 +1,32 @@
+import numpy as np
+
+from curvylapse.figures import (RENDERERS, FigureSpec, build_figures,
+                                new_figure, renderer)
+
+
+@renderer('test_line')
+def _line(values):
+    fig = new_figure(2, 2)
+    fig.add_subplot().plot(values)
+    return fig
+
+
+def _dots(values):
+    fig = new_figure(2, 2)
+    fig.add_subplot().plot(values, 'o')
+    return fig
+
+
+def test_editing_a_renderer_redraws_its_figures(tmp_path):
+    spec = FigureSpec('line', 'test_line', dict(values=np.arange(3.0)), {},
+                      50)
+    outdir = str(tmp_path)
+    assert build_figures([spec], outdir, max_workers=1) == {
+        'line': 'rendered'}
+    assert build_figures([spec], outdir, max_workers=1) == {'line': 'cached'}
+    RENDERERS['test_line'] = _dots
+    try:
+        status = build_figures([spec], outdir, max_workers=1)
+    finally:
+        RENDERERS['test_line'] = _line
+    assert status == {'line': 'rendered'}
@@ -0,0 +1,44 @@
+import numpy as np
+from scipy import stats
+
+from curvylapse.gapfill import (FILLED_LAPSE, FILLED_NEIGHBOR, MISSING,
+                                OBSERVED, fill_gaps, neighbor_regressions)
+
+
+def test_neighbor_regressions_match_pairwise_linregress():
+    rng = np.random.default_rng(4)
+    base = np.cumsum(rng.standard_normal(300))
+    y = base[:, np.newaxis] * [1.0, 0.8, 1.2] + rng.standard_normal((300, 3))
+    y[rng.random(y.shape) < 0.2] = np.nan
+    for lag in (0, 2):
+        slope, intercept, r2 = neighbor_regressions(y, lag)
+        assert np.isnan(np.diag(slope)).all()
+        for j, k in [(0, 1), (2, 0), (1, 2)]:
+            pred = np.full(300, np.nan)
+            pred[lag:] = y[:300 - lag, k]
+            ok = ~np.isnan(y[:, j]) & ~np.isnan(pred)
+            ref = stats.linregress(pred[ok], y[ok, j])
+            np.testing.assert_allclose(
+                [slope[j, k], intercept[j, k], r2[j, k]],
+                [ref.slope, ref.intercept, ref.rvalue ** 2], rtol=1e-9)
+
+
+def test_lapse_fill_then_neighbor_fill_for_the_rest():
+    rng = np.random.default_rng(6)
+    z = np.array([0.5, 1.0, 1.5, 2.0])
+    level = 10.0 + 3.0 * np.sin(np.arange(100) / 5.0)
+    T = level[:, np.newaxis] - 6.0 * z + 0.01 * rng.standard_normal((100, 4))
+    T[10, 2] = np.nan                   # three sensors left: lapse fill
+    T[20, 1:] = np.nan                  # one sensor left: neighbor fill
+    T[30, :] = np.nan                   # nothing to go on
+    out = fill_gaps(z, T, methods=('lapse', 'neighbor'))
+
+    observed = ~np.isnan(T)
+    assert np.array_equal(out.values[observed], T[observed])
+    assert (out.flag[observed] == OBSERVED).all()
+    assert out.flag[10, 2] == FILLED_LAPSE
+    assert (out.flag[20, 1:] == FILLED_NEIGHBOR).all()
+    assert (out.flag[30] == MISSING).all() and np.isnan(out.values[30]).all()
+    truth = level[[10, 20, 20, 20]] - 6.0 * z[[2, 1, 2, 3]]
+    filled = out.values[[10, 20, 20, 20], [2, 1, 2, 3]]
+    np.testing.assert_allclose(filled, truth, atol=0.1)
@@ -0,0 +1,67 @@
+import numpy as np
+
+from curvylapse.incremental import IncrementalLapseRate
+
+
+def _july(seed=0):
+    """3-hourly July, true -5 deg C/km, warming, top sensor lost mid-month."""
+    times = (np.datetime64('2018-07-01', 's')
+             + np.arange(248) * np.timedelta64(3, 'h'))
+    z = np.array([0.51, 0.66, 1.06, 1.29, 1.58, 1.74])
+    trend = 12.0 + 0.1 * np.arange(times.size)[:, np.newaxis] / 8
+    T = trend - 5.0 * z
+    T[times >= np.datetime64('2018-07-16'), -1] = np.nan
+    return times, z, T
+
+
+def test_period_fit_not_biased_by_missing_sensor():
+    times, z, T = _july()
+    inc = IncrementalLapseRate(z)
+    inc.update(times, T)
+    labels, fit = inc.period_fit()
+    _, mean_slope, _ = inc.period_mean_slope()
+    assert labels.tolist() == [np.datetime64('2018-07', 'M').item()]
+    assert np.allclose(fit.slope, -5.0)
+    assert np.allclose(mean_slope, -5.0)
+    assert fit.nobs[0] == np.isfinite(T).sum()
+
+
+def test_batches_match_one_pass_and_survive_save(tmp_path):
+    times, z, T = _july()
+    T = T + np.random.default_rng(0).standard_normal(T.shape)
+    whole = IncrementalLapseRate(z)
+    whole.update(times, T)
+    parts = IncrementalLapseRate(z)
+    parts.update(times[:100], T[:100])
+    path = str(tmp_path / 'state.npz')
+    parts.save(path)
+    parts = IncrementalLapseRate.load(path)
+    parts.update(times[80:], T[80:])
+    for a, b in zip(whole.period_fit()[1], parts.period_fit()[1]):
+        assert np.allclose(a, b)
+
+
+def test_late_download_from_one_sensor_is_merged(tmp_path):
+    times, z, T = _july()
+    T = T + np.random.default_rng(1).standard_normal(T.shape)
+    whole = IncrementalLapseRate(z)
+    whole.update(times, T)
+
+    inc = IncrementalLapseRate(z)
+    early = T.copy()
+    early[:, 2] = np.nan        # sensor 2 not downloaded yet
+    inc.update(times[:150], early[:150])
+    path = str(tmp_path / 'state.npz')
+    inc.save(path)
+    inc = IncrementalLapseRate.load(path)
+    inc.update(times, T)        # the full re-aligned record
+    assert inc.skipped == np.isfinite(early[:150]).sum()
+
+    assert np.array_equal(whole.daily().dates, inc.daily().dates)
+    for a, b in zip(whole.daily()[1:], inc.daily()[1:]):
+        assert np.allclose(a, b, equal_nan=True)
+    for a, b in zip(whole.period_fit()[1], inc.period_fit()[1]):
+        assert np.allclose(a, b)
+    for a, b in zip(whole.period_mean_slope()[1:],
+                    inc.period_mean_slope()[1:]):
+        assert np.allclose(a, b)
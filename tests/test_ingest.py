@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from curvylapse.ingest import (discover_daily_files, ingest_daily,
+                               ingest_raw, read_daily_file)
+
+ROOT = os.path.join(os.path.dirname(__file__), os.pardir)
+
+
+def _swap_days(files):
+    """Days covered by two or more files of the same column."""
+    seen, swaps = {}, set()
+    for f in files:
+        key = '{}_{}'.format(f.site, f.variable)
+        dates, values = read_daily_file(f.path)
+        days = set(dates[~np.isnan(values)].tolist())
+        swaps |= {(key, d) for d in days & seen.get(key, set())}
+        seen.setdefault(key, set()).update(days)
+    return swaps
+
+
+def test_daily_files_match_all_sites_table():
+    daily = os.path.join(ROOT, 'Daily')
+    table = ingest_daily(daily, max_workers=1)
+    ref = pd.read_csv(os.path.join(ROOT, 'All_sites_dailyT.csv'),
+                      index_col='date', parse_dates=True)
+    # the reference spans fewer days and has an empty NFN3_ST column
+    assert set(table.columns) == {c for c in ref.columns[2:]
+                                  if ref[c].notna().any()}
+    swaps = _swap_days(discover_daily_files(daily))
+    mismatched = set()
+    for name in table.columns:
+        got = table[name].reindex(ref.index)
+        assert got.isna().equals(ref[name].isna()), name
+        differ = np.abs(got - ref[name]) > 1e-6
+        days = ref.index[differ].values.astype('datetime64[D]')
+        mismatched |= {(name, d) for d in days.tolist()}
+    assert mismatched <= swaps
+    assert len(mismatched) == 3
+
+
+def _write_download(path, start, nsample, value, unit='C'):
+    times = pd.date_range(start, periods=nsample, freq='3h')
+    with open(path, 'w') as f:
+        f.write('1-Wire/iButton Part Number: DS1923\n\nDate/Time,Unit,Value\n')
+        for t in times.strftime('%m/%d/%y %I:%M:%S %p'):
+            f.write('{},{},{}\n'.format(t, unit, value))
+
+
+def test_overlapping_downloads_keep_the_earlier_one(tmp_path):
+    os.makedirs(str(tmp_path / '2018'))
+    # the later download is found first but must not win the overlap
+    _write_download(str(tmp_path / 'Lapse4_9-28-17.csv'),
+                    '2017-09-28 00:00', 8, 2.0)
+    _write_download(str(tmp_path / '2018' / 'Lapse4_8-16-16.csv'),
+                    '2017-09-27 00:00', 12, 1.0)
+    _write_download(str(tmp_path / 'Lapse2_8-16-16_RH.csv'),
+                    '2016-08-16 00:00', 4, 90.0, unit='%RH')
+    series = ingest_raw(str(tmp_path), max_workers=1)
+
+    assert sorted(series) == ['NFN3_RH', 'NFN4_AT']
+    times, values = series['NFN4_AT']
+    assert times.size == 12 + 4
+    assert np.all(np.diff(times) > np.timedelta64(0, 's'))
+    assert np.all(values[:12] == 1.0) and np.all(values[12:] == 2.0)
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from curvylapse.odm import load_odm1
+
+ROOT = os.path.join(os.path.dirname(__file__), os.pardir)
+
+
+def test_pivot_matches_pandas_on_the_export():
+    directory = os.path.join(ROOT, 'HydroServer-ODM1')
+    odm = load_odm1(directory)
+    raw = pd.read_csv(os.path.join(directory, 'datavalues.csv'))
+    raw['LocalDateTime'] = pd.to_datetime(raw['LocalDateTime'],
+                                          format='%m/%d/%Y')
+    for variable in ('AirTemp_avg', 'SoilTemp_avg'):
+        ref = raw[raw['VariableCode'] == variable].pivot(
+            index='LocalDateTime', columns='SiteCode', values='DataValue')
+        table = odm.pivot(variable)
+        assert table.columns.tolist() == ref.columns.tolist()
+        assert np.array_equal(table.index.values.astype('datetime64[s]'),
+                              ref.index.values.astype('datetime64[s]'))
+        np.testing.assert_array_equal(table.values, ref.values)
+
+
+def test_series_masks_no_data_and_needs_qc_when_ambiguous(tmp_path):
+    rows = [(1.5, '8/17/2016', 'NFN4', 1), (-9999, '8/16/2016', 'NFN4', 1),
+            (2.5, '8/16/2016', 'NFN4', 0), (7.0, '8/16/2016', 'NFN7', 1)]
+    pd.DataFrame({
+        'DataValue': [r[0] for r in rows],
+        'LocalDateTime': [r[1] for r in rows],
+        'SiteCode': [r[2] for r in rows], 'VariableCode': 'AirTemp_avg',
+        'MethodCode': 'iButton_1923_AT', 'SourceCode': 'jbeaulieu',
+        'QualityControlLevelCode': [r[3] for r in rows],
+    }).to_csv(str(tmp_path / 'datavalues.csv'), index=False)
+    pd.DataFrame({'VariableCode': ['AirTemp_avg'], 'NoDataValue': [-9999]}
+                 ).to_csv(str(tmp_path / 'variables.csv'), index=False)
+    odm = load_odm1(str(tmp_path))
+
+    with pytest.raises(KeyError):
+        odm.series('NFN4', 'AirTemp_avg')
+    times, values = odm.series('NFN4', 'AirTemp_avg', qc=1)
+    assert times.astype(str).tolist() == ['2016-08-16T00:00:00',
+                                          '2016-08-17T00:00:00']
+    assert np.isnan(values[0]) and values[1] == 1.5
+    table = odm.pivot('AirTemp_avg', qc=1)
+    assert table.columns.tolist() == ['NFN4', 'NFN7']
+    assert table['NFN7'].tolist()[0] == 7.0
+    assert np.isnan(table['NFN7'].tolist()[1])
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pytest
+
+from curvylapse import synthetic_network
+from curvylapse.pipeline import DEFAULT_CONFIG, STAGES, run_pipeline, stage_key
+from curvylapse.synthetic import write_ibutton_csvs
+
+
+def _raw_config(tmp_path, net):
+    write_ibutton_csvs(net, str(tmp_path / 'raw'))
+    elevation = tmp_path / 'Elevation.csv'
+    with open(str(elevation), 'w') as f:
+        f.write('ID,Elevation (m)\n')
+        for name, z in zip(net.names, net.elevations):
+            f.write('Lapse{},{}\n'.format(name[3:], z * 1000))
+    return {'raw': str(tmp_path / 'raw'), 'step': 3,
+            'elevations': str(elevation),
+            'sites': str(tmp_path / 'missing_sites.csv'),
+            'output': str(tmp_path / 'output'), 'figures': False,
+            'max_workers': 1}
+
+
+def test_raw_mode_recovers_lapse_rate(tmp_path):
+    net = synthetic_network(nsite=5, years=0.25, step=3, seed=1)
+    config = _raw_config(tmp_path, net)
+    outputs, status = run_pipeline(config, str(tmp_path / 'cache'))
+
+    assert set(status.values()) == {'ran'}
+    fits = outputs['regress']
+    assert fits['names'].tolist() == [n + '_AT' for n in net.names]
+    # compare with the true lapse rate averaged over each day
+    days = net.times.astype('datetime64[D]')
+    codes = np.searchsorted(fits['dates'], days)
+    true = (np.bincount(codes, net.lapse_rate, fits['dates'].size)
+            / np.bincount(codes, minlength=fits['dates'].size))
+    ok = ~np.isnan(fits['slope'])
+    assert ok.sum() > 0.8 * ok.size
+    assert np.median(np.abs(fits['slope'][ok] - true[ok])) < 0.5
+    assert os.path.exists(os.path.join(config['output'], 'lapse_rates.csv'))
+
+
+def test_parameter_change_reruns_downstream_only(tmp_path):
+    net = synthetic_network(nsite=4, years=0.25, step=3, seed=2)
+    config = _raw_config(tmp_path, net)
+    cache = str(tmp_path / 'cache')
+    run_pipeline(config, cache)
+
+    _, status = run_pipeline(config, cache)
+    assert status == {'ingest': 'cached', 'align': 'cached',
+                      'daily': 'cached', 'regress': 'cached',
+                      'rollup': 'cached', 'export': 'ran'}
+
+    config['by'] = 'water_year'
+    _, status = run_pipeline(config, cache)
+    assert status['regress'] == 'cached'
+    assert status['rollup'] == 'ran'
+
+
+def test_stage_code_is_part_of_the_key():
+    regress = [s for s in STAGES if s.name == 'regress'][0]
+    config = dict(DEFAULT_CONFIG, sites=None, elevations=None)
+    key = stage_key(regress, config, ['upstream'])
+    edited = regress._replace(func=lambda config, daily: None)
+    assert stage_key(edited, config, ['upstream']) != key
+    fewer = regress._replace(modules=('regression',))
+    assert stage_key(fewer, config, ['upstream']) != key
+
+
+def test_sensor_without_elevation_is_an_error(tmp_path):
+    net = synthetic_network(nsite=4, years=0.1, step=3, seed=3)
+    config = _raw_config(tmp_path, net)
+    with open(config['elevations'], 'a') as f:
+        f.write('Lapse9,NA\n')
+    net = net._replace(names=net.names[:3] + ['NFN9'])
+    write_ibutton_csvs(net, config['raw'])
+    with pytest.raises(ValueError, match='NFN9_AT'):
+        run_pipeline(config, str(tmp_path / 'cache'))
@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+
+from curvylapse.align import AlignedRecord
+from curvylapse.odm import load_odm1
+from curvylapse.registry import Sensor, SensorRegistry, site_metadata
+
+ROOT = os.path.join(os.path.dirname(__file__), os.pardir)
+
+
+def test_from_odm_groups_variables_and_looks_up_elevations():
+    odm = load_odm1(os.path.join(ROOT, 'HydroServer-ODM1'))
+    reg = SensorRegistry.from_odm(
+        odm, ('AirTemp_avg', 'SoilTemp_avg'),
+        elevations=os.path.join(ROOT, 'Elevation.csv'))
+    air = reg.data(variable='AirTemp_avg')
+    assert air.base is reg.values           # one variable is a view
+    assert [s.site for s in reg.select(variable='SoilTemp_avg')] == [
+        'NFN4', 'NFN6', 'NFN7']
+    z = reg.elevations(variable='AirTemp_avg')
+    assert np.allclose(z[[0, -1]], [0.50687, 1.743066138])
+    times, values = odm.series('NFN3', 'AirTemp_avg')
+    rows = np.searchsorted(reg.times, times)
+    assert np.array_equal(reg.column('NFN3_AirTemp_avg')[rows], values)
+
+
+def test_from_record_maps_loggers_to_sites_and_add_extends_time():
+    t = np.array(['2016-08-16T12', '2016-08-16T15'], dtype='datetime64[s]')
+    record = AlignedRecord(t, np.array([[1.0, 2.0], [3.0, np.nan]]),
+                           ['Lapse2', 'Lapse7'])
+    metadata = site_metadata(os.path.join(ROOT, 'HydroServer-ODM1',
+                                          'sites.csv'),
+                             os.path.join(ROOT, 'Elevation.csv'))
+    reg = SensorRegistry.from_record(record, metadata=metadata)
+    assert [s.site for s in reg] == ['NFN3', 'NFN7']
+    assert reg['Lapse2'].elevation == metadata.loc['NFN3', 'Elevation']
+
+    later = np.array(['2016-08-16T18'], dtype='datetime64[s]')
+    reg.add(Sensor('Lapse4', 'NFN4', 'AirTemp_avg'), later, [5.0])
+    assert reg.values.shape == (3, 3)
+    assert np.isnan(reg.column('Lapse2')[2])
+    assert reg.column('Lapse4').tolist()[2] == 5.0
@@ -0,0 +1,47 @@
+import warnings
+
+import numpy as np
+from scipy import stats
+
+from curvylapse.regression import (batch_linregress, segmented_linregress,
+                                   segments_from_breakpoints)
+
+
+def test_segments_match_batch_fits_of_their_sensors():
+    rng = np.random.default_rng(5)
+    z = np.array([0.51, 0.66, 1.06, 1.29, 1.58, 1.74])
+    T = 9.0 - 5.5 * z + rng.standard_normal((300, z.size))
+    T[rng.random(T.shape) < 0.3] = np.nan
+    T[:20] = np.nan     # no sensor reports, as in a union-span alignment
+    segments = segments_from_breakpoints(z, [0.5, 1.06, 1.58, 1.75])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        fit = segmented_linregress(z, T, segments)
+    for k, idx in enumerate(segments):
+        ref = batch_linregress(z[idx], T[:, idx])
+        for got, want in zip(fit, ref):
+            np.testing.assert_allclose(got[:, k], want, rtol=1e-9,
+                                       atol=1e-9)
+
+
+def test_batch_matches_scipy_linregress_row_by_row():
+    rng = np.random.default_rng(11)
+    z = np.array([0.51, 0.66, 1.06, 1.29, 1.58, 1.74])
+    T = 9.0 - 5.5 * z + rng.standard_normal((200, z.size))
+    T[rng.random(T.shape) < 0.35] = np.nan
+    T[0, 1:] = np.nan           # one sensor
+    T[1, 2:] = np.nan           # exactly two
+    T[2] = np.nan               # none
+
+    fit = batch_linregress(z, T)
+    for i, row in enumerate(T):
+        ok = ~np.isnan(row)
+        assert fit.nobs[i] == ok.sum()
+        if ok.sum() < 2:
+            assert np.isnan(fit.slope[i]) and np.isnan(fit.intercept[i])
+            continue
+        ref = stats.linregress(z[ok], row[ok])
+        got = [fit.slope[i], fit.intercept[i], fit.rvalue[i],
+               fit.pvalue[i], fit.stderr[i]]
+        np.testing.assert_allclose(got, ref[:5], rtol=1e-9, atol=1e-12)
@@ -0,0 +1,49 @@
+import numpy as np
+
+from curvylapse.regression import batch_linregress
+from curvylapse.rolling import rolling_linregress
+
+
+def _warming_network(dropout=60):
+    """True lapse rate -5 deg C/km, 0.3 deg C/day warming, top sensor lost."""
+    z = np.array([0.5, 0.7, 1.0, 1.3, 1.6, 1.75])
+    day = np.arange(120, dtype='float64')
+    T = 10.0 + 0.3 * day[:, np.newaxis] - 5.0 * z
+    T[dropout:, -1] = np.nan
+    return z, T
+
+
+def test_sensor_dropout_does_not_bias_window_slope():
+    z, T = _warming_network()
+    assert np.allclose(batch_linregress(z, T).slope, -5.0)
+    fit = rolling_linregress(z, T, 31)
+    assert np.allclose(fit.slope, -5.0)
+
+
+def test_window_sweep_matches_single_windows():
+    rng = np.random.default_rng(0)
+    z = np.linspace(0.5, 1.75, 6)
+    T = 8.0 - 5.0 * z + rng.standard_normal((200, 6))
+    T[rng.random(T.shape) < 0.2] = np.nan
+    sweep = rolling_linregress(z, T, [5, 31])
+    for j, w in enumerate([5, 31]):
+        single = rolling_linregress(z, T, w)
+        assert np.allclose(sweep.slope[:, j], single.slope, equal_nan=True)
+
+
+def test_window_slope_is_pooled_within_step_fit():
+    rng = np.random.default_rng(1)
+    z = np.linspace(0.5, 1.75, 5)
+    T = 20.0 * rng.random((40, 1)) - 5.0 * z + rng.standard_normal((40, 5))
+    T[rng.random(T.shape) < 0.3] = np.nan
+    fit = rolling_linregress(z, T, 9, center=False)
+    t = 20
+    sxy = sxx = 0.0
+    for row in T[t - 8:t + 1]:
+        ok = np.isfinite(row)
+        if ok.sum() < 2:
+            continue
+        dx = z[ok] - z[ok].mean()
+        sxy += (dx * (row[ok] - row[ok].mean())).sum()
+        sxx += (dx * dx).sum()
+    assert np.isclose(fit.slope[t], sxy / sxx)
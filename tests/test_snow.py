@@ -0,0 +1,29 @@
+import numpy as np
+
+from curvylapse.snow import detect_snow
+
+
+def test_matches_window_by_window_statistics():
+    rng = np.random.default_rng(3)
+    g = rng.uniform(-1.0, 3.0, (60, 3)) * rng.uniform(0.0, 1.0, (60, 1))
+    g[rng.random(g.shape) < 0.2] = np.nan
+    window, half = 7, 3
+    state = detect_snow(g, window, max_std=0.4, max_temp=1.5)
+    for t in range(g.shape[0]):
+        for j in range(g.shape[1]):
+            w = g[max(t - half, 0):t + half + 1, j]
+            w = w[~np.isnan(w)]
+            if w.size < 4:
+                assert np.isnan(state[t, j])
+            else:
+                snow = w.std(ddof=1) <= 0.4 and w.max() <= 1.5
+                assert state[t, j] == float(snow)
+
+
+def test_flat_ground_under_snow_on_a_long_warm_record():
+    # large offsets must not leak round-off into the window variance
+    g = 0.1 + 0.001 * np.sin(np.arange(20000.0))
+    g[:10000] += 15.0 + np.sin(np.arange(10000))
+    state = detect_snow(g, 9, max_std=0.01, max_temp=2.0)
+    assert np.all(state[10004:] == 1.0)
+    assert np.all(state[:9996] == 0.0)
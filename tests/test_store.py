@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from curvylapse.store import TimeSeriesStore
+
+
+def test_appends_survive_reopening_and_read_by_range(tmp_path):
+    path = str(tmp_path / 'store')
+    t = (np.datetime64('2016-08-16T12', 's')
+         + np.arange(10) * np.timedelta64(3, 'h'))
+    store = TimeSeriesStore(path)
+    store.append(t[:6], {'Lapse4': np.arange(6.0)})
+    with pytest.raises(ValueError):
+        store.append(t[5:], {'Lapse4': np.zeros(5)})
+
+    store = TimeSeriesStore(path)       # reopen from disk
+    store.append(t[6:], {'Lapse4': np.arange(6.0, 10.0),
+                         'Lapse7_RH': np.full(4, 95.5)})
+    assert store.columns == ['Lapse4', 'Lapse7_RH']
+    assert np.array_equal(store.times, t)
+
+    times, values = store.read(['Lapse7_RH', 'Lapse4'], t[4], t[8])
+    assert np.array_equal(times, t[4:8])
+    assert values.dtype == np.float32
+    assert np.isnan(values[:2, 0]).all()
+    assert values[2:, 0].tolist() == [95.5, 95.5]
+    assert values[:, 1].tolist() == [4.0, 5.0, 6.0, 7.0]
@@ -0,0 +1,40 @@
+import numpy as np
+
+from curvylapse.regression import batch_linregress
+from curvylapse.uncertainty import period_intervals, resample_lapse_rates
+
+
+def _network(seed=8):
+    rng = np.random.default_rng(seed)
+    z = np.array([0.51, 0.66, 1.06, 1.29, 1.58, 1.74])
+    T = 9.0 - 5.5 * z + rng.standard_normal((90, z.size))
+    T[rng.random(T.shape) < 0.15] = np.nan
+    return z, T
+
+
+def test_leave_one_site_out_matches_refits_without_the_site():
+    z, T = _network()
+    reps = resample_lapse_rates(z, T, 'loso')
+    for k in range(z.size):
+        keep = np.arange(z.size) != k
+        ref = batch_linregress(z[keep], T[:, keep])
+        np.testing.assert_allclose(reps.slope[:, k], ref.slope, rtol=1e-9)
+        np.testing.assert_allclose(reps.intercept[:, k], ref.intercept,
+                                   rtol=1e-9)
+
+
+def test_bootstrap_does_not_depend_on_worker_count():
+    z, T = _network()
+    serial = resample_lapse_rates(z, T, nrep=60, seed=3, block_size=20,
+                                  max_workers=1)
+    pooled = resample_lapse_rates(z, T, nrep=60, seed=3, block_size=20,
+                                  max_workers=2)
+    assert serial.slope.shape == (90, 60)
+    np.testing.assert_array_equal(serial.slope, pooled.slope)
+
+    times = (np.datetime64('2018-01-01', 's')
+             + np.arange(90) * np.timedelta64(1, 'D'))
+    slope = batch_linregress(z, T).slope
+    out = period_intervals(times, slope, serial, 'month')
+    assert len(out.labels) == 3
+    assert np.all((out.lower < out.estimate) & (out.estimate < out.upper))